@@ -0,0 +1,208 @@
+"""Контроль допуска запросов: token bucket по IP, по токену сессии и по маршруту.
+
+Маршруты делятся на дешёвые и дорогие (LLM, сводки, экспорт админки), у
+каждого класса свои лимиты. Сверх лимита запрос сразу получает 429 с
+Retry-After. Кроме того, число одновременно выполняемых запросов класса
+ограничено: если ожидание свободного слота превышает max_queue_delay,
+запрос сбрасывается с 503. Счётчики сброшенных запросов доступны в
+/admin/admission.
+
+Корзины по IP по умолчанию выключены. За балансировщиком (Heroku router,
+nginx) адрес соединения — адрес прокси, и без доверенного X-Forwarded-For
+все клиенты делили бы одну корзину: один активный пользователь исчерпывал
+бы лимит за всех. Корзины по IP включаются вместе с
+ADMISSION_TRUST_FORWARDED=1 (адрес клиента берётся из последнего элемента
+X-Forwarded-For — его дописывает ближайший прокси, а не клиент) или явно
+через ADMISSION_PER_IP=1, если приложение принимает соединения напрямую.
+Корзины по токену сессии и ограничение конкуренции работают всегда.
+
+Запросы без токена в пути (POST /session, /sessions/status, страницы
+админки) при выключенных корзинах по IP делят корзину своего маршрута —
+по первому сегменту пути, чтобы вариации хвоста пути не давали новых
+корзин. Так поток POST /session не растит без ограничений словарь
+сессий, лог и журнал и в конфигурации по умолчанию.
+"""
+import asyncio
+import os
+import re
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") != "0"
+# Брать адрес клиента из X-Forwarded-For (за доверенным прокси)
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "0") == "1"
+# Лимиты по IP: без доверенного прокси адрес соединения у всех клиентов общий
+ADMISSION_PER_IP = os.getenv("ADMISSION_PER_IP", "1" if ADMISSION_TRUST_FORWARDED else "0") == "1"
+# Сколько корзин держать в памяти; самые давние вытесняются
+ADMISSION_MAX_BUCKETS = int(os.getenv("ADMISSION_MAX_BUCKETS", "100000"))
+
+EXPENSIVE_PREFIXES = ("/aeon/task", "/aeon/summary", "/admin/export")
+# Долгоживущие потоки не занимают слоты конкуренции
+UNLIMITED_PATHS = ("/admin/events",)
+
+_TOKEN_RE = re.compile(r"^/(?:session|result|ws/session|aeon/[a-z]+)/([0-9A-Za-z-]{8,})")
+
+
+@dataclass
+class Budget:
+    """Лимиты класса маршрутов"""
+    ip_rate: float  # Запросов в секунду на IP
+    ip_burst: float
+    token_rate: float  # Запросов в секунду на токен сессии
+    token_burst: float
+    max_inflight: int  # Одновременно выполняемых запросов
+    max_queue_delay: float  # Секунд ожидания слота до сброса
+    route_rate: float = 100  # Запросов в секунду на маршрут без токена (если корзины по IP выключены)
+    route_burst: float = 1000
+
+
+DEFAULT_BUDGETS = {
+    "cheap": Budget(ip_rate=100, ip_burst=1000, token_rate=20, token_burst=200,
+                    max_inflight=256, max_queue_delay=0.5),
+    "expensive": Budget(ip_rate=2, ip_burst=20, token_rate=1, token_burst=10,
+                        max_inflight=16, max_queue_delay=0.25, route_rate=2, route_burst=20),
+}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """0 — запрос допущен; иначе сколько секунд ждать следующего токена"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, budgets: Optional[Dict[str, Budget]] = None, max_buckets: int = ADMISSION_MAX_BUCKETS,
+                 trust_forwarded: bool = ADMISSION_TRUST_FORWARDED, per_ip: bool = ADMISSION_PER_IP):
+        self.budgets = budgets or DEFAULT_BUDGETS
+        self.max_buckets = max_buckets
+        self.trust_forwarded = trust_forwarded
+        self.per_ip = per_ip
+        self._buckets: "OrderedDict[Tuple[str, str, str], TokenBucket]" = OrderedDict()
+        self._semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self.inflight = {name: 0 for name in self.budgets}
+        self.counters = {name: {"admitted": 0, "queued": 0, "shed_ip": 0, "shed_token": 0, "shed_route": 0,
+                                 "shed_overload": 0}
+                         for name in self.budgets}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def memory_items(self) -> tuple:
+        """Корзины для отчёта о памяти"""
+        return (self._buckets,)
+
+    @staticmethod
+    def classify(path: str) -> str:
+        return "expensive" if path.startswith(EXPENSIVE_PREFIXES) else "cheap"
+
+    def client_ip(self, scope) -> str:
+        if self.trust_forwarded:
+            forwarded = None
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    forwarded = value  # Повторные заголовки: последний дописан прокси
+            if forwarded is not None:
+                # Начало цепочки задаёт сам клиент; последний адрес дописал доверенный прокси
+                return forwarded.decode("latin-1").rsplit(",", 1)[-1].strip()
+        client = scope.get("client")
+        return client[0] if client else "-"
+
+    def _bucket(self, key: Tuple[str, str, str], rate: float, burst: float, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def check_rate(self, route_class: str, ip: str, token: Optional[str],
+                   route: str = "") -> Optional[Tuple[str, float]]:
+        """Причина отказа и Retry-After или None, если запрос допущен"""
+        budget = self.budgets[route_class]
+        now = time.monotonic()
+        if self.per_ip:
+            wait = self._bucket((route_class, "ip", ip), budget.ip_rate, budget.ip_burst, now).take(now)
+            if wait:
+                self.counters[route_class]["shed_ip"] += 1
+                return "shed_ip", wait
+        if token is not None:
+            wait = self._bucket((route_class, "token", token), budget.token_rate, budget.token_burst, now).take(now)
+            if wait:
+                self.counters[route_class]["shed_token"] += 1
+                return "shed_token", wait
+        elif not self.per_ip:
+            wait = self._bucket((route_class, "route", route), budget.route_rate, budget.route_burst, now).take(now)
+            if wait:
+                self.counters[route_class]["shed_route"] += 1
+                return "shed_route", wait
+        return None
+
+    def _semaphore(self, route_class: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        per_loop = self._semaphores.get(loop)
+        if per_loop is None:
+            per_loop = self._semaphores[loop] = {
+                name: asyncio.Semaphore(budget.max_inflight) for name, budget in self.budgets.items()
+            }
+        return per_loop[route_class]
+
+    async def acquire(self, route_class: str) -> bool:
+        """Занимает слот класса; False — ожидание превысило порог"""
+        semaphore = self._semaphore(route_class)
+        if semaphore.locked():
+            self.counters[route_class]["queued"] += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.budgets[route_class].max_queue_delay)
+            except asyncio.TimeoutError:
+                self.counters[route_class]["shed_overload"] += 1
+                return False
+        else:
+            await semaphore.acquire()
+        self.inflight[route_class] += 1
+        self.counters[route_class]["admitted"] += 1
+        return True
+
+    def release(self, route_class: str):
+        self.inflight[route_class] -= 1
+        self._semaphore(route_class).release()
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": ADMISSION_CONTROL,
+            "per_ip": self.per_ip,
+            "trust_forwarded": self.trust_forwarded,
+            "buckets": len(self._buckets),
+            "inflight": dict(self.inflight),
+            "counters": {name: dict(values) for name, values in self.counters.items()},
+        }
+
+
+def session_token(path: str) -> Optional[str]:
+    match = _TOKEN_RE.match(path)
+    return match.group(1) if match else None
+
+
+def route_key(path: str) -> str:
+    """Маршрут для корзины запросов без токена: первый сегмент пути"""
+    return path.split("/", 2)[1] if path.startswith("/") else path
+
+
+admission = AdmissionController()
@@ -0,0 +1,118 @@
+"""Инкрементальная аналитика по когорте кандидатов.
+
+Агрегаты обновляются в момент событий (вопрос задан, ответ сохранён,
+сессия завершена), поэтому отчёт строится за время, зависящее только от
+числа корзин и вопросов, но не от числа сессий. Счётчики накапливаются с
+момента старта воркера; удаление сессии их не уменьшает.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+# Корзины гистограмм: 0–9, 10–19, ..., 90–100
+SCORE_BUCKETS = 10
+
+
+def score_bucket(score: float) -> int:
+    return min(SCORE_BUCKETS - 1, max(0, int(score) // (100 // SCORE_BUCKETS)))
+
+
+def score_labels() -> List[str]:
+    width = 100 // SCORE_BUCKETS
+    return [f"{i * width}–{i * width + width - 1 if i < SCORE_BUCKETS - 1 else 100}" for i in range(SCORE_BUCKETS)]
+
+
+class QuestionStats:
+    """Текущие агрегаты по одному вопросу"""
+    __slots__ = ("answers", "quality_sum", "words_sum", "seconds_sum", "timed")
+
+    def __init__(self):
+        self.answers = 0
+        self.quality_sum = 0.0
+        self.words_sum = 0
+        self.seconds_sum = 0.0
+        self.timed = 0
+
+
+class CohortAnalytics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.answer_histogram = [0] * SCORE_BUCKETS  # Качество отдельных ответов
+        self.score_histogram = [0] * SCORE_BUCKETS  # Итоговый балл завершённых сессий
+        self.questions: Dict[str, QuestionStats] = {}
+        self.asked_reach: List[int] = []  # asked_reach[k] — сессий, получивших k+1 вопросов
+        self.answered_reach: List[int] = []  # answered_reach[k] — сессий, ответивших на k+1 вопросов
+        self.completed = 0
+        self.score_sum = 0
+
+    @staticmethod
+    def _reach(counter: List[int], count: int):
+        while len(counter) < count:
+            counter.append(0)
+        counter[count - 1] += 1
+
+    def record_question(self, asked_count: int):
+        """Сессии задан очередной (asked_count-й) вопрос"""
+        with self._lock:
+            self._reach(self.asked_reach, asked_count)
+
+    def record_answer(self, question_id: str, quality: float, words: int, answered_count: int,
+                      seconds: Optional[float] = None, previous: Optional[tuple] = None):
+        """Сохранён ответ; previous=(quality, words) — если он заменяет прежний ответ"""
+        with self._lock:
+            stats = self.questions.get(question_id)
+            if stats is None:
+                stats = self.questions[question_id] = QuestionStats()
+            if previous is not None:
+                old_quality, old_words = previous
+                stats.quality_sum -= old_quality
+                stats.words_sum -= old_words
+                self.answer_histogram[score_bucket(old_quality)] -= 1
+            else:
+                stats.answers += 1
+                self._reach(self.answered_reach, answered_count)
+                if seconds is not None:
+                    stats.seconds_sum += seconds
+                    stats.timed += 1
+            stats.quality_sum += quality
+            stats.words_sum += words
+            self.answer_histogram[score_bucket(quality)] += 1
+
+    def record_completion(self, score: int):
+        with self._lock:
+            self.completed += 1
+            self.score_sum += score
+            self.score_histogram[score_bucket(score)] += 1
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = score_labels()
+            questions = [
+                {
+                    "question_id": question_id,
+                    "answers": stats.answers,
+                    "avg_quality": stats.quality_sum / stats.answers if stats.answers else 0,
+                    "avg_words": stats.words_sum / stats.answers if stats.answers else 0,
+                    "avg_seconds": stats.seconds_sum / stats.timed if stats.timed else None,
+                }
+                for question_id, stats in self.questions.items()
+            ]
+            funnel = [
+                {
+                    "question": k + 1,
+                    "asked": asked,
+                    "answered": self.answered_reach[k] if k < len(self.answered_reach) else 0,
+                    "stopped": asked - (self.asked_reach[k + 1] if k + 1 < len(self.asked_reach) else 0),
+                }
+                for k, asked in enumerate(self.asked_reach)
+            ]
+            return {
+                "completed": self.completed,
+                "avg_score": self.score_sum / self.completed if self.completed else 0,
+                "score_histogram": list(zip(labels, self.score_histogram)),
+                "answer_histogram": list(zip(labels, self.answer_histogram)),
+                "questions": questions,
+                "funnel": funnel,
+            }
+
+
+analytics = CohortAnalytics()
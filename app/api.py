@@ -1,236 +1,324 @@
-from fastapi import APIRouter, HTTPException, status, Body, Request
+from fastapi import APIRouter, HTTPException, status, Body, Header, Request, WebSocket, WebSocketDisconnect
 from app.models import Test, Question, Answer
 from app.schemas import SubmitAnswersRequest, SubmitAnswersResponse, GetResultResponse
 from typing import Optional, Dict, List, Any
-import uuid
+import hashlib
 import os
-import httpx
-from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+import secrets
+import threading
+import time
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
+import json
 from datetime import datetime, timedelta, timezone
-from fastapi.templating import Jinja2Templates
-import csv
-from io import StringIO
-from dataclasses import dataclass, field
+from functools import lru_cache
+from app.state import SessionResult, SessionState
+from app.blobs import MAX_ANSWER_CHARS
+from app.journal import journal
+from app.questions import question_banks, QuestionBank, QuestionBankError
+from app.events import admin_events
+from app.admission import admission
+from app.analytics import analytics
+from app.archive import archive, ARCHIVE_AFTER_SECONDS
+from app.dedup import near_duplicates
+from app.relevance import relevance
+from app.llm import chat_completion_json, llm_configured
+from app.tokens import TokenClaims, session_tokens
+from app.tracing import current_trace_id, span
+from app.memory import estimate, profiler, subsystem_report, usage
+from app.scoring import ScoringItem, answer_quality, score_batch, scoring
+from app.compression import pick_variant, precompress
+from app.fragments import (AppendOnlyFragments, RenderedPages, TEMPLATES_AUTO_RELOAD, bytecode_cache,
+                           static_asset, static_url)
+from app.idempotency import (IdempotencyConflict, IdempotencyInProgress, MAX_KEY_LENGTH,
+                             idempotency)
+import asyncio
 
 router = APIRouter()
 admin_router = APIRouter()
-templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "../templates"))
-
-# Моковые данные теста на двух языках
-mock_test_ru = Test(
-    id=1,
-    title="Тест по программированию",
-    questions=[
-        Question(
-            id=1,
-            text="Какой язык программирования используется для FastAPI?",
-            answers=[
-                Answer(id=1, text="Python"),
-                Answer(id=2, text="JavaScript"),
-                Answer(id=3, text="C++")
-            ]
-        ),
-        Question(
-            id=2,
-            text="Что такое Pydantic?",
-            answers=[
-                Answer(id=1, text="Библиотека для валидации данных"),
-                Answer(id=2, text="IDE"),
-                Answer(id=3, text="ОС")
-            ]
-        )
-    ]
-)
-
-mock_test_en = Test(
-    id=1,
-    title="Programming Test",
-    questions=[
-        Question(
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "../templates")
+
+@lru_cache(maxsize=None)
+def get_templates():
+    """Jinja2-шаблоны админки загружаются при первом обращении, а не при импорте"""
+    from fastapi.templating import Jinja2Templates
+    templates = Jinja2Templates(directory=TEMPLATES_DIR, bytecode_cache=bytecode_cache(),
+                                auto_reload=TEMPLATES_AUTO_RELOAD)
+    templates.env.globals["static_url"] = static_url
+    return templates
+
+def render_template(name: str, context: Dict[str, Any]):
+    """TemplateResponse рендерит шаблон сразу при создании — рендер попадает в спан"""
+    with span("template.render", template=name):
+        return get_templates().TemplateResponse(name, context)
+
+def render_fragment(name: str, **context) -> str:
+    """Кусок HTML для кэша фрагментов (строка таблицы, тело страницы)"""
+    return get_templates().get_template(name).render(**context)
+
+def join_fragments(fragments) -> Any:
+    """Готовые фрагменты вставляются в страницу без повторного экранирования"""
+    from markupsafe import Markup
+    return Markup("".join(fragments))
+
+MOCK_TEST_ID = 1
+
+# Моковые данные теста на двух языках (модели строятся при первом запросе)
+@lru_cache(maxsize=None)
+def get_mock_test(lang: str = "ru") -> Test:
+    if lang == "en":
+        return Test(
             id=1,
-            text="Which programming language is used for FastAPI?",
-            answers=[
-                Answer(id=1, text="Python"),
-                Answer(id=2, text="JavaScript"),
-                Answer(id=3, text="C++")
-            ]
-        ),
-        Question(
-            id=2,
-            text="What is Pydantic?",
-            answers=[
-                Answer(id=1, text="A data validation library"),
-                Answer(id=2, text="IDE"),
-                Answer(id=3, text="OS")
+            title="Programming Test",
+            questions=[
+                Question(
+                    id=1,
+                    text="Which programming language is used for FastAPI?",
+                    answers=[
+                        Answer(id=1, text="Python"),
+                        Answer(id=2, text="JavaScript"),
+                        Answer(id=3, text="C++")
+                    ]
+                ),
+                Question(
+                    id=2,
+                    text="What is Pydantic?",
+                    answers=[
+                        Answer(id=1, text="A data validation library"),
+                        Answer(id=2, text="IDE"),
+                        Answer(id=3, text="OS")
+                    ]
+                )
             ]
         )
-    ]
-)
-
-# Улучшенная структура для отслеживания сессий
-@dataclass
-class SessionState:
-    answers: List[Dict] = field(default_factory=list)
-    aeon_answers: Dict[str, str] = field(default_factory=dict)
-    asked_questions: set = field(default_factory=set)
-    current_question_index: int = 0
-    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
-    completed: bool = False
-    question_order: List[str] = field(default_factory=list)  # Порядок заданных вопросов
-    last_activity: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
-
-# AEON Questions Pool - 10 профессиональных вопросов
-AEON_QUESTIONS = [
-    {
-        "id": "q_1",
-        "text": "Расскажите о себе и своем профессиональном опыте. Какие навыки и достижения вы считаете наиболее важными?",
-        "type": "technical",
-        "keywords": ["навыки", "опыт", "достижения", "профессионал"]
-    },
-    {
-        "id": "q_2", 
-        "text": "Опишите свой идеальный рабочий день. Что бы вы делали и как бы себя чувствовали?",
-        "type": "soft",
-        "keywords": ["мотивация", "идеал", "комфорт", "рабочий день"]
-    },
-    {
-        "id": "q_3",
-        "text": "Расскажите о ситуации, когда вам пришлось решать сложную проблему. Как вы подошли к решению?",
-        "type": "technical",
-        "keywords": ["проблема", "решение", "анализ", "подход"]
-    },
-    {
-        "id": "q_4",
-        "text": "Как вы справляетесь со стрессом и давлением на работе? Приведите конкретный пример.",
-        "type": "soft",
-        "keywords": ["стресс", "давление", "пример", "справляться"]
-    },
-    {
-        "id": "q_5",
-        "text": "Расскажите о своем опыте работы в команде. Какую роль вы обычно играете в коллективе?",
-        "type": "soft",
-        "keywords": ["команда", "роль", "коллектив", "сотрудничество"]
-    },
-    {
-        "id": "q_6",
-        "text": "Какие технологии, методы или навыки вы изучили за последний год? Что планируете изучить?",
-        "type": "technical",
-        "keywords": ["технологии", "обучение", "планы", "развитие"]
-    },
-    {
-        "id": "q_7",
-        "text": "Опишите ситуацию, когда вам пришлось адаптироваться к серьезным изменениям. Как вы это делали?",
-        "type": "soft",
-        "keywords": ["адаптация", "изменения", "гибкость", "приспособление"]
-    },
-    {
-        "id": "q_8",
-        "text": "Расскажите о своих карьерных целях. Где вы видите себя через 2-3 года?",
-        "type": "soft",
-        "keywords": ["карьера", "цели", "планы", "будущее"]
-    },
-    {
-        "id": "q_9",
-        "text": "Что мотивирует вас в работе больше всего? Что дает вам энергию для профессионального роста?",
-        "type": "soft",
-        "keywords": ["мотивация", "энергия", "рост", "драйв"]
-    },
-    {
-        "id": "q_10",
-        "text": "Почему вы заинтересованы в работе в нашей компании? Какой вклад вы хотите внести?",
-        "type": "soft",
-        "keywords": ["интерес", "компания", "вклад", "ценность"]
-    }
-]
+    return Test(
+        id=1,
+        title="Тест по программированию",
+        questions=[
+            Question(
+                id=1,
+                text="Какой язык программирования используется для FastAPI?",
+                answers=[
+                    Answer(id=1, text="Python"),
+                    Answer(id=2, text="JavaScript"),
+                    Answer(id=3, text="C++")
+                ]
+            ),
+            Question(
+                id=2,
+                text="Что такое Pydantic?",
+                answers=[
+                    Answer(id=1, text="Библиотека для валидации данных"),
+                    Answer(id=2, text="IDE"),
+                    Answer(id=3, text="ОС")
+                ]
+            )
+        ]
+    )
 
 # Улучшенная система хранения сессий
 sessions: Dict[str, SessionState] = {}
 
+# Версии банка вопросов живых сессий не вытесняются из реестра
+question_banks.in_use = lambda: {state.bank_version for state in list(sessions.values())}
+
 SESSION_TTL = timedelta(hours=1)
 
-def is_token_expired(session_state: SessionState) -> bool:
-    """Проверка истечения срока действия токена"""
-    return datetime.now(timezone.utc) > session_state.created_at + SESSION_TTL
+# Интервал heartbeat-комментариев в потоке событий админки
+SSE_HEARTBEAT_SECONDS = 15
+
+# Эпоха процесса в ETag ответов сессий: ревизии не переживают рестарт
+ETAG_EPOCH = secrets.token_hex(4)
+
+# Максимум элементов в пакетных запросах
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "500"))
+
+# Принимать токены старого формата (uuid): они есть только в журнале,
+# записанном до перехода на подписанные токены
+LEGACY_TOKENS = os.getenv("AEON_LEGACY_TOKENS", "1" if journal.directory else "0") != "0"
+
+# Удалённые и заархивированные сессии, чей токен ещё действует: токен -> срок.
+# Переживает рестарт через записи «d» журнала и колонку токенов архива
+retired_tokens: Dict[str, float] = {}
+# Токены, выданные раньше, могли уйти в архив до рестарта
+PROCESS_STARTED_TS = time.time()
+
+def is_token_expired(session_state) -> bool:
+    """Проверка истечения срока действия токена (по сессии или по данным подписанного токена)"""
+    return time.time() > session_state.created_ts + SESSION_TTL.total_seconds()
+
+def token_bank_version(claims: TokenClaims) -> str:
+    """Версия банка, с которой выдан токен; если её уже вытеснили из реестра — текущая"""
+    if claims.bank_version is not None and claims.bank_version in question_banks:
+        return claims.bank_version
+    # Токен без версии (выдан до её появления в токене) или версия вытеснена
+    return question_banks.current().version
+
+def pending_session(claims: TokenClaims) -> SessionState:
+    """Пустая сессия по данным токена (ещё не занесена в словарь)"""
+    return SessionState(claims.created_ts, token_bank_version(claims), claims.track)
+
+def allocate_session(token: str, claims: TokenClaims) -> SessionState:
+    """Состояние сессии создаётся при первой записи, а не в POST /session.
+
+    Токен, выданный до рестарта, сначала ищется в архиве: если запись «d» не
+    успела попасть в журнал (или журнал выключен), сессия не создаётся заново.
+    """
+    if claims.created_ts < PROCESS_STARTED_TS and archive.find(token) is not None:
+        retire_token(token)
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    new_state = pending_session(claims)
+    session_state = sessions.setdefault(token, new_state)
+    if session_state is new_state:
+        journal.append("c", session_state.created_ts, token, session_state.bank_version, claims.track)
+        admin_events.publish("session_created", {"token": token, "created_at": session_state.created_at},
+                             {"total": 1, "active": 1})
+    return session_state
+
+def resolve_session(token: str, allocate: bool = False) -> SessionState:
+    """Сессия по токену или HTTPException 404/403.
+
+    Поддельный и истёкший подписанный токен отклоняются до обращения к
+    словарю сессий. Действительный токен без состояния даёт пустую сессию;
+    в словарь она заносится только при allocate=True.
+    """
+    with span("session.resolve", allocate=allocate):
+        claims = session_tokens.verify(token)
+        if claims is None:
+            session_state = sessions.get(token) if LEGACY_TOKENS else None
+            if session_state is None:
+                raise HTTPException(status_code=404, detail="Сессия не найдена")
+        elif is_token_expired(claims):
+            raise HTTPException(status_code=403, detail="Срок действия токена истёк")
+        else:
+            session_state = sessions.get(token)
+            if session_state is None:
+                if token in retired_tokens:
+                    raise HTTPException(status_code=404, detail="Сессия не найдена")
+                session_state = allocate_session(token, claims) if allocate else pending_session(claims)
+        if is_token_expired(session_state):
+            raise HTTPException(status_code=403, detail="Срок действия токена истёк")
+        return session_state
+
+def retire_token(token: str) -> Optional[float]:
+    """Запоминает токен убранной из памяти сессии, чтобы запись не создала её заново.
+
+    Возвращает срок, до которого токен выведен из оборота (None — токен и так
+    недействителен); срок пишется в запись «d» журнала и переживает рестарт.
+    """
+    claims = session_tokens.verify(token)
+    now = time.time()
+    for stale in [t for t, expires in retired_tokens.items() if expires < now]:
+        del retired_tokens[stale]
+    if claims is None or is_token_expired(claims):
+        return None
+    expires = retired_tokens[token] = claims.created_ts + SESSION_TTL.total_seconds()
+    return expires
+
+def retire_archived_tokens() -> int:
+    """После рестарта: токены заархивированных сессий, которые ещё действуют, выводятся из оборота"""
+    ttl = SESSION_TTL.total_seconds()
+    restored = 0
+    for token, created_ts in archive.tokens_created_after(time.time() - ttl):
+        if token not in retired_tokens:
+            retired_tokens[token] = created_ts + ttl
+            restored += 1
+    return restored
+
+def reindex_restored_answers() -> int:
+    """После рестарта: ответы восстановленных сессий заново попадают в индекс почти копий.
+
+    Отметки копий не хранятся в снапшоте и строятся здесь же: сессии идут в
+    порядке создания, поэтому копией считается более поздний ответ, как и до рестарта.
+    """
+    indexed = 0
+    for token, session_state in sorted(list(sessions.items()), key=lambda item: item[1].created_ts):
+        for question_id, text in session_state.iter_answers():
+            if isinstance(text, str):
+                session_state.flag_duplicate(question_id, near_duplicates.add(token, question_id, text))
+                indexed += 1
+    return indexed
 
 def update_session_activity(session_state: SessionState):
     """Обновление времени последней активности"""
-    session_state.last_activity = datetime.now(timezone.utc)
+    session_state.touch()
 
-def analyze_answer_quality(answer: str, question_keywords: List[str]) -> Dict[str, Any]:
-    """Анализ качества ответа на основе содержания и ключевых слов"""
-    if not answer or not isinstance(answer, str):
-        return {"score": 0, "details": "Пустой ответ"}
-    
-    answer_lower = answer.lower()
-    
-    # Базовые метрики
-    word_count = len(answer.split())
-    sentence_count = len([s for s in answer.split('.') if s.strip()])
-    
-    # Анализ содержания
-    keyword_matches = sum(1 for keyword in question_keywords if keyword.lower() in answer_lower)
-    keyword_ratio = keyword_matches / len(question_keywords) if question_keywords else 0
-    
-    # Анализ структуры
-    has_examples = any(word in answer_lower for word in ['например', 'пример', 'случай', 'ситуация'])
-    has_specifics = any(word in answer_lower for word in ['конкретно', 'именно', 'определенно'])
-    
-    # Оценка качества (0-100)
-    score = 0
-    
-    # Базовая оценка по длине
-    if word_count >= 50:
-        score += 30
-    elif word_count >= 20:
-        score += 20
-    elif word_count >= 10:
-        score += 10
-    
-    # Бонус за релевантность
-    score += min(30, keyword_ratio * 100)
-    
-    # Бонус за примеры и конкретику
-    if has_examples:
-        score += 15
-    if has_specifics:
-        score += 10
-    
-    # Бонус за структурированность
-    if sentence_count >= 3:
-        score += 10
-    elif sentence_count >= 2:
-        score += 5
-    
-    # Штраф за слишком краткие ответы
-    if word_count < 5:
-        score = min(score, 10)
-    
-    return {
-        "score": min(100, max(0, score)),
-        "word_count": word_count,
-        "sentence_count": sentence_count,
-        "keyword_matches": keyword_matches,
-        "keyword_ratio": keyword_ratio,
-        "has_examples": has_examples,
-        "has_specifics": has_specifics
-    }
+def session_bank(session_state: SessionState) -> QuestionBank:
+    """Банк вопросов той версии, с которой начата сессия"""
+    return question_banks.get(session_state.bank_version)
+
+def session_questions(session_state: SessionState):
+    """Последовательность вопросов сессии с учётом её фильтра"""
+    return session_bank(session_state).sequence(session_state.track)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Проверка заголовка If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def scored_key(session_state: SessionState, *extra) -> tuple:
+    """Ключ мемо для ответов с оценками: ревизия сессии и версия модели релевантности.
+
+    Оценки качества зависят от модели, поэтому её перестройка меняет ключ и ETag.
+    """
+    return (session_state.revision, relevance.version) + extra
+
+def conditional_json(request: Request, session_state: SessionState, kind: str, key, render) -> Response:
+    """JSON-ответ, мемоизированный по ключу (ревизии сессии), с ETag и 304.
+
+    Ревизия после восстановления из журнала начинается заново, поэтому в
+    ETag входит эпоха процесса: тег, выданный до рестарта, не совпадёт.
+    """
+    etag = f'"{ETAG_EPOCH}-{kind}-{"-".join(str(part) for part in key)}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    body = session_state.memo(kind, key, lambda: json.dumps(
+        jsonable_encoder(render()), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+def analyze_answer_quality(answer: str, question_keywords: List[str],
+                           question_id: Optional[str] = None) -> Dict[str, Any]:
+    """Анализ качества ответа на основе содержания и ключевых слов.
+
+    Если передан question_id, релевантность дополнительно оценивается
+    TF-IDF близостью к вопросу — она засчитывает ответы без точных
+    ключевых слов.
+    """
+    with span("quality.analyze", question_id=question_id or ""):
+        return answer_quality(answer, question_keywords, question_id)
 
-def calculate_performance_score(session_state: SessionState) -> int:
+def scoring_items(session_state: SessionState) -> List[ScoringItem]:
+    """Ответы сессии на вопросы её банка с ключевыми словами — вход для оценки качества"""
+    by_id = session_bank(session_state).by_id
+    return [(question_id, answer, by_id[question_id].get("keywords", []))
+            for question_id, answer in session_state.iter_answers() if question_id in by_id]
+
+def score_session(session_state: SessionState) -> Dict[str, Dict[str, Any]]:
+    """Оценки качества ответов сессии по question_id (в текущем потоке)"""
+    items = scoring_items(session_state)
+    with span("quality.batch", answers=len(items)):
+        return {question_id: quality for (question_id, _, _), quality in zip(items, score_batch(items))}
+
+async def score_session_offloaded(session_state: SessionState) -> Dict[str, Dict[str, Any]]:
+    """То же, что score_session, но длинные ответы оцениваются в пуле, а не в цикле событий"""
+    items = scoring_items(session_state)
+    with span("quality.batch", answers=len(items)):
+        qualities = await scoring.score(items)
+    return {question_id: quality for (question_id, _, _), quality in zip(items, qualities)}
+
+def calculate_performance_score(session_state: SessionState,
+                                qualities: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
     """Расчет итогового балла на основе качества ответов"""
-    if not session_state.aeon_answers:
+    if not session_state.answered_count:
         return 0
     
-    total_score = 0
-    answered_questions = 0
-    
-    for question_id, answer in session_state.aeon_answers.items():
-        # Найти вопрос для получения ключевых слов
-        question_data = next((q for q in AEON_QUESTIONS if q["id"] == question_id), None)
-        if question_data:
-            keywords = question_data.get("keywords", [])
-            quality = analyze_answer_quality(answer, keywords)
-            total_score += quality["score"]
-            answered_questions += 1
+    if qualities is None:
+        qualities = score_session(session_state)
+    total_score = sum(quality["score"] for quality in qualities.values())
+    answered_questions = len(qualities)
     
     if answered_questions == 0:
         return 0
@@ -239,7 +327,7 @@ def calculate_performance_score(session_state: SessionState) -> int:
     avg_quality = total_score / answered_questions
     
     # Бонус за полноту (процент отвеченных вопросов)
-    completion_bonus = (answered_questions / len(AEON_QUESTIONS)) * 20
+    completion_bonus = (answered_questions / max(1, len(session_questions(session_state)))) * 20
     
     # Итоговый балл
     final_score = min(100, max(0, avg_quality + completion_bonus))
@@ -292,34 +380,61 @@ log = []
 
 def log_event(action, details=None):
     from datetime import datetime, timezone
-    log.append({
+    entry = {
         "time": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
         "action": action,
         "details": details or {}
-    })
+    }
+    trace_id = current_trace_id()
+    if trace_id is not None:
+        entry["trace_id"] = trace_id
+    journal.append_log(log, entry)
+
+@lru_cache(maxsize=None)
+def mock_test_payload(lang: str) -> Dict[str, bytes]:
+    """JSON теста неизменяем — сериализуется и сжимается один раз"""
+    test = get_mock_test(lang)
+    return precompress(json.dumps(jsonable_encoder(test), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+@lru_cache(maxsize=None)
+def mock_test_version(lang: str) -> str:
+    """Хеш JSON теста для ETag: меняется вместе с содержимым, как у static_asset"""
+    return hashlib.sha256(mock_test_payload(lang)["identity"]).hexdigest()[:12]
+
+def precompressed_response(request: Request, variants: Dict[str, bytes], media_type: str, version: str,
+                           headers: Optional[Dict[str, str]] = None) -> Response:
+    """Готовый вариант тела под Accept-Encoding запроса, с ETag и 304"""
+    encoding, body = pick_variant(request.headers.get("accept-encoding"), variants)
+    etag = f'"{version}"' if encoding == "identity" else f'"{version}-{encoding}"'
+    headers = dict(headers or {}, ETag=etag, Vary="Accept-Encoding")
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
 
 @router.get("/test/{test_id}", response_model=Test)
-def get_test(test_id: int, lang: Optional[str] = "ru"):
-    if test_id == 1:
-        if lang == "en":
-            return mock_test_en
-        return mock_test_ru
+def get_test(request: Request, test_id: int, lang: Optional[str] = "ru"):
+    if test_id == MOCK_TEST_ID:
+        lang = "en" if lang == "en" else "ru"
+        return precompressed_response(request, mock_test_payload(lang), "application/json", mock_test_version(lang))
     raise HTTPException(status_code=404, detail="Тест не найден")
 
 @router.post("/test/{test_id}/submit", response_model=SubmitAnswersResponse)
 def submit_answers(test_id: int, request: SubmitAnswersRequest):
-    if test_id != mock_test_ru.id:
+    if test_id != MOCK_TEST_ID:
         raise HTTPException(status_code=404, detail="Тест не найден")
+    mock_test = get_mock_test("ru")
     correct = 0
     for user_answer in request.answers:
-        for q in mock_test_ru.questions:
+        for q in mock_test.questions:
             if q.id == user_answer.question_id and user_answer.answer_id == q.answers[0].id:
                 correct += 1
-    score = int(100 * correct / len(mock_test_ru.questions))
+    score = int(100 * correct / len(mock_test.questions))
     result_id = 1  # Моковый id результата
     return SubmitAnswersResponse(result_id=result_id)
 
-@router.get("/result/{result_id}", response_model=GetResultResponse)
+@router.get("/result/{result_id:int}", response_model=GetResultResponse)
 def get_result(result_id: int):
     # Моковые данные результата
     if result_id == 1:
@@ -328,105 +443,366 @@ def get_result(result_id: int):
 
 @router.post("/test/{test_id}/autosave", status_code=status.HTTP_204_NO_CONTENT)
 def autosave_answers(test_id: int, request: SubmitAnswersRequest):
-    if test_id != mock_test_ru.id:
+    if test_id != MOCK_TEST_ID:
         raise HTTPException(status_code=404, detail="Тест не найден")
     # Здесь можно сохранять ответы пользователя (например, в БД)
     # Сейчас просто заглушка
     return
 
+def idempotent(response: Response, key: Optional[str], scope: tuple, payload: Any, compute):
+    """Выполняет compute() один раз на Idempotency-Key; повтор получает исходный ответ"""
+    if key is None:
+        return compute()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Некорректный Idempotency-Key")
+    try:
+        result, replayed = idempotency.run(scope + (key,), payload, compute)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key уже использован с другим запросом")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="Запрос с этим Idempotency-Key ещё выполняется")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+def caller_scope(request: Request) -> tuple:
+    """Кто вызывает: адрес клиента и цепочка X-Forwarded-For как есть.
+
+    За прокси без доверенного X-Forwarded-For адрес соединения у всех общий,
+    но адрес клиента прокси дописывает в конец цепочки — она и различает
+    клиентов.
+    """
+    return admission.client_ip(request.scope), request.headers.get("x-forwarded-for", "")
+
 @router.post("/session")
-def create_session():
-    """Создание новой сессии с улучшенным отслеживанием"""
-    token = str(uuid.uuid4())
-    sessions[token] = SessionState()
+def create_session(request: Request, response: Response, role: Optional[str] = None,
+                   lang: Optional[str] = None, idempotency_key: Optional[str] = Header(None)):
+    """Создание новой сессии с улучшенным отслеживанием.
+
+    Повтор по Idempotency-Key возвращает тот же токен, поэтому ключ действует
+    только для того же вызывающего: чужой запрос с угаданным ключом получит
+    новую сессию, а не чужой токен.
+    """
+    return idempotent(response, idempotency_key, ("session",) + caller_scope(request),
+                      {"role": role, "lang": lang}, lambda: open_session(role, lang))
+
+def open_session(role: Optional[str] = None, lang: Optional[str] = None) -> Dict[str, str]:
+    bank = question_banks.current()
+    track = (role, lang) if role or lang else None
+    if not bank.sequence(track):
+        raise HTTPException(status_code=400, detail="Нет вопросов для выбранной роли и языка")
+    # Состояние сессии не создаётся до первой записи (allocate_session)
+    token = session_tokens.issue(track, bank_version=bank.version)
     log_event("create_session", {"token": token})
     return {"token": token}
 
 @router.post("/session/{token}/answer")
-def save_answer(token: str, answer: dict = Body(...)):
+def save_answer(token: str, response: Response, answer: dict = Body(...),
+                idempotency_key: Optional[str] = Header(None)):
     """Сохранение ответа с валидацией"""
-    session_state = sessions.get(token)
-    if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if is_token_expired(session_state):
-        raise HTTPException(status_code=403, detail="Срок действия токена истёк")
+    return idempotent(response, idempotency_key, ("answer", token), answer,
+                      lambda: store_answer(token, answer))
+
+def store_answer(token: str, answer: dict) -> Dict[str, str]:
+    session_state = resolve_session(token, allocate=True)
     if session_state.completed:
         raise HTTPException(status_code=403, detail="Тест уже завершён")
     
     # Обновляем активность
     update_session_activity(session_state)
     
-    # Сохраняем обычный ответ
-    session_state.answers.append(answer)
+    error = check_answer(session_state, answer)
+    if error is not None:
+        if error[0] == 400:
+            log_event("invalid_answer", {"token": token, "question_id": answer["question_id"], "error": "Question not asked"})
+        raise HTTPException(status_code=error[0], detail=error[1])
     
-    # Если это AEON ответ, сохраняем отдельно с валидацией
+    apply_answer(token, session_state, answer)
+    return {"status": "saved"}
+
+def check_answer(session_state: SessionState, answer: Any) -> Optional[tuple]:
+    """Ошибка валидации ответа в виде (код, сообщение) или None"""
+    if not isinstance(answer, dict):
+        return 422, "Ответ должен быть объектом"
+    text = answer.get("answer", "")
+    if isinstance(text, str) and len(text) > MAX_ANSWER_CHARS:
+        return 413, "Ответ слишком длинный"
+    # Проверяем, что этот вопрос действительно был задан
+    if "question_id" in answer and not session_state.was_asked(answer["question_id"]):
+        return 400, "Вопрос не был задан"
+    return None
+
+def apply_answer(token: str, session_state: SessionState, answer: dict):
+    """Сохранение уже проверенного ответа (одна копия текста)"""
+    text = answer.get("answer", "")
+    answered_before = session_state.answered_count
     if "question_id" in answer:
         question_id = answer["question_id"]
-        # Проверяем, что этот вопрос действительно был задан
-        if question_id in session_state.asked_questions:
-            session_state.aeon_answers[question_id] = answer.get("answer", "")
-        else:
-            log_event("invalid_answer", {"token": token, "question_id": question_id, "error": "Question not asked"})
-            raise HTTPException(status_code=400, detail="Вопрос не был задан")
+        record_answer_analytics(session_state, question_id, text)
+        ref = session_state.set_answer(question_id, text)
+        journal.append("a", session_state.last_activity_ts, token, question_id, ref, text)
+        log_event("save_answer", {"token": token, "question_id": question_id, "answer_ref": ref})
+        check_near_duplicate(token, session_state, question_id, text)
+        relevance.observe(question_id, text)
+    else:
+        # Сохраняем обычный ответ
+        ref = session_state.add_raw_answer(answer)
+        journal.append("r", session_state.last_activity_ts, token, ref, answer)
+        log_event("save_answer", {"token": token, "answer_ref": ref})
+    admin_events.publish("answered", {
+        "token": token,
+        "answers": session_state.answered_count,
+        "total_answers": session_state.answer_count
+    }, {"total_aeon_answers": session_state.answered_count - answered_before})
+
+def save_answer_with_status(token: str, session_state: SessionState, answer: dict) -> Dict[str, Any]:
+    """Сохраняет ответ и возвращает обновлённый статус (для вызова из пула потоков)"""
+    apply_answer(token, session_state, answer)
+    return session_status_data(token, session_state)
+
+def record_answer_analytics(session_state: SessionState, question_id: str, text: Any):
+    """Инкрементальное обновление когортной аналитики до сохранения ответа"""
+    question_data = session_bank(session_state).by_id.get(question_id, {})
+    keywords = question_data.get("keywords", [])
+    quality = analyze_answer_quality(text, keywords, question_id)
+    # Вычитается ровно то, что было учтено: пересчёт прежнего текста дал бы
+    # другое значение после перестройки модели релевантности
+    previous = session_state.recorded_analytics(question_id)
+    seconds = None
+    if question_id == session_state.last_question_id and session_state.question_ts:
+        seconds = time.time() - session_state.question_ts
+    answered_count = session_state.answered_count + (not session_state.has_answer(question_id))
+    words = quality.get("word_count", 0)
+    analytics.record_answer(question_id, quality["score"], words, answered_count, seconds, previous)
+    session_state.record_analytics(question_id, quality["score"], words)
+
+def check_near_duplicate(token: str, session_state: SessionState, question_id: str, text: Any):
+    """Сверка ответа с ответами других кандидатов на тот же вопрос (MinHash/LSH)"""
+    stale = near_duplicates.remove(token, question_id)  # Прежний ответ больше не образец
+    match = near_duplicates.add(token, question_id, text) if isinstance(text, str) else None
+    session_state.flag_duplicate(question_id, match)
+    if match is not None:
+        log_event("near_duplicate_answer", {"token": token, "question_id": question_id,
+                                            "similar_to": match[0], "similarity": round(match[1], 2)})
+    rematch_duplicates(stale)
+
+def rematch_duplicates(stale: List[tuple]):
+    """Пересчёт отметок ответов, которые были копиями заменённых или удалённых"""
+    for other, question_id in stale:
+        other_state = sessions.get(other)
+        if other_state is not None:
+            other_state.flag_duplicate(question_id, near_duplicates.rematch(other, question_id))
+
+# Один перенос в архив за раз: иначе две очереди заархивируют одни и те же сессии
+_sweep_lock = threading.Lock()
+
+def archivable(session_state: SessionState, now: float) -> bool:
+    """Сессия больше не нужна в памяти: давно завершена или токен истёк"""
+    if session_state.completed:
+        return now - session_state.last_activity_ts > ARCHIVE_AFTER_SECONDS
+    return now > session_state.created_ts + SESSION_TTL.total_seconds()
+
+def archive_answer_metrics(session_state: SessionState) -> List[tuple]:
+    """(id вопроса, число слов, качество) для колонок ответов архива"""
+    by_id = session_bank(session_state).by_id
+    metrics = []
+    for question_id, text in session_state.iter_answers():
+        quality = analyze_answer_quality(text, by_id.get(question_id, {}).get("keywords", []), question_id)
+        metrics.append((question_id, quality.get("word_count", 0), int(quality["score"])))
+    return metrics
+
+def archive_idle_sessions(now: Optional[float] = None, check_existing: bool = False) -> int:
+    """Переносит завершённые и истёкшие сессии в колоночный архив.
+
+    check_existing — пропускать уже заархивированные токены (после рестарта
+    журнал мог восстановить сессию, перенесённую перед сбоем).
+    Фоновый перенос и POST /admin/archive/sweep выполняются по очереди.
+    """
+    if not archive.enabled:
+        return 0
+    with _sweep_lock:
+        return _archive_idle_sessions(time.time() if now is None else now, check_existing)
+
+def _archive_idle_sessions(now: float, check_existing: bool) -> int:
+    batch = [(token, s) for token, s in list(sessions.items()) if archivable(s, now)]
+    if not batch:
+        return 0
+    archive.append((token, s, archive_answer_metrics(s)) for token, s in batch
+                   if not (check_existing and archive.find(token) is not None))
+    # Из памяти и журнала сессии убираются только после fsync архива
+    for token, session_state in batch:
+        # Токен выводится из оборота до удаления: запись в промежутке не создаст сессию заново
+        expires = retire_token(token)
+        if sessions.get(token) is session_state:
+            del sessions[token]
+        completed = int(session_state.completed)
+        answered = session_state.answered_count
+        session_state.release_answers()
+        rematch_duplicates(near_duplicates.remove(token))
+        session_pages.discard(token)
+        journal.append("d", token, expires)
+        admin_events.publish("archived", {"token": token}, {
+            "total": -1,
+            "completed": -completed,
+            "active": completed - 1,
+            "total_aeon_answers": -answered
+        })
+    log_event("archive_sessions", {"sessions": len(batch)})
+    return len(batch)
+
+@router.post("/session/{token}/answers")
+def save_answers_batch(token: str, data: dict = Body(...)):
+    """Пакетное сохранение ответов: либо все, либо ни одного"""
+    session_state = resolve_session(token, allocate=True)
+    if session_state.completed:
+        raise HTTPException(status_code=403, detail="Тест уже завершён")
     
-    log_event("save_answer", {"token": token, "answer": answer})
-    return {"status": "saved"}
+    answers = data.get("answers")
+    if not isinstance(answers, list) or not answers:
+        raise HTTPException(status_code=422, detail="Ожидается непустой список answers")
+    if len(answers) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не более {MAX_BATCH_ITEMS} ответов за запрос")
+    
+    update_session_activity(session_state)
+    
+    # Сначала проверяем все ответы, затем применяем — пакет атомарен
+    errors = []
+    for index, answer in enumerate(answers):
+        error = check_answer(session_state, answer)
+        if error is not None:
+            errors.append({"index": index, "status": error[0], "detail": error[1]})
+    if errors:
+        log_event("invalid_answer_batch", {"token": token, "errors": len(errors)})
+        return JSONResponse(content={"detail": "Пакет отклонён", "errors": errors}, status_code=400)
+    
+    for answer in answers:
+        apply_answer(token, session_state, answer)
+    return {"status": "saved", "saved": len(answers)}
+
+@router.post("/sessions/status")
+def get_sessions_batch(data: dict = Body(...)):
+    """Состояние нескольких сессий за один запрос (как GET /session/{token})"""
+    tokens = data.get("tokens")
+    if not isinstance(tokens, list):
+        raise HTTPException(status_code=422, detail="Ожидается список tokens")
+    if len(tokens) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не более {MAX_BATCH_ITEMS} токенов за запрос")
+    
+    items = []
+    for token in tokens:
+        if not isinstance(token, str):
+            items.append({"token": token, "status": 404, "detail": "Сессия не найдена"})
+            continue
+        try:
+            session_state = resolve_session(token)
+        except HTTPException as exc:
+            items.append({"token": token, "status": exc.status_code, "detail": exc.detail})
+            continue
+        items.append({"token": token, "status": 200, "session": session_status_data(token, session_state)})
+    return {"sessions": items}
 
 @router.get("/session/{token}")
-def get_session(token: str):
+def get_session(token: str, request: Request):
     """Получение состояния сессии"""
-    session_state = sessions.get(token)
-    if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if is_token_expired(session_state):
-        raise HTTPException(status_code=403, detail="Срок действия токена истёк")
+    session_state = resolve_session(token)
     
+    return conditional_json(request, session_state, "status", scored_key(session_state),
+                            lambda: session_status_data(token, session_state))
+
+def session_status_data(token: str, session_state: SessionState) -> Dict[str, Any]:
+    """Мемоизированное (по ревизии и модели) состояние сессии в JSON-совместимом виде"""
+    return session_state.memo("status_data", scored_key(session_state),
+                              lambda: jsonable_encoder(build_session_status(token, session_state)))
+
+def build_session_status(token: str, session_state: SessionState) -> Dict[str, Any]:
     return {
         "token": token,
         "created_at": session_state.created_at,
         "completed": session_state.completed,
-        "questions_answered": len(session_state.aeon_answers),
-        "total_questions": len(AEON_QUESTIONS),
-        "asked_questions": len(session_state.asked_questions),
+        "questions_answered": session_state.answered_count,
+        "total_questions": len(session_questions(session_state)),
+        "asked_questions": session_state.asked_count,
         "current_performance": calculate_performance_score(session_state)
     }
 
 @router.post("/session/{token}/complete")
 def complete_session(token: str):
-    session_state = sessions.get(token)
-    if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if is_token_expired(session_state):
-        raise HTTPException(status_code=403, detail="Срок действия токена истёк")
-    session_state.completed = True
+    session_state = resolve_session(token, allocate=True)
+    was_completed = session_state.completed
+    if session_state.result is None:
+        # Итог считается один раз и дальше отдаётся без пересчёта
+        session_state.result = build_result(token, session_state)
+        analytics.record_completion(session_state.result.performance_score)
+    session_state.complete()
+    journal.append("x", token, session_state.result.to_record())
     log_event("complete_session", {"token": token})
+    if not was_completed:
+        admin_events.publish("completed", {"token": token}, {"completed": 1, "active": -1})
     return {"status": "completed"}
 
 @router.get("/result/{token}")
 def get_result_by_token(token: str):
+    claims = session_tokens.verify(token)
+    if claims is None and not LEGACY_TOKENS:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
     session_state = sessions.get(token)
     if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
+        record = archive.load(token)
+        archived = SessionResult.from_session_record(record) if record is not None else None
+        if archived is not None:
+            # Сессия уже в архиве — итог берётся из текстового сегмента
+            return archived.to_dict()
+        if claims is None or token in retired_tokens or is_token_expired(claims):
+            raise HTTPException(status_code=404, detail="Сессия не найдена")
+        session_state = pending_session(claims)
     
-    total_time = (datetime.now(timezone.utc) - session_state.created_at).total_seconds()
-    questions_answered = len(session_state.aeon_answers)
-    completion_rate = (questions_answered / len(AEON_QUESTIONS)) * 100 if len(AEON_QUESTIONS) > 0 else 0
+    result = session_state.result
+    if result is not None:
+        # Зафиксированный итог: сериализуется один раз
+        body = session_state.memo("result", result.completed_at, lambda: json.dumps(
+            result.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        return Response(body, media_type="application/json")
     
+    # Сессия ещё идёт — промежуточные показатели без глифа и сводки
+    return result_timings(token, session_state, time.time()) | {
+        "performance_score": session_status_data(token, session_state)["current_performance"],
+        "completed_at": None
+    }
+
+def result_timings(token: str, session_state: SessionState, now: float) -> Dict[str, Any]:
+    total_time = now - session_state.created_ts
+    questions_answered = session_state.answered_count
+    total_questions = len(session_questions(session_state))
+    completion_rate = (questions_answered / total_questions) * 100 if total_questions > 0 else 0
     return {
         "session_id": token,
         "total_time": int(total_time),
         "questions_answered": questions_answered,
         "completion_rate": completion_rate,
         "average_time_per_question": int(total_time / questions_answered) if questions_answered > 0 else 0,
-        "performance_score": min(85, max(40, 60 + (questions_answered * 3))),  # Простая формула
-        "created_at": session_state.created_at.isoformat(),
-        "completed_at": datetime.now(timezone.utc).isoformat()
+        "created_at": session_state.created_at.isoformat()
     }
 
+def build_result(token: str, session_state: SessionState) -> SessionResult:
+    """Итог сессии: балл, глиф, сводка и тайминги на момент завершения"""
+    now = time.time()
+    qualities = score_session(session_state)
+    # Без записей в лог: глиф и сводку при завершении никто не запрашивал
+    glyph = render_glyph(session_state, qualities)
+    return SessionResult(
+        **result_timings(token, session_state, now),
+        performance_score=calculate_performance_score(session_state, qualities),
+        completed_at=datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        glyph=glyph["glyph"],
+        profile=glyph["profile"],
+        summary=render_summary(session_state, qualities)["summary"]
+    )
+
 @router.get("/stats")
 def get_stats():
-    num_sessions = len(sessions)
-    num_answers = sum(len(s.aeon_answers) for s in sessions.values())
+    states = list(sessions.values())  # Снимок: словарь меняют другие потоки
+    num_sessions = len(states)
+    num_answers = sum(s.answered_count for s in states)
     # Средний балл — если бы мы считали результаты (заглушка)
     avg_score = 50 if num_sessions > 0 else 0
     return {
@@ -440,27 +816,35 @@ def get_stats():
 @router.post("/aeon/question/{token}")
 async def aeon_next_question_with_token(token: str, data: dict = Body(...)):
     """ИСПРАВЛЕННАЯ логика получения следующего вопроса AEON"""
-    session_state = sessions.get(token)
-    if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if is_token_expired(session_state):
-        raise HTTPException(status_code=403, detail="Срок действия токена истёк")
+    session_state = resolve_session(token, allocate=True)
     
     # Обновляем активность
     update_session_activity(session_state)
     
-    # Ищем первый незаданный вопрос
-    available_questions = [q for q in AEON_QUESTIONS if q["id"] not in session_state.asked_questions]
-    
-    if not available_questions:
+    question = issue_next_question(token, session_state)
+    if question is None:
         return JSONResponse(content={"detail": "Все вопросы заданы"}, status_code=404)
+    return question
+
+def issue_next_question(token: str, session_state: SessionState) -> Optional[Dict[str, Any]]:
+    """Выдаёт следующий незаданный вопрос сессии или None, если вопросы кончились"""
+    # Сдвигаем курсор сессии до первого незаданного вопроса
+    questions = session_questions(session_state)
+    cursor = session_state.current_question_index
+    while cursor < len(questions) and session_state.was_asked(questions[cursor]["id"]):
+        cursor += 1
+    session_state.current_question_index = cursor
     
-    # Берем первый доступный вопрос
-    question = available_questions[0]
+    if cursor >= len(questions):
+        return None
+    
+    question = questions[cursor]
     
     # ИСПРАВЛЕНИЕ: Добавляем вопрос в список заданных ТОЛЬКО после успешной отправки
-    session_state.asked_questions.add(question["id"])
-    session_state.question_order.append(question["id"])
+    session_state.mark_asked(question["id"])
+    session_state.question_ts = session_state.last_activity_ts
+    journal.append("q", session_state.last_activity_ts, token, question["id"])
+    analytics.record_question(session_state.asked_count)
     
     log_event("aeon_question", {"token": token, "question_id": question["id"]})
     
@@ -468,21 +852,29 @@ async def aeon_next_question_with_token(token: str, data: dict = Body(...)):
         "question": question["text"],
         "type": question["type"],
         "question_id": question["id"],
-        "question_number": len(session_state.asked_questions),
-        "total_questions": len(AEON_QUESTIONS)
+        "question_number": session_state.asked_count,
+        "total_questions": len(questions)
     }
 
 @router.post("/aeon/glyph/{token}")
-async def generate_glyph_with_token(token: str, data: dict = Body(...)):
+async def generate_glyph_with_token(token: str, request: Request, data: dict = Body(...)):
     """УЛУЧШЕННАЯ генерация глифа с анализом качества ответов"""
-    session_state = sessions.get(token)
-    if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if is_token_expired(session_state):
-        raise HTTPException(status_code=403, detail="Срок действия токена истёк")
-    
-    answers = session_state.aeon_answers
-    log_event("generate_glyph", {"token": token, "answers_count": len(answers)})
+    session_state = resolve_session(token)
+    key = scored_key(session_state)
+    qualities = None if session_state.has_memo("glyph", key) else await score_session_offloaded(session_state)
+    return conditional_json(request, session_state, "glyph", key,
+                            lambda: build_glyph(token, session_state, qualities))
+
+def build_glyph(token: str, session_state: SessionState,
+                qualities: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, str]:
+    """Глиф по запросу клиента: запрос фиксируется в логе"""
+    log_event("generate_glyph", {"token": token, "answers_count": session_state.answered_count})
+    return render_glyph(session_state, qualities)
+
+def render_glyph(session_state: SessionState,
+                 qualities: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, str]:
+    """Глиф и профиль кандидата по ответам сессии (qualities — готовые оценки ответов)"""
+    answers = dict(session_state.iter_answers())
     
     if not answers:
         return {
@@ -491,23 +883,18 @@ async def generate_glyph_with_token(token: str, data: dict = Body(...)):
         }
     
     # Анализируем качество ответов
-    total_quality_score = 0
-    quality_details = []
-    
-    for question_id, answer in answers.items():
-        question_data = next((q for q in AEON_QUESTIONS if q["id"] == question_id), None)
-        if question_data:
-            keywords = question_data.get("keywords", [])
-            quality = analyze_answer_quality(answer, keywords)
-            total_quality_score += quality["score"]
-            quality_details.append(quality)
+    if qualities is None:
+        qualities = score_session(session_state)
+    total_quality_score = sum(quality["score"] for quality in qualities.values())
+    bank = session_bank(session_state)
+    total_questions = len(session_questions(session_state))
     
     avg_quality = total_quality_score / len(answers) if answers else 0
-    completion_rate = (len(answers) / len(AEON_QUESTIONS)) * 100
+    completion_rate = (len(answers) / total_questions) * 100 if total_questions else 0
     
     # Анализируем типы ответов
-    technical_count = sum(1 for q_id in answers.keys() 
-                         if any(q["id"] == q_id and q["type"] == "technical" for q in AEON_QUESTIONS))
+    technical_count = sum(1 for q_id in answers
+                         if bank.by_id.get(q_id, {}).get("type") == "technical")
     soft_count = len(answers) - technical_count
     
     # Определяем профиль на основе комплексного анализа
@@ -526,22 +913,39 @@ async def generate_glyph_with_token(token: str, data: dict = Body(...)):
     
     # Добавляем детали анализа
     profile += f"\n\n📊 Детали анализа:\n"
-    profile += f"• Завершенность: {completion_rate:.1f}% ({len(answers)}/{len(AEON_QUESTIONS)})\n"
+    profile += f"• Завершенность: {completion_rate:.1f}% ({len(answers)}/{total_questions})\n"
     profile += f"• Технические вопросы: {technical_count}, Soft skills: {soft_count}\n"
     profile += f"• Среднее качество ответов: {avg_quality:.1f}/100"
     
     return {"glyph": glyph, "profile": profile}
 
 @router.post("/aeon/summary/{token}")
-async def aeon_summary_with_token(token: str):
+async def aeon_summary_with_token(token: str, request: Request):
     """УЛУЧШЕННАЯ генерация сводки с детальным анализом"""
-    session_state = sessions.get(token)
-    if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if is_token_expired(session_state):
-        raise HTTPException(status_code=403, detail="Срок действия токена истёк")
+    session_state = resolve_session(token)
     
-    answers = session_state.aeon_answers
+    # Сводка зависит от длительности интервью в минутах — она входит в ключ
+    minutes = int((time.time() - session_state.created_ts) / 60)
+    key = scored_key(session_state, minutes)
+    qualities = None if session_state.has_memo("summary", key) else await score_session_offloaded(session_state)
+    return conditional_json(request, session_state, "summary", key,
+                            lambda: build_summary(token, session_state, qualities))
+
+def build_summary(token: str, session_state: SessionState,
+                  qualities: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Сводка по запросу клиента: запрос фиксируется в логе"""
+    if qualities is None and session_state.answered_count:
+        qualities = score_session(session_state)
+    summary = render_summary(session_state, qualities)
+    if session_state.answered_count:
+        log_event("aeon_summary", {"token": token, "answers_count": session_state.answered_count,
+                                   "performance_score": calculate_performance_score(session_state, qualities)})
+    return summary
+
+def render_summary(session_state: SessionState,
+                   qualities: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Подробная текстовая сводка по ответам сессии (qualities — готовые оценки ответов)"""
+    answers = dict(session_state.iter_answers())
     total_answers = len(answers)
     
     if total_answers == 0:
@@ -550,24 +954,17 @@ async def aeon_summary_with_token(token: str):
         }
     
     # Детальный анализ ответов
-    quality_scores = []
-    keyword_matches = []
-    has_examples_count = 0
-    
-    for question_id, answer in answers.items():
-        question_data = next((q for q in AEON_QUESTIONS if q["id"] == question_id), None)
-        if question_data:
-            keywords = question_data.get("keywords", [])
-            quality = analyze_answer_quality(answer, keywords)
-            quality_scores.append(quality["score"])
-            keyword_matches.append(quality["keyword_matches"])
-            if quality["has_examples"]:
-                has_examples_count += 1
+    if qualities is None:
+        qualities = score_session(session_state)
+    quality_scores = [quality["score"] for quality in qualities.values()]
+    relevance_scores = [quality.get("relevance", 0) for quality in qualities.values()]
+    has_examples_count = sum(1 for quality in qualities.values() if quality.get("has_examples"))
+    total_questions = max(1, len(session_questions(session_state)))
     
     # Расчет метрик
     avg_quality = sum(quality_scores) / len(quality_scores) if quality_scores else 0
-    performance_score = calculate_performance_score(session_state)
-    total_time = (datetime.now(timezone.utc) - session_state.created_at).total_seconds() / 60
+    performance_score = calculate_performance_score(session_state, qualities)
+    total_time = (time.time() - session_state.created_ts) / 60
     
     # Определение уровня качества
     if avg_quality >= 80:
@@ -586,7 +983,7 @@ async def aeon_summary_with_token(token: str):
     summary = f"""📊 **Подробный анализ интервью**
 
 **Общая статистика:**
-• Отвечено на {total_answers} из {len(AEON_QUESTIONS)} вопросов ({(total_answers/len(AEON_QUESTIONS)*100):.1f}%)
+• Отвечено на {total_answers} из {total_questions} вопросов ({(total_answers/total_questions*100):.1f}%)
 • Общее время интервью: {int(total_time)} минут
 • Итоговый балл: {performance_score}/100
 
@@ -594,7 +991,7 @@ async def aeon_summary_with_token(token: str):
 • Уровень качества: {quality_level}
 • Средний балл качества: {avg_quality:.1f}/100
 • Ответы с примерами: {has_examples_count}/{total_answers}
-• Релевантность содержания: {(sum(keyword_matches)/len(keyword_matches)/4*100):.1f}% (в среднем)
+• Релевантность содержания: {(sum(relevance_scores)/len(relevance_scores)*100 if relevance_scores else 0):.1f}% (в среднем)
 
 **Профессиональная оценка:**
 {recommendation}
@@ -609,18 +1006,18 @@ async def aeon_summary_with_token(token: str):
 {f'• Способность приводить конкретные примеры' if has_examples_count >= total_answers/2 else ''}
 {f'• Хорошая скорость реакции' if total_time <= 30 else ''}"""
 
-    log_event("aeon_summary", {"token": token, "answers_count": total_answers, "performance_score": performance_score})
+    duplicates = session_state.duplicates
+    if duplicates:
+        summary += "\n\n**Проверка самостоятельности:**\n" + "\n".join(
+            f"• ⚠️ Ответ на {item['question_id']} почти совпадает с ответом другого кандидата "
+            f"(сходство {item['similarity']:.0%})" for item in duplicates)
     
-    return {"summary": summary}
+    return {"summary": summary, "near_duplicates": duplicates}
 
 @router.post("/aeon/task/{token}")
 async def aeon_task_with_token(token: str, data: dict = Body(...)):
     """Сгенерировать задание для конкретной сессии"""
-    session_state = sessions.get(token)
-    if not session_state:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if is_token_expired(session_state):
-        raise HTTPException(status_code=403, detail="Срок действия токена истёк")
+    session_state = resolve_session(token)
     
     candidate = data.get("candidate", "Кандидат")
     position = data.get("position", "Специалист")
@@ -629,38 +1026,110 @@ async def aeon_task_with_token(token: str, data: dict = Body(...)):
     task = f"Создайте план развития команды из 5 человек для {position}. Включите: 1) Анализ текущих навыков 2) Определение целей 3) План обучения 4) Метрики успеха 5) Временные рамки"
     example = "Пример: Анализ показал нехватку навыков в области проектного управления. Цель - повысить эффективность на 30%. План включает тренинги, менторство и практические проекты на 3 месяца."
     
-    # Попытаемся использовать OpenAI
-    try:
-        if OPENAI_API_KEY and not OPENAI_API_KEY.startswith("sk-proj-X1"):
-            prompt = f"Сгенерируй тестовое задание для кандидата {candidate} на позицию {position} и пример его выполнения. Ответ верни в формате JSON: {{\"task\": \"...\", \"example\": \"...\"}}"
-            payload = {
-                "model": "gpt-3.5-turbo",
-                "messages": [
-                    {"role": "system", "content": AEON_CONTEXT},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 500,
-                "temperature": 0.7
-            }
-            headers = {
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            async with httpx.AsyncClient() as client:
-                response = await client.post("https://api.openai.com/v1/chat/completions", json=payload, headers=headers)
-                if response.status_code == 200:
-                    content = response.json()["choices"][0]["message"]["content"]
-                    try:
-                        import json as pyjson
-                        result = pyjson.loads(content)
-                        return result
-                    except:
-                        pass
-    except:
-        pass
+    # Попытаемся использовать модель (OpenAI или совместимый сервер из OPENAI_BASE_URL)
+    if llm_configured(OPENAI_API_KEY):
+        prompt = f"Сгенерируй тестовое задание для кандидата {candidate} на позицию {position} и пример его выполнения. Ответ верни в формате JSON: {{\"task\": \"...\", \"example\": \"...\"}}"
+        result = await chat_completion_json(OPENAI_API_KEY, [
+            {"role": "system", "content": AEON_CONTEXT},
+            {"role": "user", "content": prompt}
+        ], max_tokens=500, temperature=0.7)
+        if result is not None:
+            return result
     
     return {"task": task, "example": example}
 
+# ===== WEBSOCKET-КАНАЛ ИНТЕРВЬЮ =====
+
+@router.websocket("/ws/session/{token}")
+async def interview_channel(websocket: WebSocket, token: str):
+    """Интервью через один WebSocket вместо отдельных HTTP-запросов на каждый шаг.
+
+    Сообщения клиента: {"type": "next"}, {"type": "answer", "question_id", "answer"},
+    {"type": "status"}, {"type": "glyph"}, {"type": "summary"}.
+    Сервер отвечает сообщениями question/done/saved/score/status/glyph/summary/error
+    (полезная нагрузка question/status/glyph/summary — в поле data); после каждого
+    сохранённого ответа отправляется обновлённый балл.
+    """
+    await websocket.accept()
+    try:
+        session_state = resolve_session(token)
+    except HTTPException as exc:
+        await websocket.send_json({"type": "error", "status": exc.status_code, "detail": exc.detail})
+        await websocket.close(code=4000 + exc.status_code)
+        return
+    log_event("ws_connect", {"token": token})
+    
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Некорректный JSON"})
+                continue
+            if is_token_expired(session_state):
+                await websocket.send_json({"type": "error", "status": 403, "detail": "Срок действия токена истёк"})
+                await websocket.close(code=4403)
+                return
+            kind = message.get("type") if isinstance(message, dict) else None
+            
+            if sessions.get(token) is not session_state:
+                # Сессия ещё не в словаре: её мог создать HTTP-запрос или убрать
+                # админка — перечитываем; первая запись заносит пустую сессию в словарь
+                try:
+                    session_state = resolve_session(token, allocate=kind in ("next", "answer"))
+                except HTTPException as exc:
+                    await websocket.send_json({"type": "error", "status": exc.status_code, "detail": exc.detail})
+                    await websocket.close(code=4000 + exc.status_code)
+                    return
+            
+            if kind == "next":
+                update_session_activity(session_state)
+                question = issue_next_question(token, session_state)
+                if question is None:
+                    await websocket.send_json({"type": "done", "detail": "Все вопросы заданы"})
+                else:
+                    await websocket.send_json({"type": "question", "data": question})
+            elif kind == "answer":
+                if session_state.completed:
+                    await websocket.send_json({"type": "error", "status": 403, "detail": "Тест уже завершён"})
+                    continue
+                answer = {key: value for key, value in message.items() if key != "type"}
+                update_session_activity(session_state)
+                error = check_answer(session_state, answer)
+                if error is not None:
+                    await websocket.send_json({"type": "error", "status": error[0], "detail": error[1]})
+                    continue
+                # Оценка, аналитика, поиск копий и релевантность — не в цикле событий
+                status_data = await asyncio.to_thread(save_answer_with_status, token, session_state, answer)
+                await websocket.send_json({"type": "saved", "question_id": answer.get("question_id")})
+                await websocket.send_json({
+                    "type": "score",
+                    "questions_answered": status_data["questions_answered"],
+                    "current_performance": status_data["current_performance"],
+                    "revision": session_state.revision
+                })
+            elif kind == "status":
+                status_data = await asyncio.to_thread(session_status_data, token, session_state)
+                await websocket.send_json({"type": "status", "data": status_data})
+            elif kind == "glyph":
+                key = scored_key(session_state)
+                qualities = (None if session_state.has_memo("glyph_data", key)
+                             else await score_session_offloaded(session_state))
+                glyph = session_state.memo("glyph_data", key, lambda: build_glyph(token, session_state, qualities))
+                await websocket.send_json({"type": "glyph", "data": glyph})
+            elif kind == "summary":
+                minutes = int((time.time() - session_state.created_ts) / 60)
+                key = scored_key(session_state, minutes)
+                qualities = (None if session_state.has_memo("summary_data", key)
+                             else await score_session_offloaded(session_state))
+                summary = session_state.memo("summary_data", key,
+                                             lambda: build_summary(token, session_state, qualities))
+                await websocket.send_json({"type": "summary", "data": summary})
+            else:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Неизвестный тип сообщения"})
+    except WebSocketDisconnect:
+        log_event("ws_disconnect", {"token": token})
+
 # ===== СТАРЫЕ ЭНДПОИНТЫ (для обратной совместимости) =====
 
 @router.post("/aeon/glyph")
@@ -698,12 +1167,13 @@ async def generate_glyph_legacy(data: dict):
 async def aeon_next_question_legacy(data: dict):
     """Старый эндпоинт для получения вопросов (без токена)"""
     history = data.get("history", [])
+    questions = question_banks.current().sequence()
     
-    if len(history) >= len(AEON_QUESTIONS):
+    if len(history) >= len(questions):
         return {"question": None}
     
     # Возвращаем вопрос по индексу
-    question = AEON_QUESTIONS[len(history)]
+    question = questions[len(history)]
     return {
         "question": question["text"],
         "type": question["type"]
@@ -736,41 +1206,79 @@ async def aeon_task_legacy(data: dict):
 
 # ===== ADMIN ENDPOINTS =====
 
+# Записей на странице /admin/log; в кэше фрагментов держится только первая (новые записи)
+ADMIN_LOG_PAGE = int(os.getenv("AEON_ADMIN_LOG_PAGE", "200"))
+# Отрендеренные строки /admin/log (лог только дописывается)
+log_rows = AppendOnlyFragments(window=ADMIN_LOG_PAGE)
+# Сколько отрендеренных страниц сессий (с текстами ответов) держать в памяти
+ADMIN_DETAIL_CACHE = int(os.getenv("AEON_ADMIN_DETAIL_CACHE", "32"))
+session_pages = RenderedPages(ADMIN_DETAIL_CACHE)
+
+@admin_router.get("/static/{name}")
+def static_file(name: str, request: Request, v: Optional[str] = None):
+    """Общие файлы админки; адрес с актуальным ?v= кэшируется браузером на год"""
+    asset = static_asset(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    cache_control = "public, max-age=31536000, immutable" if v == asset.version else "no-cache"
+    return precompressed_response(request, asset.variants, asset.media_type, asset.version,
+                                  {"Cache-Control": cache_control})
+
 @admin_router.get("/admin", response_class=HTMLResponse)
 def admin_sessions(request: Request):
-    session_list = [
-        {
-            "token": token, 
-            "created_at": s.created_at, 
-            "completed": s.completed, 
-            "answers": len(s.aeon_answers),
-            "total_answers": len(s.answers)
-        }
-        for token, s in sessions.items()
-    ]
-    return templates.TemplateResponse("admin_sessions.html", {"request": request, "sessions": session_list})
+    # Строка сессии перерисовывается, только если изменилась её ревизия
+    rows = [state.memo("admin_row", (state.revision,),
+                       lambda: render_fragment("admin_session_row.html", token=token, session=state))
+            for token, state in list(sessions.items())]
+    return render_template("admin_sessions.html", {"request": request, "rows": join_fragments(rows)})
 
 @admin_router.get("/admin/session/{token}", response_class=HTMLResponse)
 def admin_session_detail(request: Request, token: str):
     session_state = sessions.get(token)
     if not session_state:
         return HTMLResponse("<h2>Сессия не найдена</h2>", status_code=404)
-    return templates.TemplateResponse("admin_session_detail.html", {"request": request, "token": token, "session": session_state})
+    body = session_pages.get(token, session_state.revision, lambda: render_fragment(
+        "admin_session_body.html", token=token, session=session_state))
+    return render_template("admin_session_detail.html", {"request": request, "body": join_fragments([body])})
 
 @admin_router.post("/admin/session/{token}/delete")
 def admin_delete_session(request: Request, token: str):
-    sessions.pop(token, None)
+    expires = retire_token(token)
+    session_state = sessions.pop(token, None)
+    if session_state is not None:
+        completed = int(session_state.completed)
+        admin_events.publish("deleted", {"token": token}, {
+            "total": -1,
+            "completed": -completed,
+            "active": completed - 1,
+            "total_aeon_answers": -session_state.answered_count
+        })
+        session_state.release_answers()
+        rematch_duplicates(near_duplicates.remove(token))
+    session_pages.discard(token)
+    journal.append("d", token, expires)
     log_event("delete_session", {"token": token})
     from fastapi.responses import RedirectResponse
     return RedirectResponse(url="/admin", status_code=303)
 
+@admin_router.post("/admin/questions/reload")
+def admin_reload_questions():
+    """Перечитать банк вопросов без рестарта воркера"""
+    try:
+        bank = question_banks.reload()
+    except (OSError, QuestionBankError) as exc:
+        raise HTTPException(status_code=400, detail=f"Не удалось загрузить банк вопросов: {exc}")
+    log_event("reload_questions", {"version": bank.version, "questions": len(bank)})
+    return {"version": bank.version, "questions": len(bank)}
+
 @admin_router.get("/admin/stats", response_class=HTMLResponse)
 def admin_stats(request: Request):
-    total = len(sessions)
-    completed = sum(1 for s in sessions.values() if s.completed)
+    states = list(sessions.values())  # Снимок: словарь меняют другие потоки
+    total = len(states)
+    completed = sum(1 for s in states if s.completed)
     active = total - completed
-    total_aeon_answers = sum(len(s.aeon_answers) for s in sessions.values())
-    return templates.TemplateResponse("admin_stats.html", {
+    total_aeon_answers = sum(s.answered_count for s in states)
+    return render_template("admin_stats.html", {
         "request": request, 
         "total": total, 
         "completed": completed, 
@@ -778,28 +1286,148 @@ def admin_stats(request: Request):
         "total_aeon_answers": total_aeon_answers
     })
 
+@admin_router.get("/admin/events")
+async def admin_event_stream(request: Request):
+    """Поток изменений (SSE) для обновления страниц админки на месте"""
+    queue = admin_events.subscribe()
+    
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    message = ": ping\n\n"
+                yield message
+        finally:
+            admin_events.unsubscribe(queue)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@admin_router.get("/admin/admission")
+def admin_admission_stats():
+    """Счётчики контроля допуска: допущенные, ожидавшие и сброшенные запросы"""
+    return admission.snapshot()
+
+@admin_router.get("/admin/journal")
+def admin_journal_status():
+    """Состояние журнала: текущий сегмент, размер буфера, ошибки записи"""
+    return journal.status()
+
+@admin_router.get("/admin/memory")
+def admin_memory():
+    """Приблизительная память по подсистемам (по выборке) и RSS процесса"""
+    templates = get_templates() if get_templates.cache_info().currsize else None
+    return subsystem_report(sessions, log, templates, extra={
+        "retired_tokens": estimate(retired_tokens, retired_tokens.items()),
+        "idempotency_keys": usage(idempotency),
+        "admin_log_rows": usage(log_rows),
+        "admin_session_pages": usage(session_pages),
+    })
+
+@admin_router.get("/admin/scoring")
+def admin_scoring_stats():
+    """Пулы оценки ответов: задачи, в работе, глубина очереди, среднее время"""
+    return scoring.snapshot()
+
+@admin_router.get("/admin/idempotency")
+def admin_idempotency_stats():
+    """Счётчики Idempotency-Key: попадания, промахи, ожидания дубликатов, конфликты"""
+    return idempotency.snapshot()
+
+@admin_router.post("/admin/memory/snapshot")
+def admin_memory_snapshot():
+    """Снапшот tracemalloc (при первом вызове трассировка аллокаций включается)"""
+    return profiler.snapshot()
+
+@admin_router.get("/admin/memory/diff")
+def admin_memory_diff(since: Optional[int] = None, until: Optional[int] = None,
+                      group_by: str = "lineno", limit: int = 20):
+    """Где выросла память: дифф снапшота since с until или с текущим моментом"""
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=422, detail="group_by: lineno, filename или traceback")
+    diff = profiler.diff(since, until, group_by, max(1, min(limit, 200)))
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Снапшот не найден — сначала POST /admin/memory/snapshot")
+    return diff
+
+@admin_router.delete("/admin/memory/snapshots")
+def admin_memory_stop():
+    """Удалить снапшоты и выключить tracemalloc"""
+    profiler.stop()
+    return profiler.status()
+
+@admin_router.get("/admin/analytics", response_class=HTMLResponse)
+def admin_analytics(request: Request):
+    """Гистограммы баллов, статистика по вопросам и воронка — из готовых агрегатов"""
+    report = analytics.report()
+    archived = archive.report() if archive.enabled else None
+    return render_template("admin_analytics.html", {
+        "request": request, "report": report, "archive": archived
+    })
+
+@admin_router.get("/admin/analytics.json")
+def admin_analytics_json():
+    report = analytics.report()
+    if archive.enabled:
+        report["archive"] = archive.report()
+    return report
+
+@admin_router.post("/admin/archive/sweep")
+def admin_archive_sweep():
+    """Перенести завершённые и истёкшие сессии в архив, не дожидаясь фоновой задачи"""
+    if not archive.enabled:
+        raise HTTPException(status_code=400, detail="Архив не настроен (AEON_ARCHIVE_DIR)")
+    return {"archived": archive_idle_sessions(), "rows": archive.sessions}
+
 @admin_router.get("/admin/log", response_class=HTMLResponse)
-def admin_log(request: Request):
-    return templates.TemplateResponse("admin_log.html", {"request": request, "log": list(reversed(log))})
+def admin_log(request: Request, page: int = 1):
+    """Лог от новых записей к старым, по ADMIN_LOG_PAGE на страницу"""
+    count = len(log)
+    pages = max(1, -(-count // ADMIN_LOG_PAGE))
+    page = max(1, min(page, pages))
+    stop = count - (page - 1) * ADMIN_LOG_PAGE
+    rows = log_rows.rows(log, lambda entry: render_fragment("admin_log_row.html", entry=entry),
+                         max(0, stop - ADMIN_LOG_PAGE), stop)
+    return render_template("admin_log.html", {"request": request, "rows": join_fragments(reversed(rows)),
+                                              "page": page, "pages": pages})
 
 @admin_router.get("/admin/export/sessions")
 def export_sessions():
+    import csv
+    from io import StringIO
+    
     def generate():
         output = StringIO()
         writer = csv.writer(output)
         writer.writerow(["token", "created_at", "completed", "answers", "aeon_answers"])
-        for token, s in sessions.items():
-            writer.writerow([token, s.created_at, s.completed, len(s.answers), len(s.aeon_answers)])
+        for token, s in list(sessions.items()):
+            writer.writerow([token, s.created_at, s.completed, s.answer_count, s.answered_count])
         yield output.getvalue()
+        # Архивные сессии читаются пачками прямо из колонок
+        for batch in archive.iter_sessions() if archive.enabled else ():
+            output = StringIO()
+            writer = csv.writer(output)
+            for token, created_ts, completed, answer_count, answered in batch:
+                writer.writerow([token, datetime.fromtimestamp(created_ts, timezone.utc), completed,
+                                 answer_count, answered])
+            yield output.getvalue()
     return StreamingResponse(generate(), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=sessions.csv"})
 
 @admin_router.get("/admin/export/log")
 def export_log():
+    import csv
+    from io import StringIO
+    
     def generate():
         output = StringIO()
         writer = csv.writer(output)
-        writer.writerow(["time", "action", "details"])
+        writer.writerow(["time", "action", "details", "trace_id"])
         for entry in log:
-            writer.writerow([entry["time"], entry["action"], str(entry["details"])])
+            writer.writerow([entry["time"], entry["action"], str(entry["details"]), entry.get("trace_id", "")])
         yield output.getvalue()
     return StreamingResponse(generate(), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=log.csv"})
\ No newline at end of file
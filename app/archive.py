@@ -0,0 +1,471 @@
+"""Колоночный холодный архив завершённых и истёкших сессий.
+
+Горячий словарь sessions держит только живые интервью. Сессии, завершённые
+давно (или с истёкшим токеном), переносятся сюда и удаляются из памяти.
+
+Формат — набор файлов только для дописывания в каталоге AEON_ARCHIVE_DIR:
+по одному файлу на колонку с типизированными значениями фиксированной
+ширины (array typecode) плюс текстовый сегмент, где каждая сессия — одна
+JSON-строка [token, record] в формате SessionState.to_record(). Строка
+сессий i во всех колонках описывает одну и ту же сессию. Колонки ответов
+разбиты на партиции по вопросу (answers-NNNN.*): метрики вопроса — это
+sum() и Counter() по его колонкам, без группировки в Python.
+
+Токены лежат дважды: 16-байтный ключ фиксированной ширины (байты UUID или
+хеш подписанного токена) для поиска по колонке и сама строка токена в
+отдельном сегменте sessions.tokens с концами в колонке token_end — экспорт
+и восстановление после рестарта берут токен оттуда, не разбирая JSON сессии.
+
+Пакет сначала дописывается во все файлы и фиксируется fsync, затем
+атомарно переписывается archive.json со счётчиками строк. Читатели видят
+только зафиксированные строки; хвост, оставшийся после сбоя между этими
+шагами, обрезается при открытии.
+
+Чтение идёт через mmap без копирования: колонка — memoryview нужного типа.
+Результаты поиска по токену (и промахи) кэшируются до следующего пакета —
+повторный запрос итога не сканирует колонку токенов заново.
+Агрегаты (баллы по дням, длины ответов, метрики вопросов) досчитываются
+инкрементально только по новым строкам, поэтому повторный отчёт стоит O(1).
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+import uuid
+from array import array
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.analytics import SCORE_BUCKETS, score_bucket, score_labels
+from app.state import SessionState
+
+ARCHIVE_DIR = os.getenv("AEON_ARCHIVE_DIR") or None
+# Через сколько секунд бездействия завершённая сессия уходит в архив
+ARCHIVE_AFTER_SECONDS = int(os.getenv("AEON_ARCHIVE_AFTER_SECONDS", "3600"))
+# Период фонового переноса сессий в архив
+ARCHIVE_SWEEP_SECONDS = int(os.getenv("AEON_ARCHIVE_SWEEP_SECONDS", "60"))
+# Сколько результатов поиска по токену (строка или промах) держать в кэше
+ARCHIVE_LOOKUP_CACHE = int(os.getenv("AEON_ARCHIVE_LOOKUP_CACHE", "4096"))
+
+# Колонки сессий: имя -> typecode
+SESSION_COLUMNS = (
+    ("created", "d"),  # Время создания (epoch)
+    ("ended", "d"),  # Время завершения или последней активности
+    ("day", "I"),  # День окончания, дней от эпохи
+    ("score", "h"),  # Итоговый балл; -1 — сессия не завершена
+    ("asked", "H"),  # Сколько вопросов задано
+    ("answered", "H"),  # Сколько вопросов отвечено
+    ("answers", "I"),  # Сколько раз присылались ответы
+    ("flags", "B"),
+    ("text_end", "Q"),  # Конец JSON-строки сессии в текстовом сегменте
+    ("token_end", "Q"),  # Конец строки токена в сегменте токенов
+)
+# Колонки ответов; у каждого вопроса своя партиция
+ANSWER_COLUMNS = (
+    ("session", "I"),  # Строка сессии
+    ("words", "I"),
+    ("quality", "B"),
+)
+TOKEN_WIDTH = 16
+
+FLAG_COMPLETED = 1
+FLAG_EXPIRED = 2
+FLAG_HASHED_TOKEN = 4  # Токен не UUID: в колонке ключей хеш, совпадение сверяется по строке токена
+
+# Границы корзин гистограммы длины ответа (в словах)
+WORD_BUCKETS = (10, 25, 50, 100, 200)
+
+# Метрики одного ответа: (id вопроса, число слов, оценка качества 0–100)
+AnswerMetrics = Tuple[str, int, int]
+
+
+def token_key(token: str) -> Tuple[bytes, bool]:
+    """16 байт для колонки токенов и признак того, что это хеш"""
+    try:
+        return uuid.UUID(token).bytes, False
+    except ValueError:
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=TOKEN_WIDTH).digest(), True
+
+
+def word_bucket(words: int) -> int:
+    for index, edge in enumerate(WORD_BUCKETS):
+        if words < edge:
+            return index
+    return len(WORD_BUCKETS)
+
+
+def word_labels() -> List[str]:
+    edges = (0,) + WORD_BUCKETS
+    labels = [f"{low}–{high - 1}" for low, high in zip(edges, edges[1:])]
+    return labels + [f"{WORD_BUCKETS[-1]}+"]
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _ended_ts(state: SessionState) -> float:
+    if state.result is not None:
+        try:
+            return datetime.fromisoformat(state.result.completed_at).timestamp()
+        except ValueError:
+            pass
+    return state.last_activity_ts
+
+
+class ArchiveStats:
+    """Агрегаты по архиву, досчитываемые по новым строкам"""
+
+    def __init__(self):
+        self.session_rows = 0
+        self.completed = 0
+        self.expired = 0
+        self.score_sum = 0
+        self.score_histogram = [0] * SCORE_BUCKETS
+        self.days: Dict[int, List[int]] = {}  # День -> [завершено, сумма баллов]
+        self.length_histogram = [0] * (len(WORD_BUCKETS) + 1)
+        self.question_rows: List[int] = []  # Просканировано строк в партиции вопроса
+        self.question_words: List[int] = []
+        self.question_quality: List[int] = []
+
+    def fold(self, archive: "ColumnarArchive", session_rows: int, question_rows: List[int]):
+        start, stop = self.session_rows, session_rows
+        if stop > start:
+            # Counter по memoryview и zip из memoryview считается целиком в C
+            for flags, count in Counter(archive.column("flags", stop)[start:]).items():
+                if flags & FLAG_COMPLETED:
+                    self.completed += count
+                if flags & FLAG_EXPIRED:
+                    self.expired += count
+            days = archive.column("day", stop)[start:]
+            scores = archive.column("score", stop)[start:]
+            for (day, score), count in Counter(zip(days, scores)).items():
+                if score < 0:
+                    continue
+                self.score_sum += score * count
+                self.score_histogram[score_bucket(score)] += count
+                per_day = self.days.setdefault(day, [0, 0])
+                per_day[0] += count
+                per_day[1] += score * count
+            self.session_rows = stop
+
+        for question, stop in enumerate(question_rows):
+            if question == len(self.question_rows):
+                self.question_rows.append(0)
+                self.question_words.append(0)
+                self.question_quality.append(0)
+            start = self.question_rows[question]
+            if stop <= start:
+                continue
+            words = archive.column("words", stop, question)[start:]
+            self.question_words[question] += sum(words)
+            self.question_quality[question] += sum(archive.column("quality", stop, question)[start:])
+            for value, count in Counter(words).items():
+                self.length_histogram[word_bucket(value)] += count
+            self.question_rows[question] = stop
+
+    def report(self, question_ids: List[str]) -> Dict[str, Any]:
+        scored = sum(self.score_histogram)
+        return {
+            "sessions": self.session_rows,
+            "completed": self.completed,
+            "expired": self.expired,
+            "answers": sum(self.question_rows),
+            "avg_score": self.score_sum / scored if scored else 0,
+            "score_histogram": list(zip(score_labels(), self.score_histogram)),
+            "scores_by_day": [
+                {
+                    "day": datetime.fromtimestamp(day * 86400, timezone.utc).date().isoformat(),
+                    "completed": completed,
+                    "avg_score": score_sum / completed,
+                }
+                for day, (completed, score_sum) in sorted(self.days.items())
+            ],
+            "length_histogram": list(zip(word_labels(), self.length_histogram)),
+            "questions": [
+                {
+                    "question_id": question_ids[question],
+                    "answers": answers,
+                    "avg_words": self.question_words[question] / answers,
+                    "avg_quality": self.question_quality[question] / answers,
+                }
+                for question, answers in enumerate(self.question_rows) if answers
+            ],
+        }
+
+
+class ColumnarArchive:
+    """Архив сессий только для дописывания с чтением через mmap"""
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.enabled = directory is not None
+        self.sessions = 0  # Зафиксированные строки сессий
+        self.question_rows: List[int] = []  # Зафиксированные строки ответов по вопросам
+        self.text_bytes = 0
+        self.token_bytes = 0
+        self.question_ids: List[str] = []  # Словарь вопросов архива
+        self._question_index: Dict[str, int] = {}
+        self._lock = threading.Lock()  # Одна запись за раз
+        self._stats_lock = threading.Lock()
+        self._stats = ArchiveStats()
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._lookups: "OrderedDict[str, Optional[int]]" = OrderedDict()  # Токен -> строка или None
+        self._lookup_lock = threading.Lock()
+        self._opened = False
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _answer_file(question: int, name: str) -> str:
+        return f"answers-{question:04d}.{name}"
+
+    @property
+    def answers(self) -> int:
+        return sum(self.question_rows)
+
+    def memory_items(self) -> tuple:
+        """Отображённые в память файлы колонок (mmap, не куча)"""
+        return tuple(self._maps.values())
+
+    def _files(self) -> Iterator[Tuple[str, str, int]]:
+        """(имя файла, typecode, число строк) для всех колонок"""
+        for name, typecode in SESSION_COLUMNS:
+            yield f"sessions.{name}", typecode, self.sessions
+        yield "sessions.token", "B", self.sessions * TOKEN_WIDTH
+        yield "sessions.tokens", "B", self.token_bytes
+        for question, rows in enumerate(self.question_rows):
+            for name, typecode in ANSWER_COLUMNS:
+                yield self._answer_file(question, name), typecode, rows
+        yield "sessions.text", "B", self.text_bytes
+
+    def open(self):
+        """Читает счётчики и обрезает незафиксированный хвост после сбоя"""
+        if not self.enabled or self._opened:
+            return
+        with self._lock:
+            if self._opened:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                with open(self._path("archive.json"), encoding="utf-8") as fh:
+                    meta = json.load(fh)
+            except FileNotFoundError:
+                meta = {}
+            self.sessions = meta.get("sessions", 0)
+            self.question_rows = list(meta.get("question_rows", []))
+            self.text_bytes = meta.get("text_bytes", 0)
+            self.token_bytes = meta.get("token_bytes", 0)
+            self.question_ids = list(meta.get("questions", []))
+            self._question_index = {qid: index for index, qid in enumerate(self.question_ids)}
+            for filename, typecode, rows in self._files():
+                with open(self._path(filename), "ab") as fh:
+                    if fh.tell() != rows * array(typecode).itemsize:
+                        fh.truncate(rows * array(typecode).itemsize)
+            self._opened = True
+
+    # --- Запись ---
+
+    def append(self, items: Iterable[Tuple[str, SessionState, List[AnswerMetrics]]]) -> int:
+        """Дописывает пакет сессий; возвращает число добавленных строк"""
+        if not self.enabled:
+            return 0
+        self.open()
+        with self._lock:
+            columns = {f"sessions.{name}": array(typecode) for name, typecode in SESSION_COLUMNS}
+            tokens = bytearray()
+            token_text = bytearray()
+            text = bytearray()
+            questions = list(self.question_ids)
+            question_index = dict(self._question_index)
+            question_rows = list(self.question_rows)
+            partitions: Dict[int, Tuple[array, ...]] = {}
+            row = self.sessions
+            for token, state, answer_metrics in items:
+                key, hashed = token_key(token)
+                ended = _ended_ts(state)
+                text += (_dumps([token, state.to_record()]) + "\n").encode("utf-8")
+                tokens += key
+                token_text += token.encode("utf-8")
+                flags = (FLAG_COMPLETED if state.completed else FLAG_EXPIRED) | (FLAG_HASHED_TOKEN if hashed else 0)
+                values = (state.created_ts, ended, int(ended // 86400),
+                          state.result.performance_score if state.result is not None else -1,
+                          state.asked_count, state.answered_count, state.answer_count, flags,
+                          self.text_bytes + len(text), self.token_bytes + len(token_text))
+                for (name, _), value in zip(SESSION_COLUMNS, values):
+                    columns[f"sessions.{name}"].append(value)
+                for question_id, words, quality in answer_metrics:
+                    index = question_index.get(question_id)
+                    if index is None:
+                        index = question_index[question_id] = len(questions)
+                        questions.append(question_id)
+                        question_rows.append(0)
+                    question_rows[index] += 1
+                    partition = partitions.get(index)
+                    if partition is None:
+                        partition = partitions[index] = tuple(array(typecode) for _, typecode in ANSWER_COLUMNS)
+                    partition[0].append(row)
+                    partition[1].append(words)
+                    partition[2].append(quality)
+                row += 1
+            added = row - self.sessions
+            if not added:
+                return 0
+            columns["sessions.token"] = tokens
+            columns["sessions.tokens"] = token_text
+            columns["sessions.text"] = text
+            for index, partition in partitions.items():
+                for (name, _), data in zip(ANSWER_COLUMNS, partition):
+                    columns[self._answer_file(index, name)] = data
+
+            for filename, data in columns.items():
+                if not data:
+                    continue
+                with open(self._path(filename), "ab") as fh:
+                    fh.write(data)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            meta = {
+                "sessions": row,
+                "question_rows": question_rows,
+                "text_bytes": self.text_bytes + len(text),
+                "token_bytes": self.token_bytes + len(token_text),
+                "questions": questions,
+            }
+            tmp = self._path("archive.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(_dumps(meta))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, self._path("archive.json"))
+            # Новые строки становятся видны читателям только теперь
+            self.question_ids = questions
+            self._question_index = question_index
+            self.text_bytes = meta["text_bytes"]
+            self.token_bytes = meta["token_bytes"]
+            self.question_rows = question_rows
+            with self._lookup_lock:
+                self.sessions = row
+                self._lookups.clear()  # Промахи по добавленным токенам больше не верны
+            return added
+
+    # --- Чтение ---
+
+    def _map(self, filename: str, size: int) -> mmap.mmap:
+        mapped = self._maps.get(filename)
+        if mapped is None or len(mapped) < size:
+            # Файл вырос — отображаем заново; старые view держат прежний mmap сами
+            with open(self._path(filename), "rb") as fh:
+                mapped = self._maps[filename] = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def _mapped(self, filename: str, size: int) -> memoryview:
+        return memoryview(self._map(filename, size))[:size]
+
+    def column(self, name: str, rows: Optional[int] = None, question: Optional[int] = None) -> memoryview:
+        """Колонка сессий (или партиции вопроса) как memoryview над mmap, без копирования"""
+        self.open()
+        if question is None:
+            typecode = dict(SESSION_COLUMNS)[name]
+            filename = f"sessions.{name}"
+            if rows is None:
+                rows = self.sessions
+        else:
+            typecode = dict(ANSWER_COLUMNS)[name]
+            filename = self._answer_file(question, name)
+            if rows is None:
+                rows = self.question_rows[question]
+        if not rows:
+            return memoryview(array(typecode))
+        return self._mapped(filename, rows * array(typecode).itemsize).cast(typecode)
+
+    def _token_reader(self, rows: int):
+        """Функция row -> строка токена по сегменту токенов первых rows строк"""
+        token_end = self.column("token_end", rows)
+        segment = self._mapped("sessions.tokens", token_end[rows - 1]) if rows else memoryview(b"")
+
+        def token(row: int) -> str:
+            return str(segment[token_end[row - 1] if row else 0:token_end[row]], "utf-8")
+        return token
+
+    def _text(self, row: int, text_end: memoryview) -> Tuple[str, list]:
+        start = text_end[row - 1] if row else 0
+        line = self._mapped("sessions.text", text_end[row])[start:]
+        return json.loads(bytes(line))
+
+    def find(self, token: str) -> Optional[int]:
+        """Строка сессии по токену или None (результат кэшируется до следующего пакета)"""
+        if not self.enabled:
+            return None
+        self.open()
+        with self._lookup_lock:
+            if token in self._lookups:
+                self._lookups.move_to_end(token)
+                return self._lookups[token]
+            rows = self.sessions
+        row = self._scan(token, rows) if rows else None
+        with self._lookup_lock:
+            if self.sessions == rows:  # Пока искали, пакет не добавился
+                self._lookups[token] = row
+                if len(self._lookups) > ARCHIVE_LOOKUP_CACHE:
+                    self._lookups.popitem(last=False)
+        return row
+
+    def _scan(self, token: str, rows: int) -> Optional[int]:
+        """Поиск по колонке токенов с конца"""
+        key, hashed = token_key(token)
+        end = rows * TOKEN_WIDTH
+        tokens = self._map("sessions.token", end)
+        token_at = self._token_reader(rows) if hashed else None
+        while True:
+            position = tokens.rfind(key, 0, end)
+            if position < 0:
+                return None
+            if position % TOKEN_WIDTH == 0:
+                row = position // TOKEN_WIDTH
+                if not hashed or token_at(row) == token:
+                    return row
+            end = position + TOKEN_WIDTH - 1
+
+    def load(self, token: str) -> Optional[list]:
+        """Запись SessionState.to_record() архивной сессии или None"""
+        row = self.find(token)
+        if row is None:
+            return None
+        return self._text(row, self.column("text_end", row + 1))[1]
+
+    def iter_sessions(self, chunk: int = 10000) -> Iterator[List[tuple]]:
+        """Пачки строк (token, created_ts, completed, answers, answered) для экспорта"""
+        self.open()
+        rows = self.sessions
+        for start in range(0, rows, chunk):
+            stop = min(rows, start + chunk)
+            token = self._token_reader(stop)
+            yield [(token(row), created, bool(flags & FLAG_COMPLETED), answers, answered)
+                   for row, created, flags, answers, answered in zip(
+                       range(start, stop), self.column("created", stop)[start:], self.column("flags", stop)[start:],
+                       self.column("answers", stop)[start:], self.column("answered", stop)[start:])]
+
+    def tokens_created_after(self, since: float) -> List[Tuple[str, float]]:
+        """(token, created_ts) сессий, созданных позже since: их токены могут ещё действовать"""
+        self.open()
+        rows = self.sessions
+        if not rows:
+            return []
+        token = self._token_reader(rows)
+        return [(token(row), created) for row, created in enumerate(self.column("created", rows)) if created > since]
+
+    def report(self) -> Dict[str, Any]:
+        """Отчёт по архиву; сканируются только строки, добавленные после прошлого вызова"""
+        self.open()
+        with self._stats_lock:
+            self._stats.fold(self, self.sessions, list(self.question_rows))
+            report = self._stats.report(self.question_ids)
+        report["text_bytes"] = self.text_bytes
+        return report
+
+
+archive = ColumnarArchive(ARCHIVE_DIR)
@@ -0,0 +1,80 @@
+"""Хранилище текстов ответов.
+
+Каждый ответ хранится ровно один раз; сессии и записи лога держат лишь
+целочисленную ссылку. Длинные тексты прозрачно сжимаются zlib.
+"""
+import itertools
+import os
+import zlib
+from typing import Any, Dict
+
+# Максимальный размер тела запроса (проверяется до разбора JSON)
+MAX_REQUEST_BODY_BYTES = int(os.getenv("MAX_REQUEST_BODY_BYTES", str(256 * 1024)))
+# Максимальная длина текста одного ответа в символах
+MAX_ANSWER_CHARS = int(os.getenv("MAX_ANSWER_CHARS", "50000"))
+# Тексты длиннее порога (в байтах UTF-8) хранятся сжатыми
+ANSWER_COMPRESS_THRESHOLD = int(os.getenv("ANSWER_COMPRESS_THRESHOLD", "2048"))
+
+
+class _Compressed(bytes):
+    """Маркер сжатого текста (отличает его от прочих значений)"""
+    __slots__ = ()
+
+
+class AnswerBlobStore:
+    """Хранилище ответов: ссылка (int) -> значение"""
+
+    def __init__(self, compress_threshold: int = ANSWER_COMPRESS_THRESHOLD):
+        self.compress_threshold = compress_threshold
+        self._blobs: Dict[int, Any] = {}
+        self._floor = 1
+        self._ids = itertools.count(self._floor)
+        self.compressed_count = 0
+
+    def _pack(self, value: Any) -> Any:
+        if isinstance(value, str) and len(value) > self.compress_threshold // 4:
+            raw = value.encode("utf-8")
+            if len(raw) > self.compress_threshold:
+                packed = zlib.compress(raw, 6)
+                if len(packed) < len(raw):
+                    self.compressed_count += 1
+                    return _Compressed(packed)
+        return value
+
+    def put(self, value: Any) -> int:
+        ref = next(self._ids)
+        self._blobs[ref] = self._pack(value)
+        return ref
+
+    def restore(self, ref: int, value: Any):
+        """Восстанавливает значение под прежней ссылкой (при загрузке снапшота)"""
+        if ref in self._blobs:
+            return
+        self._blobs[ref] = self._pack(value)
+        if ref >= self._floor:
+            self._floor = ref + 1
+            self._ids = itertools.count(self._floor)
+
+    def get(self, ref: int, default: Any = None) -> Any:
+        value = self._blobs.get(ref, default)
+        if isinstance(value, _Compressed):
+            return zlib.decompress(value).decode("utf-8")
+        return value
+
+    def release(self, ref: int):
+        value = self._blobs.pop(ref, None)
+        if isinstance(value, _Compressed):
+            self.compressed_count -= 1
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def memory_items(self) -> tuple:
+        """Контейнеры хранилища для отчёта о памяти"""
+        return (self._blobs,)
+
+    def __contains__(self, ref: int) -> bool:
+        return ref in self._blobs
+
+
+answer_store = AnswerBlobStore()
@@ -0,0 +1,184 @@
+"""Сжатие ответов по Accept-Encoding: gzip и brotli (если установлен пакет brotli).
+
+Сводки, страницы админки и CSV-выгрузки — кириллический текст, который
+сжимается в 4–8 раз; на медленных VPN-каналах время передачи важнее
+процессора на сжатие.
+
+- CompressionMiddleware сжимает ответы текстовых типов от
+  COMPRESS_MIN_BYTES: цельное тело — одним вызовом (большое — в потоке,
+  zlib и brotli отпускают GIL), StreamingResponse — потоково, кусок за
+  куском, не накапливая выгрузку в памяти. SSE не сжимается: события
+  должны уходить сразу. Ответы, у которых уже есть Content-Encoding,
+  пропускаются как есть.
+- precompress() готовит варианты неизменяемого тела один раз с
+  максимальным уровнем сжатия; pick_variant() выбирает вариант под
+  Accept-Encoding запроса.
+"""
+import asyncio
+import gzip
+import os
+import zlib
+from typing import Dict, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость, без неё только gzip
+    brotli = None
+
+COMPRESSION = os.getenv("AEON_COMPRESSION", "1") != "0"
+COMPRESS_MIN_BYTES = int(os.getenv("AEON_COMPRESS_MIN_BYTES", "512"))
+GZIP_LEVEL = int(os.getenv("AEON_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("AEON_BROTLI_QUALITY", "4"))
+# Тела больше этого сжимаются в потоке, чтобы не задерживать цикл событий
+COMPRESS_THREAD_BYTES = 64 * 1024
+
+# В порядке предпочтения сервера при равном q
+ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+NOT_COMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+def negotiate(accept_encoding: Optional[str], available: Sequence[str] = ENCODINGS) -> Optional[str]:
+    """Лучшее из available по Accept-Encoding с учётом q (None — без сжатия)"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(NOT_COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(body, 9 if best else GZIP_LEVEL, mtime=0)
+
+
+class _GzipStream:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 — формат gzip
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+def precompress(body: bytes) -> Dict[str, bytes]:
+    """Варианты неизменяемого тела: identity и сжатые максимальным уровнем, если они меньше.
+
+    Порог COMPRESS_MIN_BYTES здесь не нужен: сжатие делается один раз.
+    """
+    variants = {"identity": body}
+    for encoding in ENCODINGS:
+        data = compress(body, encoding, best=True)
+        if len(data) < len(body):
+            variants[encoding] = data
+    return variants
+
+
+def pick_variant(accept_encoding: Optional[str], variants: Dict[str, bytes]) -> Tuple[str, bytes]:
+    encoding = negotiate(accept_encoding, [name for name in ENCODINGS if name in variants])
+    return (encoding, variants[encoding]) if encoding else ("identity", variants["identity"])
+
+
+class CompressionMiddleware:
+    """Сжимает ответы текстовых типов под Accept-Encoding клиента"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate(accept_encoding)
+        start = None
+        stream = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, stream, passthrough
+            if passthrough or message["type"] not in ("http.response.start", "http.response.body"):
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message  # Решение принимается по первому куску тела
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None:
+                headers = MutableHeaders(scope=start)
+                if not compressible(headers.get("content-type", "")) or "content-encoding" in headers:
+                    passthrough = True
+                else:
+                    # Кэши должны различать варианты и для несжатого ответа
+                    headers.add_vary_header("Accept-Encoding")
+                    passthrough = (encoding is None or start["status"] in (204, 304)
+                                   or (not more_body and len(body) < self.minimum_size))
+                if passthrough:
+                    await send(start)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # Сжатое представление не побайтово равно исходному
+                    headers["ETag"] = "W/" + etag
+                if not more_body:
+                    if len(body) > COMPRESS_THREAD_BYTES:
+                        data = await asyncio.to_thread(compress, body, encoding)
+                    else:
+                        data = compress(body, encoding)
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                del headers["Content-Length"]
+                stream = _BrotliStream() if encoding == "br" else _GzipStream()
+                await send(start)
+            data = stream.compress(body) if body else b""
+            if not more_body:
+                data += stream.flush()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
@@ -0,0 +1,227 @@
+"""Поиск почти одинаковых ответов разных кандидатов (MinHash + LSH).
+
+Ответ разбивается на шинглы — тройки подряд идущих слов; по ним строится
+MinHash-сигнатура из NUM_PERM значений. Доля совпавших позиций двух
+сигнатур оценивает коэффициент Жаккара множеств шинглов. Сигнатура режется
+на BANDS полос по ROWS значений: ответы, у которых совпала хотя бы одна
+полоса на том же вопросе, становятся кандидатами, и только они проверяются
+по сигнатуре. Поэтому проверка нового ответа стоит O(кандидатов), а не
+O(всех сохранённых ответов).
+
+Записи дописываются в массивы; заменённый, удалённый или заархивированный
+ответ помечается мёртвым и больше не находится как кандидат. Когда мёртвых
+записей становится больше живых, массивы перестраиваются. Для каждого
+ответа помнится, какие ответы были отмечены как его копии: при его удалении
+remove() возвращает их, и rematch() пересчитывает для них отметку.
+
+Индекс живёт в памяти воркера и не сохраняется в снапшот: при старте
+ответы сессий, восстановленных из журнала, индексируются заново, и отметки
+копий строятся повторно.
+"""
+import os
+import random
+import re
+import threading
+import zlib
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+# Порог оценки Жаккара, начиная с которого ответ считается копией
+DUPLICATE_THRESHOLD = float(os.getenv("AEON_DUPLICATE_THRESHOLD", "0.8"))
+# Сколько кандидатов проверять на один ответ (популярный шаблон даёт длинные цепочки)
+MAX_CANDIDATES = int(os.getenv("AEON_DUPLICATE_MAX_CANDIDATES", "64"))
+# Перестраивать массивы, когда мёртвых записей больше живых и не меньше этого числа
+COMPACT_MIN_DEAD = 1024
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS  # Вероятность стать кандидатом при J=0.8 — 0.985, при J=0.5 — 0.40
+SHINGLE_WORDS = 3
+
+_WORD_RE = re.compile(r"\w+")
+_rng = random.Random(0x5EED)
+# Перестановки — XOR хеша шингла со случайной маской: в 4 раза дешевле
+# (a*x + b) mod p на длинной арифметике при той же точности оценки
+_MASKS = [_rng.getrandbits(32) for _ in range(NUM_PERM)]
+
+
+def shingle_hashes(text: str) -> List[int]:
+    """32-битные хеши шинглов нормализованного текста"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return [zlib.crc32(" ".join(words).encode("utf-8"))] if words else []
+    return list({zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+                 for i in range(len(words) - SHINGLE_WORDS + 1)})
+
+
+def minhash(hashes: List[int]) -> array:
+    return array("I", [min([x ^ mask for x in hashes]) for mask in _MASKS])
+
+
+def similarity(left, right) -> float:
+    """Оценка коэффициента Жаккара по двум сигнатурам"""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """LSH-индекс сигнатур ответов по всем вопросам"""
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD, max_candidates: int = MAX_CANDIDATES):
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self._lock = threading.Lock()
+        self._signatures = array("I")  # NUM_PERM значений на запись
+        self._questions = array("I")
+        self._question_index: Dict[str, int] = {}  # id вопроса -> номер (вопросы всех версий банка)
+        self._question_ids: List[str] = []
+        self._owners: List[str] = []  # Токен сессии (та же строка, что ключ в sessions)
+        self._alive = bytearray()  # 1 — запись живая, 0 — ответ заменён или удалён
+        self._chain = array("i")  # BANDS значений на запись: предыдущая запись в той же корзине или -1
+        self._buckets: Dict[int, int] = {}  # Хеш (вопрос, полоса, значения) -> последняя запись
+        self._owner_chain = array("i")  # Предыдущая запись той же сессии или -1
+        self._owner_head: Dict[str, int] = {}  # Токен -> последняя запись сессии
+        self._copies: Dict[Tuple[str, int], Set[str]] = {}  # (токен, вопрос) -> токены, отмеченные его копией
+        self._dead = 0
+        self.checked = 0
+        self.flagged = 0
+
+    def __len__(self) -> int:
+        return len(self._owners) - self._dead
+
+    def memory_items(self) -> tuple:
+        """Массивы и словари индекса для отчёта о памяти"""
+        return (self._signatures, self._questions, self._chain, self._owners, self._alive, self._owner_chain,
+                self._buckets, self._owner_head, self._copies)
+
+    @staticmethod
+    def _band_keys(question: int, signature: array) -> List[int]:
+        return [hash((question, band) + tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+    def _best_match(self, token: str, question: int, signature: array,
+                    keys: List[int]) -> Optional[Tuple[str, float]]:
+        seen = set()
+        best: Optional[Tuple[str, float]] = None
+        for band, key in enumerate(keys):
+            entry = self._buckets.get(key, -1)
+            while entry >= 0 and len(seen) < self.max_candidates:
+                if entry not in seen:
+                    seen.add(entry)
+                    owner = self._owners[entry]
+                    if owner != token and self._alive[entry] and self._questions[entry] == question:
+                        score = similarity(signature, self._signatures[entry * NUM_PERM:(entry + 1) * NUM_PERM])
+                        if score >= self.threshold and (best is None or score > best[1]):
+                            best = (owner, score)
+                            if score == 1.0:
+                                return best
+                entry = self._chain[entry * BANDS + band]
+        return best
+
+    def _live_entries(self, token: str, question: Optional[int] = None) -> List[int]:
+        """Живые записи сессии (по всем вопросам или по одному)"""
+        entries = []
+        entry = self._owner_head.get(token, -1)
+        while entry >= 0:
+            if self._alive[entry] and (question is None or self._questions[entry] == question):
+                entries.append(entry)
+            entry = self._owner_chain[entry]
+        return entries
+
+    def add(self, token: str, question_id: str, text: str) -> Optional[Tuple[str, float]]:
+        """Индексирует ответ; возвращает (токен, сходство) самого похожего чужого ответа или None"""
+        hashes = shingle_hashes(text)
+        if not hashes:
+            return None
+        return self.add_signature(token, question_id, minhash(hashes))
+
+    def add_signature(self, token: str, question_id: str, signature: array) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            question = self._question_index.get(question_id)
+            if question is None:
+                question = self._question_index[question_id] = len(self._question_ids)
+                self._question_ids.append(question_id)
+            keys = self._band_keys(question, signature)
+            match = self._best_match(token, question, signature, keys)
+            for previous in self._live_entries(token, question):
+                self._kill(previous)  # Прежний ответ той же сессии на этот вопрос
+            self._insert(token, question, signature, keys)
+            self.checked += 1
+            if match is not None:
+                self.flagged += 1
+                self._copies.setdefault((match[0], question), set()).add(token)
+            self._maybe_compact()
+        return match
+
+    def _insert(self, token: str, question: int, signature, keys: List[int]):
+        entry = len(self._owners)
+        self._owners.append(token)
+        self._questions.append(question)
+        self._signatures.extend(signature)
+        self._alive.append(1)
+        self._owner_chain.append(self._owner_head.get(token, -1))
+        self._owner_head[token] = entry
+        for key in keys:
+            self._chain.append(self._buckets.get(key, -1))
+            self._buckets[key] = entry
+
+    def _kill(self, entry: int):
+        self._alive[entry] = 0
+        self._dead += 1
+
+    def remove(self, token: str, question_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        """Убирает ответ сессии на вопрос (или все её ответы).
+
+        Возвращает (токен, id вопроса) ответов, отмеченных копиями убранных:
+        их отметку нужно пересчитать через rematch().
+        """
+        with self._lock:
+            if question_id is None:
+                entries = self._live_entries(token)
+            elif question_id in self._question_index:
+                entries = self._live_entries(token, self._question_index[question_id])
+            else:
+                entries = []
+            stale = []
+            for entry in entries:
+                self._kill(entry)
+                question = self._questions[entry]
+                for other in self._copies.pop((token, question), ()):
+                    stale.append((other, self._question_ids[question]))
+            if question_id is None:
+                self._owner_head.pop(token, None)
+            self._maybe_compact()
+        return stale
+
+    def rematch(self, token: str, question_id: str) -> Optional[Tuple[str, float]]:
+        """Самый похожий чужой живой ответ для уже проиндексированного ответа или None"""
+        with self._lock:
+            question = self._question_index.get(question_id)
+            entries = self._live_entries(token, question) if question is not None else []
+            if not entries:
+                return None
+            signature = self._signatures[entries[0] * NUM_PERM:(entries[0] + 1) * NUM_PERM]
+            match = self._best_match(token, question, signature, self._band_keys(question, signature))
+            if match is not None:
+                self._copies.setdefault((match[0], question), set()).add(token)
+        return match
+
+    def _maybe_compact(self):
+        """Перестраивает массивы без мёртвых записей (под _lock)"""
+        if self._dead < max(COMPACT_MIN_DEAD, len(self._owners) - self._dead):
+            return
+        owners, questions, signatures, alive = self._owners, self._questions, self._signatures, self._alive
+        self._owners, self._questions, self._signatures = [], array("I"), array("I")
+        self._alive, self._chain, self._buckets = bytearray(), array("i"), {}
+        self._owner_chain, self._owner_head = array("i"), {}
+        self._dead = 0
+        # Порядок записей сохраняется: цепочки идут от новых к старым
+        for entry, token in enumerate(owners):
+            if alive[entry]:
+                signature = signatures[entry * NUM_PERM:(entry + 1) * NUM_PERM]
+                self._insert(token, questions[entry], signature, self._band_keys(questions[entry], signature))
+        # Отметки ответов, которых уже нет, больше не понадобятся
+        live = set(zip(self._owners, self._questions))
+        self._copies = {key: {other for other in copies if (other, key[1]) in live}
+                        for key, copies in self._copies.items() if key in live}
+
+
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,71 @@
+"""Шина событий админки для потока server-sent events.
+
+Обработчики публикуют компактные события (сессия создана, ответ сохранён,
+сессия завершена, удалена) вместе с приращением статистики; открытые
+страницы админки получают их через /admin/events и обновляют таблицы на
+месте. Стоимость пропорциональна активности, а не числу зрителей × сессий.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Сколько событий может накопиться у медленного подписчика
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def format_sse(event_id: int, kind: str, data: Dict[str, Any]) -> str:
+    """Сериализация события в формат text/event-stream"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+class AdminEventBus:
+    """Рассылка событий подписчикам, живущим в event loop"""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self._ids = itertools.count(1)
+        self.dropped = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Подписка из корутины; очередь получает строки SSE"""
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers = self._subscribers + [(asyncio.get_running_loop(), queue)]
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    def publish(self, kind: str, data: Dict[str, Any], stats: Optional[Dict[str, int]] = None):
+        """Публикация события; безопасна из любого потока"""
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        if stats:
+            data = dict(data, stats=stats)
+        message = format_sse(next(self._ids), kind, data)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                self.unsubscribe(queue)  # Цикл подписчика уже закрыт
+
+    def _deliver(self, queue: asyncio.Queue, message: str):
+        if queue.full():
+            # Медленный подписчик теряет самое старое событие
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(message)
+
+
+admin_events = AdminEventBus()
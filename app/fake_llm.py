@@ -0,0 +1,221 @@
+"""Локальная заглушка OpenAI chat completions для бенчмарков и разработки.
+
+Отвечает на POST /v1/chat/completions в формате OpenAI, в том числе
+потоком (stream=true → text/event-stream с чанками chat.completion.chunk).
+Задержка берётся из распределения, часть запросов можно завершать
+ошибкой. Режим записи проксирует запросы к настоящему API и сохраняет
+ответы в JSONL-фикстуры; режим воспроизведения отдаёт их по хешу
+(model, messages) без сети.
+
+Запуск:
+    python -m app.fake_llm --port 8001 --latency lognormal:300,0.5 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 uvicorn app.main:app
+
+Распределения задержки (миллисекунды): fixed:MS, uniform:LO,HI,
+lognormal:MEDIAN,SIGMA, exponential:MEAN.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_CONTENT = json.dumps({
+    "task": "Спроектируйте REST API для сервиса бронирования переговорных: ресурсы, методы, коды ответов.",
+    "example": "GET /rooms?date=2024-05-01 — свободные комнаты; POST /bookings — бронь, 409 при пересечении.",
+}, ensure_ascii=False)
+
+
+def parse_latency(spec: str):
+    """Функция rng -> секунды по строке вида 'lognormal:300,0.5'"""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1 / values[0]) / 1000
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+def fixture_key(payload: Dict[str, Any]) -> str:
+    """Ключ фикстуры: модель и сообщения, без параметров сэмплирования"""
+    canonical = json.dumps([payload.get("model"), payload.get("messages")], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: str = "fixed:0"
+    error_rate: float = 0.0
+    error_statuses: Tuple[int, ...] = (500, 429)
+    chunk_delay_ms: float = 0.0  # Пауза между чанками потока
+    chunk_chars: int = 16
+    content: str = DEFAULT_CONTENT
+    record_path: Optional[str] = None  # Проксировать к upstream и дописывать фикстуры
+    replay_path: Optional[str] = None  # Отдавать записанные ответы
+    upstream: str = "https://api.openai.com/v1"
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeLLMStats:
+    requests: int = 0
+    streamed: int = 0
+    errors: int = 0
+    replayed: int = 0
+    recorded: int = 0
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+
+def create_fake_llm_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    config = config or FakeLLMConfig()
+    rng = random.Random(config.seed)
+    delay = parse_latency(config.latency)
+    stats = FakeLLMStats()
+    lock = threading.Lock()
+    fixtures: Dict[str, str] = {}
+    if config.replay_path:
+        with open(config.replay_path, encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    record = json.loads(line)
+                    fixtures[record["key"]] = record["content"]
+
+    app = FastAPI(title="fake-llm")
+    app.state.stats = stats
+
+    async def record(payload: Dict[str, Any], authorization: Optional[str]) -> Tuple[int, Optional[str]]:
+        import httpx
+
+        upstream_payload = dict(payload, stream=False)
+        headers = {"Authorization": authorization} if authorization else {}
+        async with httpx.AsyncClient(timeout=60) as client:
+            response = await client.post(f"{config.upstream}/chat/completions", json=upstream_payload, headers=headers)
+        if response.status_code != 200:
+            return response.status_code, None
+        content = response.json()["choices"][0]["message"]["content"]
+        with lock:
+            with open(config.record_path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"key": fixture_key(payload), "request": upstream_payload,
+                                     "content": content}, ensure_ascii=False) + "\n")
+            stats.recorded += 1
+        return 200, content
+
+    def completion(content: str, model: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        # Токены грубо считаются словами — для заглушки достаточно
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in messages)
+        completion_tokens = len(content.split())
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    async def stream(content: str, model: str):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        def chunk(delta: Dict[str, str], finish: Optional[str] = None) -> str:
+            body = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+        yield chunk({"role": "assistant"})
+        for start in range(0, len(content), config.chunk_chars):
+            if config.chunk_delay_ms:
+                await asyncio.sleep(config.chunk_delay_ms / 1000)
+            yield chunk({"content": content[start:start + config.chunk_chars]})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    def error(status: int) -> JSONResponse:
+        with lock:
+            stats.errors += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        return JSONResponse({"error": {"message": "Injected failure", "type": "fake_llm_error", "code": status}},
+                            status_code=status)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        model = payload.get("model", "fake-model")
+        with lock:
+            stats.requests += 1
+            seconds = delay(rng)
+            failed = rng.random() < config.error_rate
+            status = rng.choice(config.error_statuses) if failed else 200
+        await asyncio.sleep(seconds)
+        if failed:
+            return error(status)
+
+        content = None
+        if config.replay_path:
+            content = fixtures.get(fixture_key(payload))
+            if content is not None:
+                with lock:
+                    stats.replayed += 1
+        if content is None and config.record_path:
+            status, content = await record(payload, request.headers.get("authorization"))
+            if content is None:
+                return error(status)
+        if content is None:
+            content = config.content
+
+        if payload.get("stream"):
+            with lock:
+                stats.streamed += 1
+            return StreamingResponse(stream(content, model), media_type="text/event-stream")
+        with lock:
+            stats.statuses[200] = stats.statuses.get(200, 0) + 1
+        return completion(content, model, payload.get("messages") or [])
+
+    @app.get("/stats")
+    def get_stats():
+        return stats.__dict__
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Локальная заглушка OpenAI chat completions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exponential:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="500,429")
+    parser.add_argument("--chunk-delay-ms", type=float, default=0.0)
+    parser.add_argument("--record", dest="record_path")
+    parser.add_argument("--replay", dest="replay_path")
+    parser.add_argument("--upstream", default="https://api.openai.com/v1")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    config = FakeLLMConfig(latency=args.latency, error_rate=args.error_rate,
+                           error_statuses=tuple(int(code) for code in args.error_statuses.split(",")),
+                           chunk_delay_ms=args.chunk_delay_ms, record_path=args.record_path,
+                           replay_path=args.replay_path, upstream=args.upstream.rstrip("/"), seed=args.seed)
+    uvicorn.run(create_fake_llm_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
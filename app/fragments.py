@@ -0,0 +1,163 @@
+"""Кэш отрендеренных фрагментов админки и статические файлы с хешем версии.
+
+Страницы админки собираются из готовых кусков HTML: строка сессии
+кэшируется в мемо её состояния по ревизии (см. api.admin_sessions), а
+строки лога — здесь, в AppendOnlyFragments: лог только дописывается,
+поэтому каждая запись рендерится один раз, а страница — это join строк.
+В памяти держится только окно последних строк (первая страница /admin/log),
+а не HTML всего лога; старые страницы рендерятся по запросу. Страница
+сессии с текстами ответов в мемо сессии не кладётся — иначе каждая
+открытая сессия держала бы распакованную копию ответов; последние
+открытые страницы лежат в ограниченном LRU RenderedPages.
+
+Общий CSS отдаётся по адресу с хешем содержимого (?v=...), поэтому его
+можно кэшировать в браузере «навсегда»: после изменения файла меняется
+и адрес в шаблонах.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.compression import precompress
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "../static")
+STATIC_TYPES = {".css": "text/css; charset=utf-8", ".js": "application/javascript; charset=utf-8"}
+# Отключить дисковый кэш байткода Jinja — "0"; пусто — временный каталог пользователя
+JINJA_CACHE_DIR = os.getenv("AEON_JINJA_CACHE_DIR", "")
+# Перечитывать изменённые шаблоны с диска (для разработки); иначе без stat на каждый рендер
+TEMPLATES_AUTO_RELOAD = os.getenv("AEON_TEMPLATES_AUTO_RELOAD", "0") == "1"
+
+
+class StaticAsset(NamedTuple):
+    variants: Dict[str, bytes]  # Кодировка -> тело (identity и заранее сжатые)
+    media_type: str
+    version: str  # Первые символы sha256 содержимого
+
+
+@lru_cache(maxsize=None)
+def static_asset(name: str) -> Optional[StaticAsset]:
+    """Файл из static/ (только из самого каталога и известных типов) или None"""
+    extension = os.path.splitext(name)[1]
+    if os.path.basename(name) != name or extension not in STATIC_TYPES:
+        return None
+    try:
+        with open(os.path.join(STATIC_DIR, name), "rb") as fh:
+            body = fh.read()
+    except OSError:
+        return None
+    return StaticAsset(precompress(body), STATIC_TYPES[extension], hashlib.sha256(body).hexdigest()[:12])
+
+
+def static_url(name: str) -> str:
+    asset = static_asset(name)
+    return f"/static/{name}?v={asset.version}" if asset is not None else f"/static/{name}"
+
+
+def bytecode_cache():
+    """Дисковый кэш скомпилированных шаблонов: новый воркер не компилирует их заново"""
+    if JINJA_CACHE_DIR == "0":
+        return None
+    from jinja2 import FileSystemBytecodeCache
+    if JINJA_CACHE_DIR:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+        return FileSystemBytecodeCache(JINJA_CACHE_DIR)
+    return FileSystemBytecodeCache()
+
+
+class AppendOnlyFragments:
+    """Отрендеренные строки для списка, который только дописывается (или очищается целиком).
+
+    С window кэшируются только последние window строк (страница новых записей);
+    более старые страницы рендерятся при запросе и не запоминаются.
+    """
+
+    def __init__(self, window: Optional[int] = None):
+        self.window = window
+        self._lock = threading.Lock()
+        self._rows: List[str] = []
+        self._start = 0  # Индекс элемента списка, которому соответствует _rows[0]
+        self._first: Any = None  # Первый элемент списка — признак, что список не подменили
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def memory_items(self) -> tuple:
+        """Контейнеры кэша для отчёта о памяти"""
+        return (self._rows,)
+
+    def rows(self, items: Sequence, render: Callable[[Any], str], start: int = 0,
+             stop: Optional[int] = None) -> List[str]:
+        """Фрагменты для items[start:stop]; новые элементы окна рендерятся один раз"""
+        count = len(items)
+        stop = count if stop is None else max(0, min(stop, count))
+        start = max(0, min(start, stop))
+        with self._lock:
+            end = self._start + len(self._rows)
+            if count < end or (self._first is not None and count and items[0] is not self._first):
+                self._rows, self._start, self._first = [], 0, None
+                end = 0
+            if count and self._first is None:
+                self._first = items[0]
+            begin = max(0, count - self.window) if self.window is not None else 0
+            if end < begin:
+                # Между кэшем и окном есть пропуск — строки до окна больше не нужны
+                self._rows, self._start, end = [], begin, begin
+            for index in range(end, count):
+                self._rows.append(render(items[index]))
+            if self.window is not None and len(self._rows) > self.window:
+                drop = len(self._rows) - self.window
+                del self._rows[:drop]
+                self._start += drop
+            cached_from = max(start, self._start)
+            cached = self._rows[cached_from - self._start:stop - self._start] if stop > cached_from else []
+        # Строки до окна (старые страницы) рендерятся без блокировки и не запоминаются
+        return [render(items[index]) for index in range(start, min(cached_from, stop))] + cached
+
+    def clear(self):
+        with self._lock:
+            self._rows = []
+            self._start = 0
+            self._first = None
+
+
+class RenderedPages:
+    """LRU отрендеренных страниц: ключ -> (версия, HTML), не больше maxsize штук"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._pages: "OrderedDict[Hashable, Tuple[Any, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def memory_items(self) -> tuple:
+        """Контейнеры кэша для отчёта о памяти"""
+        return (self._pages,)
+
+    def get(self, key: Hashable, version: Any, render: Callable[[], str]) -> str:
+        """Страница для key той же версии из кэша, иначе рендерится заново"""
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is not None and cached[0] == version:
+                self._pages.move_to_end(key)
+                return cached[1]
+        page = render()
+        if self.maxsize > 0:
+            with self._lock:
+                self._pages[key] = (version, page)
+                self._pages.move_to_end(key)
+                while len(self._pages) > self.maxsize:
+                    self._pages.popitem(last=False)
+        return page
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._pages.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
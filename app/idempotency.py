@@ -0,0 +1,158 @@
+"""Повторы запросов по заголовку Idempotency-Key.
+
+Мобильные клиенты повторяют POST /session и POST ответа по таймауту. Первый
+запрос с ключом выполняется и запоминает результат; повтор с тем же ключом
+получает сохранённый ответ, не создавая ещё одну сессию и не дописывая
+ответ, журнал и лог второй раз.
+
+Конкурентные дубликаты: ключ занимается до выполнения обработчика, и
+второй запрос ждёт (не дольше IDEMPOTENCY_WAIT) результата первого. Если
+первый завершился ошибкой, ключ освобождается и ожидающий выполняет запрос
+сам — сохраняются только успешные ответы. Тот же ключ с другим телом —
+ошибка клиента (IdempotencyConflict).
+
+Кэш ограничен по числу ключей и по времени жизни. TTL у всех записей
+одинаковый, поэтому порядок вставки в OrderedDict совпадает с порядком
+истечения: просроченные и лишние записи снимаются с начала.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+IDEMPOTENCY_TTL = float(os.getenv("AEON_IDEMPOTENCY_TTL", "3600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("AEON_IDEMPOTENCY_MAX_KEYS", "100000"))
+# Сколько секунд дубликат ждёт завершения исходного запроса
+IDEMPOTENCY_WAIT = float(os.getenv("AEON_IDEMPOTENCY_WAIT", "10"))
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """Ключ уже использован с другим телом запроса"""
+
+
+class IdempotencyInProgress(Exception):
+    """Исходный запрос с этим ключом всё ещё выполняется"""
+
+
+def fingerprint(payload: Any) -> bytes:
+    """Отпечаток параметров запроса (порядок ключей JSON не важен)"""
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).digest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires", "done", "result", "event")
+
+    def __init__(self, fingerprint: bytes, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.done = False
+        self.result: Any = None
+        self.event: Optional[threading.Event] = threading.Event()
+
+
+class IdempotencyCache:
+    """Результаты запросов по ключу с TTL и ограничением размера"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS,
+                 wait: float = IDEMPOTENCY_WAIT):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.wait = wait
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "waited": 0, "conflicts": 0, "in_progress": 0,
+                         "released": 0, "expired": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def memory_items(self) -> tuple:
+        """Контейнеры кэша для отчёта о памяти"""
+        return (self._entries,)
+
+    def _evict(self, now: float):
+        """Снимает с начала просроченные записи и лишние сверх max_keys"""
+        entries = self._entries
+        while entries:
+            entry = next(iter(entries.values()))
+            if entry.expires <= now:
+                self.counters["expired"] += 1
+            elif len(entries) > self.max_keys:
+                self.counters["evicted"] += 1
+            else:
+                break
+            entries.popitem(last=False)
+
+    def _claim(self, key: Hashable, digest: bytes) -> Tuple[_Entry, bool]:
+        """Запись для ключа и признак, что её выполняет вызывающий"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= now:
+                del self._entries[key]
+                self.counters["expired"] += 1
+                entry = None
+            if entry is None:
+                entry = self._entries[key] = _Entry(digest, now + self.ttl)
+                self.counters["misses"] += 1
+                self._evict(now)
+                return entry, True
+            if entry.fingerprint != digest:
+                self.counters["conflicts"] += 1
+                raise IdempotencyConflict(key)
+            return entry, False
+
+    def run(self, key: Hashable, payload: Any, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Результат compute() для ключа и признак повтора (результат взят из кэша)"""
+        digest = fingerprint(payload)
+        while True:
+            entry, owner = self._claim(key, digest)
+            if owner:
+                break
+            event = entry.event
+            if event is not None:
+                with self._lock:
+                    self.counters["waited"] += 1
+                if not event.wait(self.wait):
+                    with self._lock:
+                        self.counters["in_progress"] += 1
+                    raise IdempotencyInProgress(key)
+            if entry.done:
+                with self._lock:
+                    self.counters["hits"] += 1
+                return entry.result, True
+            # Исходный запрос упал и освободил ключ — пробуем выполнить сами
+        try:
+            result = compute()
+        except BaseException:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                self.counters["released"] += 1
+            entry.event.set()
+            raise
+        entry.result = result
+        entry.done = True
+        entry.event.set()
+        # Ждущие уже держат ссылку на событие; хранить его в готовой записи незачем
+        entry.event = None
+        return result, False
+
+    def snapshot(self) -> Dict[str, Any]:
+        counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "keys": len(self._entries),
+            "max_keys": self.max_keys,
+            "ttl_seconds": self.ttl,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "counters": counters,
+        }
+
+
+idempotency = IdempotencyCache()
@@ -0,0 +1,357 @@
+"""Журнал изменений состояния и снапшоты для восстановления после рестарта.
+
+Каждое изменение сессии дописывается строкой JSON в текущий сегмент журнала
+(journal-NNNNNNNN.log). Запись буферизуется, а фоновый поток раз в
+AEON_JOURNAL_FSYNC_MS миллисекунд сбрасывает накопленное одной записью и
+одним fsync (group commit). Каждые AEON_SNAPSHOT_EVERY событий сегмент
+ротируется и пишется компактный снапшот (snapshot-NNNNNNNN.json): при старте
+загружается последний снапшот и проигрываются только более новые сегменты.
+
+Журнал включается переменной окружения AEON_JOURNAL_DIR; без неё все
+вызовы — пустые операции. Применение записей сессий идемпотентно, поэтому
+изменение, попавшее одновременно в снапшот и в хвост, безопасно. Записи
+лога («l») не идемпотентны: append_log() добавляет строку в лог в памяти
+и в буфер журнала под той же блокировкой, под которой снапшот снимает
+копию лога и забирает буфер, — каждая строка попадает либо в снапшот,
+либо в хвост, но не в оба.
+
+Выведенные из оборота токены (retired) восстанавливаются из записей «d» и
+из снапшота: после рестарта удалённая сессия не создаётся заново первой
+же записью по её ещё действующему токену.
+
+Ошибки ввода-вывода в фоновом потоке не останавливают его: они пишутся в
+лог процесса и считаются (status()), несброшенные записи возвращаются в
+буфер, а запись продолжается в новый сегмент.
+
+Типы записей:
+    ["c", ts, token, bank_version, track]        — create_session
+    ["q", ts, token, question_id]                — заданный вопрос
+    ["a", ts, token, question_id, ref, text]     — ответ на вопрос
+    ["r", ts, token, ref, payload]               — ответ без question_id
+    ["x", token, result]                         — complete_session (зафиксированный итог)
+    ["d", token, expires]                        — удаление или архивация сессии;
+                                                   expires — до какого времени токен
+                                                   выведен из оборота (или null)
+    ["l", time, action, details]                 — запись лога действий
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.state import SessionResult, SessionState
+
+JOURNAL_DIR = os.getenv("AEON_JOURNAL_DIR") or None
+JOURNAL_FSYNC_MS = int(os.getenv("AEON_JOURNAL_FSYNC_MS", "20"))
+SNAPSHOT_EVERY = int(os.getenv("AEON_SNAPSHOT_EVERY", "100000"))
+
+_SEGMENT_RE = re.compile(r"(?:journal|snapshot)-(\d+)\.(?:log|json)$")
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _number(path: str) -> int:
+    return int(_SEGMENT_RE.search(path).group(1))
+
+
+def apply_record(sessions: Dict[str, SessionState], log: List[Dict], record: list,
+                 retired: Optional[Dict[str, float]] = None):
+    """Применяет одну запись журнала к состоянию в памяти"""
+    kind = record[0]
+    if kind == "l":
+        log.append({"time": record[1], "action": record[2], "details": record[3]})
+    elif kind == "c":
+        if record[2] not in sessions:
+            bank_version, track = (record[3], record[4]) if len(record) > 4 else (None, None)
+            sessions[record[2]] = SessionState(record[1], bank_version, tuple(track) if track else None)
+    elif kind == "d":
+        state = sessions.pop(record[1], None)
+        if state is not None:
+            state.release_answers()
+        if retired is not None and len(record) > 2 and record[2] is not None:
+            retired[record[1]] = record[2]
+    else:
+        token = record[1] if kind == "x" else record[2]
+        state = sessions.get(token)
+        if state is None:
+            return
+        if kind == "x":
+            state.complete()
+            if len(record) > 2 and record[2] and state.result is None:
+                state.result = SessionResult.from_record(record[2])
+            return
+        state.last_activity_ts = record[1]
+        if kind == "q":
+            state.mark_asked(record[3])
+        elif kind == "a":
+            state.restore_answer(record[3], record[4], record[5])
+        elif kind == "r":
+            state.restore_raw_answer(record[3], record[4])
+
+
+class Journal:
+    """Журнал с групповой фиксацией и периодическими снапшотами"""
+
+    def __init__(self, directory: Optional[str], fsync_interval: float = JOURNAL_FSYNC_MS / 1000,
+                 snapshot_every: int = SNAPSHOT_EVERY):
+        self.directory = directory
+        self.enabled = directory is not None
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()  # Защищает буфер
+        self._io_lock = threading.Lock()  # Защищает файл сегмента
+        self._pending: List[str] = []
+        self._since_snapshot = 0
+        self._segment = 0
+        self._file = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sessions: Optional[Dict[str, SessionState]] = None
+        self._log: Optional[List[Dict]] = None
+        self._retired: Optional[Dict[str, float]] = None
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_error_ts: Optional[float] = None
+
+    def append(self, *record):
+        """Добавляет запись в буфер; на диск она попадёт при следующем group commit"""
+        if not self.enabled:
+            return
+        line = _dumps(record)
+        with self._lock:
+            self._pending.append(line)
+            self._since_snapshot += 1
+
+    def append_log(self, log: List[Dict], entry: Dict):
+        """Дописывает строку в лог действий и запись «l» в буфер одной операцией"""
+        if not self.enabled:
+            log.append(entry)
+            return
+        line = _dumps(("l", entry["time"], entry["action"], entry["details"]))
+        with self._lock:
+            log.append(entry)
+            self._pending.append(line)
+            self._since_snapshot += 1
+
+    def status(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "enabled": self.enabled,
+            "running": self._thread is not None,
+            "segment": self._segment,
+            "pending": pending,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_error_ts": self.last_error_ts,
+        }
+
+    # --- Восстановление ---
+
+    def recover(self, sessions: Dict[str, SessionState], log: List[Dict],
+                retired: Optional[Dict[str, float]] = None) -> int:
+        """Загружает последний снапшот и проигрывает хвост журнала. Возвращает число записей хвоста.
+
+        retired — словарь токен -> срок выведенных из оборота токенов; истёкшие отбрасываются.
+        """
+        self._sessions = sessions
+        self._log = log
+        self._retired = retired
+        if not self.enabled:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        base = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, "snapshot-*.json")), key=_number, reverse=True):
+            try:
+                with open(path, encoding="utf-8") as fh:
+                    snapshot = json.load(fh)
+            except (OSError, ValueError):
+                continue  # Повреждённый снапшот — пробуем более старый
+            sessions.clear()
+            log.clear()
+            for token, record in snapshot["sessions"]:
+                sessions[token] = SessionState.from_record(record)
+            log.extend({"time": t, "action": a, "details": d} for t, a, d in snapshot["log"])
+            if retired is not None:
+                retired.clear()
+                retired.update(snapshot.get("retired", ()))
+            base = snapshot["segment"]
+            break
+
+        replayed = 0
+        segments = sorted(glob.glob(os.path.join(self.directory, "journal-*.log")), key=_number)
+        for path in segments:
+            number = _number(path)
+            self._segment = max(self._segment, number)
+            if number < base:
+                continue
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Оборванная последняя строка после сбоя
+                    apply_record(sessions, log, record, retired)
+                    replayed += 1
+        if retired is not None:
+            now = time.time()
+            for token in [token for token, expires in retired.items() if expires < now]:
+                del retired[token]
+        self._segment = max(self._segment, base)
+        self._since_snapshot = replayed
+        return replayed
+
+    # --- Запись ---
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._open_segment(self._segment + 1)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="aeon-journal", daemon=True)
+        self._thread.start()
+
+    def _open_segment(self, number: int):
+        self._segment = number
+        path = os.path.join(self.directory, f"journal-{number:08d}.log")
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _run(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.flush()
+                if self._since_snapshot >= self.snapshot_every:
+                    self.snapshot()
+            except Exception as exc:  # Поток журнала не должен умирать молча
+                self._record_error(exc)
+
+    def _record_error(self, exc: Exception):
+        self.errors += 1
+        self.last_error = f"{type(exc).__name__}: {exc}"
+        self.last_error_ts = time.time()
+        logger.exception("journal write failed in segment %d", self._segment)
+
+    def _write(self, pending: List[str]):
+        """Пишет записи в текущий сегмент и делает fsync; вызывается под _io_lock.
+
+        При ошибке записи возвращаются в начало буфера, а сегмент бросается:
+        в нём могла остаться оборванная строка, на которой остановится
+        проигрывание, поэтому дальше пишем в новый сегмент.
+        """
+        try:
+            if self._file is None:
+                self._open_segment(self._segment + 1)
+            if pending:
+                self._file.write("\n".join(pending) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError:
+            with self._lock:
+                self._pending[:0] = pending
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+                self._file = None
+            raise
+
+    def flush(self):
+        """Групповая фиксация: все накопленные записи — одна запись и один fsync"""
+        if not self.enabled or self._thread is None:
+            return
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                self._write(pending)
+
+    def snapshot(self):
+        """Ротирует сегмент и записывает снапшот; старые сегменты удаляются"""
+        if not self.enabled or self._thread is None or self._sessions is None:
+            return
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self._since_snapshot = 0
+                # Копия лога снимается вместе с буфером: строки до этого момента
+                # попадут в снапшот, после — в новый сегмент (см. append_log)
+                log_rows = list(self._log)
+                items = list(self._sessions.items())
+                retired = list(self._retired.items()) if self._retired is not None else []
+            try:
+                self._write(pending)
+            except OSError:
+                with self._lock:
+                    self._since_snapshot = self.snapshot_every  # Повторить снапшот на следующем цикле
+                raise
+            self._file.close()
+            self._open_segment(self._segment + 1)
+            base = self._segment
+            # Записи сессий снимаются после ротации под state_lock, поэтому
+            # каждая согласована; изменения после ротации идут в новый сегмент
+            # и идемпотентно проигрываются поверх снапшота
+            records = [[token, state.to_record()] for token, state in items]
+
+        data = {
+            "segment": base,
+            "sessions": records,
+            "log": [[e["time"], e["action"], e["details"]] for e in log_rows],
+            "retired": retired,
+        }
+        path = os.path.join(self.directory, f"snapshot-{base:08d}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(_dumps(data))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+        self._fsync_directory()
+
+        for old in glob.glob(os.path.join(self.directory, "journal-*.log")) + \
+                glob.glob(os.path.join(self.directory, "snapshot-*.json")):
+            if _number(old) < base:
+                os.remove(old)
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def close(self, snapshot: bool = True):
+        """Останавливает фоновый поток; по умолчанию пишет финальный снапшот"""
+        if not self.enabled or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        try:
+            if snapshot:
+                self.snapshot()
+            else:
+                self.flush()
+        finally:
+            self._thread = None
+            with self._io_lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+
+
+journal = Journal(JOURNAL_DIR)
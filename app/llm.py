@@ -0,0 +1,91 @@
+"""Клиент chat completions для AEON-эндпоинтов.
+
+Адрес API задаётся OPENAI_BASE_URL, так что вместо OpenAI можно
+подставить любой совместимый сервер — например, локальную заглушку
+app.fake_llm для бенчмарков и разработки без сети. Встроенный ключ-
+заглушка (префикс sk-proj-X1) к настоящему OpenAI не отправляется, но
+с переопределённым адресом допустим.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from app.tracing import CLIENT, span
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+LLM_TIMEOUT = float(os.getenv("AEON_LLM_TIMEOUT", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("AEON_LLM_MAX_CONNECTIONS", "100"))
+PLACEHOLDER_KEY_PREFIX = "sk-proj-X1"
+
+# Транспорт httpx вместо сети (ASGI-приложение заглушки в тестах)
+transport = None
+
+# Общий клиент: создание AsyncClient загружает SSL-контекст (~30 мс CPU в
+# цикле событий), поэтому на каждый запрос его создавать нельзя. Клиент
+# привязан к циклу событий и транспорту, при их смене создаётся заново
+_client = None
+_client_owner = None
+
+
+def _shared_client():
+    global _client, _client_owner
+    import httpx
+
+    owner = (asyncio.get_running_loop(), transport)
+    if _client is None or _client_owner != owner:
+        _client = httpx.AsyncClient(timeout=LLM_TIMEOUT, transport=transport,
+                                    limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                                        max_keepalive_connections=LLM_MAX_CONNECTIONS))
+        _client_owner = owner
+    return _client
+
+
+async def close():
+    """Закрывает общий клиент (при остановке приложения)"""
+    global _client, _client_owner
+    if _client is not None:
+        client, _client, _client_owner = _client, None, None
+        await client.aclose()
+
+
+def llm_configured(api_key: Optional[str], base_url: Optional[str] = None) -> bool:
+    """Есть ли смысл обращаться к модели с этим ключом"""
+    base_url = base_url or OPENAI_BASE_URL
+    if not api_key:
+        return False
+    return base_url != DEFAULT_BASE_URL or not api_key.startswith(PLACEHOLDER_KEY_PREFIX)
+
+
+async def chat_completion(api_key: str, messages: List[Dict[str, str]], base_url: Optional[str] = None,
+                          **params: Any) -> Optional[str]:
+    """Текст ответа модели или None при любой ошибке (вызывающий использует запасной вариант)"""
+    import httpx
+
+    payload = {"model": OPENAI_MODEL, "messages": messages, **params}
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    url = f"{base_url or OPENAI_BASE_URL}/chat/completions"
+    with span("llm.chat_completion", CLIENT, **{"http.url": url, "llm.model": OPENAI_MODEL}) as current:
+        try:
+            response = await _shared_client().post(url, json=payload, headers=headers)
+            current.set("http.status_code", response.status_code)
+            if response.status_code != 200:
+                return None
+            return response.json()["choices"][0]["message"]["content"]
+        except (httpx.HTTPError, ValueError, KeyError, IndexError, TypeError) as exc:
+            current.set("error.type", type(exc).__name__)
+            return None
+
+
+async def chat_completion_json(api_key: str, messages: List[Dict[str, str]], **params: Any) -> Optional[Dict]:
+    """Ответ модели, разобранный как JSON-объект, или None"""
+    content = await chat_completion(api_key, messages, **params)
+    if content is None:
+        return None
+    try:
+        result = json.loads(content)
+    except ValueError:
+        return None
+    return result if isinstance(result, dict) else None
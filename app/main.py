@@ -1,6 +1,71 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.api import router, admin_router
 
-app = FastAPI()
-app.include_router(router)
-app.include_router(admin_router)
\ No newline at end of file
+
+def create_app() -> FastAPI:
+    """Фабрика приложения: gunicorn "app.main:create_app()" или uvicorn --factory"""
+    from app.api import (router, admin_router, sessions, log, retired_tokens, archive_idle_sessions,
+                         retire_archived_tokens, reindex_restored_answers)
+    from app.admission import ADMISSION_CONTROL, admission
+    from app.archive import ARCHIVE_SWEEP_SECONDS, archive
+    from app.blobs import MAX_REQUEST_BODY_BYTES
+    from app.compression import COMPRESSION, CompressionMiddleware
+    from app import llm
+    from app.journal import journal
+    from app.middleware import AdmissionControlMiddleware, BodySizeLimitMiddleware, TracingMiddleware
+    from app.relevance import relevance
+    from app.scoring import scoring
+    from app.tracing import tracer
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Восстановление сессий и выведенных из оборота токенов из снапшота и хвоста журнала
+        journal.recover(sessions, log, retired_tokens)
+        reindex_restored_answers()  # Индекс почти копий живёт только в памяти
+        journal.start()
+        relevance.start()
+        sweeper = None
+        if archive.enabled:
+            archive.open()
+            retire_archived_tokens()  # Журнал мог быть удалён или снапшот — старше архива
+            archive_idle_sessions(check_existing=True)
+            sweeper = asyncio.create_task(archive_loop())
+        yield
+        if sweeper is not None:
+            sweeper.cancel()
+        await llm.close()
+        scoring.close()
+        relevance.close()
+        tracer.close()
+        journal.close()
+
+    async def archive_loop():
+        # Завершённые и истёкшие сессии периодически уходят из памяти в архив
+        while True:
+            await asyncio.sleep(ARCHIVE_SWEEP_SECONDS)
+            await asyncio.to_thread(archive_idle_sessions)
+
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BODY_BYTES)
+    if COMPRESSION:
+        # Внутри допуска и трассировки: отказы 429/503 не сжимаются, а сжатие входит в спан
+        app.add_middleware(CompressionMiddleware)
+    if ADMISSION_CONTROL:
+        # Добавлен последним — выполняется первым и отсекает лишнее до чтения тела
+        app.add_middleware(AdmissionControlMiddleware, controller=admission)
+    if tracer.enabled:
+        # Самый внешний слой: корневой спан включает и ожидание в очереди допуска
+        app.add_middleware(TracingMiddleware, tracer=tracer)
+    app.include_router(router)
+    app.include_router(admin_router)
+    return app
+
+
+def __getattr__(name):
+    # Совместимость с "app.main:app": приложение создаётся при первом обращении
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
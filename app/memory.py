@@ -0,0 +1,247 @@
+"""Оценка памяти воркера по подсистемам и диффы снапшотов tracemalloc.
+
+Размеры приблизительные: большие коллекции (сессии, лог, тексты ответов,
+корзины индексов) не обходятся целиком — глубокий размер считается по
+равномерной выборке из AEON_MEMORY_SAMPLE элементов и умножается на их
+число. Коллекции, которые меняют другие потоки, сначала копируются
+list(...): копирование ссылок идёт на стороне C целиком под GIL, так что
+обход не падает с «dictionary changed size during iteration»; из копии
+выборка берётся срезом с шагом. Подсистемы отдают свои контейнеры только
+через публичные memory_items() и __len__ — отчёт не читает их приватные
+поля, так что внутреннее устройство модулей можно менять, обновив только
+memory_items(). Объекты, общие для нескольких подсистем
+(например, строка токена — ключ сессии и поле в записях лога),
+учитываются в каждой, так что сумма — оценка сверху.
+
+tracemalloc включается только по запросу (POST /admin/memory/snapshot):
+пока он активен, каждая аллокация дороже, поэтому его следует выключать
+после диагностики (DELETE /admin/memory/snapshots).
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+from collections import OrderedDict
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Collection, Dict, Iterable, List, Optional
+
+MEMORY_SAMPLE = int(os.getenv("AEON_MEMORY_SAMPLE", "200"))
+# Глубина стека, которую запоминает tracemalloc (1 — только строка аллокации)
+TRACEMALLOC_FRAMES = int(os.getenv("AEON_TRACEMALLOC_FRAMES", "1"))
+MAX_SNAPSHOTS = 8
+# Не входят в сумму по куче: мемо уже учтены в размере сессий, mmap архива — не куча
+NOT_HEAP = ("session_memo", "archive_mapped")
+
+_ATOMIC = (str, bytes, bytearray, int, float, bool, complex, type(None), array, memoryview)
+# Код, классы и модули общие для всех — в размер данных не входят
+_SKIP = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def deep_size(obj: Any, seen: Optional[set] = None) -> int:
+    """sys.getsizeof объекта и всего достижимого из него (каждый объект — один раз)"""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SKIP):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, _ATOMIC):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            for cls in type(item).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    value = getattr(item, name, None)
+                    if value is not None:
+                        stack.append(value)
+            namespace = getattr(item, "__dict__", None)
+            if namespace is not None:
+                stack.append(namespace)
+    return total
+
+
+def sample(values: Collection, limit: int = MEMORY_SAMPLE) -> List:
+    """Равномерная выборка не более limit элементов из снимка коллекции (или её view)"""
+    snapshot = list(values)
+    return snapshot[::max(1, len(snapshot) // limit)][:limit]
+
+
+def estimate(container, values: Optional[Collection] = None, limit: int = MEMORY_SAMPLE) -> Dict[str, Any]:
+    """Число элементов и оценка байт: контейнер + средний глубокий размер элемента × число.
+
+    values — view элементов контейнера (например, dict.values()), не итератор.
+    """
+    snapshot = list(values if values is not None else container)
+    count = len(snapshot)
+    items = sample(snapshot, limit)
+    # Общий seen на выборку: строки времени, id вопросов и прочее разделяемое между
+    # элементами считается один раз, а не в каждом элементе
+    seen: set = set()
+    per_item = sum(deep_size(item, seen) for item in items) / len(items) if items else 0
+    return {"count": count, "bytes": int(sys.getsizeof(container) + per_item * count),
+            "per_item_bytes": int(per_item)}
+
+
+def parts_size(parts: Iterable[Any], limit: int = MEMORY_SAMPLE) -> int:
+    """Оценка байт контейнеров из memory_items(): словари и списки — по выборке"""
+    total = 0
+    for part in parts:
+        if isinstance(part, dict):
+            total += estimate(part, part.items(), limit)["bytes"]
+        elif isinstance(part, (list, tuple, set, frozenset)):
+            total += estimate(part, limit=limit)["bytes"]
+        elif part is not None:
+            total += deep_size(part)
+    return total
+
+
+def usage(subsystem: Any, limit: int = MEMORY_SAMPLE) -> Dict[str, int]:
+    """Число записей и оценка байт подсистемы с __len__ и memory_items()"""
+    return {"count": len(subsystem), "bytes": parts_size(subsystem.memory_items(), limit)}
+
+
+def process_rss() -> Optional[int]:
+    """Текущий RSS процесса в байтах (Linux) или пиковый по getrusage"""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def subsystem_report(sessions: Dict[str, Any], log: List[Dict], templates=None,
+                     extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Приблизительная память по подсистемам"""
+    from app.admission import admission
+    from app.archive import archive
+    from app.blobs import answer_store
+    from app.dedup import near_duplicates
+    from app.questions import question_banks
+    from app.relevance import relevance
+    from app.tracing import tracer
+
+    started = time.perf_counter()
+    states = list(sessions.values())
+    session_sample = sample(states)
+    seen: set = set()
+    mapped = archive.memory_items()
+    memo_bytes = sum(deep_size(state.memo_items(), seen) for state in session_sample)
+    report: Dict[str, Any] = {
+        "sessions": estimate(sessions, states),
+        "session_memo": {"sampled": len(session_sample),
+                         "bytes": int(memo_bytes / len(session_sample) * len(states)) if session_sample else 0},
+        "log": estimate(log),
+        "answer_texts": usage(answer_store) | {"compressed": answer_store.compressed_count},
+        "near_duplicates": usage(near_duplicates),
+        "relevance": usage(relevance),
+        "question_banks": usage(question_banks),
+        "admission_buckets": usage(admission),
+        "trace_queue": {"pending": tracer.pending, "dropped": tracer.dropped},
+        "archive_mapped": {"files": len(mapped), "bytes": sum(len(part) for part in mapped)},
+    }
+    if templates is not None:
+        cache = templates.env.cache
+        # Окружение общее для всех шаблонов — в размер кэша не входит
+        report["jinja_templates"] = {"cached": len(cache) if cache is not None else 0,
+                                     "bytes": deep_size(list(cache.values()), {id(templates.env)}) if cache else 0}
+    for name, value in (extra or {}).items():
+        report[name] = value
+    heap = sum(part["bytes"] for name, part in report.items() if name not in NOT_HEAP and "bytes" in part)
+    return {
+        "rss_bytes": process_rss(),
+        "accounted_heap_bytes": heap,
+        "subsystems": report,
+        "tracemalloc": profiler.status(),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+class MemoryProfiler:
+    """Снапшоты tracemalloc по запросу и дифф между ними"""
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES, max_snapshots: int = MAX_SNAPSHOTS):
+        self.frames = frames
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (время, снапшот)
+        self._ids = itertools.count(1)
+        self._started_here = False
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Запускает tracemalloc (если нужно) и запоминает снапшот"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._started_here = True
+            snapshot_id = next(self._ids)
+            self._snapshots[snapshot_id] = (time.time(), self._take())
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return {"id": snapshot_id} | self.status()
+
+    def diff(self, since: Optional[int] = None, until: Optional[int] = None, group_by: str = "lineno",
+             limit: int = 20) -> Optional[Dict[str, Any]]:
+        """Топ изменений между снапшотами since и until (по умолчанию — последний и текущий момент)"""
+        with self._lock:
+            if not self._snapshots:
+                return None
+            since = since if since is not None else next(reversed(self._snapshots))
+            if since not in self._snapshots or (until is not None and until not in self._snapshots):
+                return None
+            before_ts, before = self._snapshots[since]
+            after_ts, after = self._snapshots[until] if until is not None else (time.time(), self._take())
+        stats = after.compare_to(before, group_by)
+        return {
+            "since": since,
+            "until": until,
+            "seconds": round(after_ts - before_ts, 3),
+            "size_diff": sum(stat.size_diff for stat in stats),
+            "count_diff": sum(stat.count_diff for stat in stats),
+            "top": [{
+                "where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size": stat.size,
+                "count": stat.count,
+            } for stat in stats[:limit]],
+        }
+
+    def stop(self):
+        """Забывает снапшоты и выключает tracemalloc, если его включил профилировщик"""
+        with self._lock:
+            self._snapshots.clear()
+            if self._started_here and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._started_here = False
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {"tracing": tracing, "traced_bytes": current, "traced_peak_bytes": peak,
+                "snapshots": [{"id": snapshot_id, "time": ts} for snapshot_id, (ts, _) in self._snapshots.items()]}
+
+
+profiler = MemoryProfiler()
@@ -0,0 +1,133 @@
+"""ASGI-middleware приложения"""
+import math
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.admission import UNLIMITED_PATHS, route_key, session_token
+
+
+class BodySizeLimitMiddleware:
+    """Отклоняет запросы с телом больше лимита, не дожидаясь окончания разбора.
+
+    Заявленный Content-Length проверяется сразу; для потоковых тел байты
+    считаются по мере чтения, и чтение прерывается при превышении.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_bytes:
+                    response = JSONResponse({"detail": "Слишком большой запрос"}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Слишком большой запрос")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class AdmissionControlMiddleware:
+    """Token bucket по IP, токену сессии и маршруту плюс ограничение очереди по классу маршрута"""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNLIMITED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        route_class = self.controller.classify(path)
+        rejected = self.controller.check_rate(route_class, self.controller.client_ip(scope), session_token(path),
+                                              route_key(path))
+        if rejected is not None:
+            response = JSONResponse({"detail": "Слишком много запросов"}, status_code=429,
+                                    headers={"Retry-After": str(max(1, math.ceil(rejected[1])))})
+            await response(scope, receive, send)
+            return
+
+        if not await self.controller.acquire(route_class):
+            response = JSONResponse({"detail": "Сервер перегружен, повторите позже"}, status_code=503,
+                                    headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class)
+
+
+class TracingMiddleware:
+    """Корневой спан запроса; вложенные спаны обработчиков к нему привязываются.
+
+    Имя спана — метод и шаблон маршрута ("POST /session/{token}/answer"),
+    чтобы трассы группировались по маршруту, а не по конкретному токену.
+    """
+
+    def __init__(self, app, tracer):
+        self.app = app
+        self.tracer = tracer
+        self._route_paths = None  # endpoint -> шаблон пути, строится при первом запросе
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if self._route_paths is None and "app" in scope:
+            self._route_paths = {getattr(route, "endpoint", None): route.path
+                                 for route in scope["app"].router.routes}
+        return (self._route_paths or {}).get(endpoint, scope["path"] if endpoint else "")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        root = self.tracer.start_trace(scope["method"], traceparent, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        })
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+            await send(message)
+
+        with root:
+            try:
+                await self.app(scope, receive, traced_send)
+            finally:
+                route = self._route_path(scope)
+                if route:
+                    root.name = f"{scope['method']} {route}"
+                    root.set("http.route", route)
@@ -0,0 +1,196 @@
+"""Банки вопросов AEON, загружаемые из JSON/YAML.
+
+Банк неизменяем: вопросы индексируются по тегам (тип, роль, язык), а
+последовательность вопросов для набора фильтров строится один раз и
+кэшируется. Сессия хранит версию банка и курсор в этой последовательности,
+поэтому выбор следующего вопроса — O(1) без линейного поиска.
+
+Файл банка перечитывается при изменении (проверка mtime не чаще раза в
+QUESTION_BANK_CHECK_SECONDS) или по запросу админки; новый банк строится
+целиком и подменяется одним присваиванием. Сессии продолжают работать с
+той версией, с которой начали: версия, на которую ссылается живая сессия,
+не вытесняется из реестра. Строка версии однозначно задаёт содержимое —
+повторная загрузка той же версии с другими вопросами отклоняется.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+QUESTION_BANK_PATH = os.getenv(
+    "AEON_QUESTION_BANK",
+    os.path.join(os.path.dirname(__file__), "../data/questions.json"),
+)
+QUESTION_BANK_CHECK_SECONDS = float(os.getenv("AEON_QUESTION_BANK_CHECK_SECONDS", "5"))
+# Сколько прежних версий банка держать сверх тех, что нужны живым сессиям
+QUESTION_BANK_KEEP_VERSIONS = 16
+
+# Фильтр сессии: (роль, язык); None — без ограничения
+Track = Tuple[Optional[str], Optional[str]]
+
+
+class QuestionBankError(ValueError):
+    """Некорректный файл банка вопросов"""
+
+
+class QuestionBank:
+    """Неизменяемый банк вопросов с индексом по тегам"""
+
+    def __init__(self, questions: List[Dict[str, Any]], version: str, digest: Optional[str] = None):
+        self.version = version
+        self.digest = digest or content_digest(questions)
+        self.questions: Tuple[Dict[str, Any], ...] = tuple(questions)
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self._tags: Dict[Tuple[str, str], List[int]] = {}
+        self._untagged_roles: List[int] = []
+        self._sequences: Dict[Track, Tuple[Dict[str, Any], ...]] = {}
+        self._lock = threading.Lock()
+
+        for pos, question in enumerate(self.questions):
+            if "id" not in question or "text" not in question:
+                raise QuestionBankError(f"Вопрос #{pos + 1} без id или text")
+            if question["id"] in self.by_id:
+                raise QuestionBankError(f"Повторяющийся id вопроса: {question['id']}")
+            self.by_id[question["id"]] = question
+            self._tags.setdefault(("type", question.get("type", "")), []).append(pos)
+            if question.get("lang"):
+                self._tags.setdefault(("lang", question["lang"]), []).append(pos)
+            roles = question.get("roles") or ()
+            for role in roles:
+                self._tags.setdefault(("role", role), []).append(pos)
+            if not roles:
+                self._untagged_roles.append(pos)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def tagged(self, tag: str, value: str) -> List[Dict[str, Any]]:
+        return [self.questions[pos] for pos in self._tags.get((tag, value), ())]
+
+    def sequence(self, track: Optional[Track] = None) -> Sequence[Dict[str, Any]]:
+        """Упорядоченные вопросы для фильтра сессии (строится один раз)"""
+        track = track or (None, None)
+        cached = self._sequences.get(track)
+        if cached is not None:
+            return cached
+        role, lang = track
+        positions = range(len(self.questions))
+        if lang is not None:
+            positions = self._tags.get(("lang", lang), ())
+        if role is not None:
+            allowed = set(self._tags.get(("role", role), ())) | set(self._untagged_roles)
+            positions = [pos for pos in positions if pos in allowed]
+        sequence = tuple(self.questions[pos] for pos in positions)
+        with self._lock:
+            return self._sequences.setdefault(track, sequence)
+
+
+def content_digest(questions: List[Dict[str, Any]]) -> str:
+    """Хеш содержимого банка, не зависящий от форматирования файла"""
+    canonical = json.dumps(questions, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def load_question_bank(path: str) -> QuestionBank:
+    """Загрузка банка из JSON или YAML (YAML требует PyYAML)"""
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError as exc:
+            raise QuestionBankError("Для YAML-банков нужен пакет PyYAML") from exc
+        data = yaml.safe_load(raw)
+    else:
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            raise QuestionBankError(f"Некорректный JSON: {exc}") from exc
+    if isinstance(data, list):
+        data = {"questions": data}
+    if not isinstance(data, dict) or not isinstance(data.get("questions"), list):
+        raise QuestionBankError("Ожидается список вопросов в поле questions")
+    version = str(data.get("version") or hashlib.sha1(raw).hexdigest()[:12])
+    return QuestionBank(data["questions"], version)
+
+
+class QuestionBankRegistry:
+    """Текущий банк и недавние версии для уже начатых сессий"""
+
+    def __init__(self, path: str = QUESTION_BANK_PATH, check_seconds: float = QUESTION_BANK_CHECK_SECONDS,
+                 in_use: Optional[Callable[[], Iterable[Optional[str]]]] = None):
+        self.path = path
+        self.check_seconds = check_seconds
+        # Версии, на которые ссылаются живые сессии (их нельзя вытеснять)
+        self.in_use = in_use
+        self._lock = threading.Lock()
+        self._versions: "OrderedDict[str, QuestionBank]" = OrderedDict()
+        self._digests: Dict[str, str] = {}  # Все когда-либо загруженные версии -> хеш содержимого
+        self._current: Optional[QuestionBank] = None
+        self._mtime = 0.0
+        self._checked = 0.0
+
+    def reload(self) -> QuestionBank:
+        """Перечитывает файл и атомарно подменяет текущий банк"""
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            bank = load_question_bank(self.path)
+            known = self._digests.get(bank.version)
+            if known is not None and known != bank.digest:
+                raise QuestionBankError(f"Версия {bank.version} уже загружалась с другими вопросами")
+            self._mtime = mtime
+            self._checked = time.monotonic()
+            self._digests[bank.version] = bank.digest
+            # Та же версия — тот же объект: кэш последовательностей сохраняется
+            bank = self._versions.setdefault(bank.version, bank)
+            self._versions.move_to_end(bank.version)
+            self._current = bank
+            self._evict()
+            return bank
+
+    def _evict(self):
+        excess = len(self._versions) - QUESTION_BANK_KEEP_VERSIONS
+        if excess <= 0:
+            return
+        pinned = set(self.in_use()) if self.in_use is not None else set()
+        pinned.add(self._current.version)
+        for version in [v for v in self._versions if v not in pinned][:excess]:
+            del self._versions[version]
+
+    def current(self) -> QuestionBank:
+        bank = self._current
+        if bank is None:
+            return self.reload()
+        now = time.monotonic()
+        if now - self._checked >= self.check_seconds:
+            self._checked = now
+            try:
+                if os.stat(self.path).st_mtime != self._mtime:
+                    return self.reload()
+            except (OSError, QuestionBankError):
+                pass  # Остаёмся на последнем корректном банке
+        return bank
+
+    def __contains__(self, version: Optional[str]) -> bool:
+        return version in self._versions
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def memory_items(self) -> tuple:
+        """Загруженные версии банка для отчёта о памяти"""
+        return tuple(self._versions.values())
+
+    def get(self, version: Optional[str]) -> QuestionBank:
+        """Банк нужной версии; если её нет в реестре (сессия из журнала после рестарта) — текущий"""
+        if version is not None:
+            bank = self._versions.get(version)
+            if bank is not None:
+                return bank
+        return self.current()
+
+
+question_banks = QuestionBankRegistry()
@@ -0,0 +1,235 @@
+"""Локальная оценка релевантности ответа вопросу (TF-IDF + косинус).
+
+Словарь и IDF строятся по текстам вопросов банка и по всем сохранённым
+ответам. Для каждого вопроса заранее считается разреженный вектор: текст
+вопроса с ключевыми словами плюс (с весом RELEVANCE_FEEDBACK) центроид
+ответов кандидатов на него — так в вектор попадают формулировки, которых
+нет среди ключевых слов. Ответ оценивается косинусом между его TF-IDF
+вектором и вектором вопроса.
+
+Частоты документов обновляются сразу при сохранении ответа, а фоновый
+поток раз в RELEVANCE_REBUILD_SECONDS пересчитывает IDF только для
+изменившихся терминов и перестраивает векторы вопросов. IDF записан как
+log(1 + N) + offset(термин): от общего числа документов зависит только
+общее слагаемое, поэтому остальные термины пересчитывать не нужно.
+
+Каждый пересчёт публикует неизменяемый снимок модели с номером версии
+(векторы, log(1 + N) и свои offsets); оценка ответа целиком идёт по одному
+снимку. На пути запроса модель строится только один раз — если её ещё нет;
+дальше её обновляет только фоновый поток, а вопрос из только что
+перезагруженного банка до ближайшего пересчёта считается неизвестным.
+
+Слова нормализуются обрезкой до STEM_CHARS букв, чтобы словоформы
+(«навыки», «навыков») совпадали без морфологического словаря.
+"""
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.questions import QuestionBank, question_banks
+
+RELEVANCE_REBUILD_SECONDS = float(os.getenv("AEON_RELEVANCE_REBUILD_SECONDS", "5"))
+# Вес центроида ответов в векторе вопроса относительно его текста
+RELEVANCE_FEEDBACK = float(os.getenv("AEON_RELEVANCE_FEEDBACK", "0.5"))
+# Сколько терминов центроида ответов оставлять в векторе вопроса
+RELEVANCE_CENTROID_TERMS = int(os.getenv("AEON_RELEVANCE_CENTROID_TERMS", "200"))
+# Вес ключевых слов вопроса относительно слов его текста
+KEYWORD_WEIGHT = 2
+STEM_CHARS = 5
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def terms(text: str) -> List[str]:
+    return [word[:STEM_CHARS] for word in _WORD_RE.findall(text.lower()) if len(word) > 2]
+
+
+def _normalized(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+class RelevanceModel:
+    """Опубликованный снимок модели; после публикации не меняется"""
+
+    __slots__ = ("version", "base", "vectors", "offsets")
+
+    def __init__(self, version: int, base: float, vectors: Dict[str, Dict[str, float]],
+                 offsets: Dict[str, float]):
+        self.version = version
+        self.base = base  # log(1 + N)
+        self.vectors = vectors  # Вопрос -> нормализованный вектор
+        self.offsets = offsets  # Термин -> 1 - log(1 + df) на момент пересчёта
+
+    def weights(self, tf: Dict[str, int]) -> Dict[str, float]:
+        base, offsets = self.base, self.offsets
+        return {term: count * (base + offsets.get(term, 1.0)) for term, count in tf.items()}
+
+
+class RelevanceScorer:
+    """TF-IDF модель вопросов с фоновым инкрементальным пересчётом IDF"""
+
+    def __init__(self, bank_provider: Optional[Callable[[], QuestionBank]] = None,
+                 interval: float = RELEVANCE_REBUILD_SECONDS, feedback: float = RELEVANCE_FEEDBACK):
+        self.bank_provider = bank_provider
+        self.interval = interval
+        self.feedback = feedback
+        self._lock = threading.Lock()  # Защищает частоты
+        self._rebuild_lock = threading.Lock()
+        self._documents = 0
+        self._df: Counter = Counter()  # Термин -> число документов с ним
+        self._answer_tf: Dict[str, Counter] = {}  # Вопрос -> частоты терминов в ответах
+        self._changed: Set[str] = set()  # Термины, чья частота изменилась после пересчёта
+        self._offsets: Dict[str, float] = {}  # Термин -> 1 - log(1 + df); копируется при пересчёте
+        self._bank_versions: Set[str] = set()
+        # Опубликованная модель; заменяется целиком
+        self._model: Optional[RelevanceModel] = None
+        self._dirty = True
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rebuilds = 0
+
+    def __len__(self) -> int:
+        """Число вопросов, по которым накоплены ответы"""
+        return len(self._answer_tf)
+
+    def memory_items(self) -> tuple:
+        """Модель и частоты для отчёта о памяти"""
+        return (self._model, self._df, self._answer_tf, self._offsets)
+
+    # --- Накопление ---
+
+    def _add_document(self, document_terms: List[str]):
+        unique = set(document_terms)
+        self._df.update(unique)
+        self._changed |= unique
+        self._documents += 1
+        self._dirty = True
+
+    def observe(self, question_id: str, text: str):
+        """Учитывает сохранённый ответ в словаре и центроиде вопроса"""
+        if not isinstance(text, str):
+            return
+        answer_terms = terms(text)
+        if not answer_terms:
+            return
+        with self._lock:
+            self._add_document(answer_terms)
+            tf = self._answer_tf.get(question_id)
+            if tf is None:
+                tf = self._answer_tf[question_id] = Counter()
+            tf.update(answer_terms)
+
+    def _observe_bank(self, bank: QuestionBank) -> List[Tuple[str, List[str]]]:
+        documents = []
+        for question in bank.questions:
+            document = terms(question.get("text", ""))
+            for keyword in question.get("keywords", []):
+                document += terms(keyword) * KEYWORD_WEIGHT
+            documents.append((question["id"], document))
+        with self._lock:
+            if bank.version not in self._bank_versions:
+                self._bank_versions.add(bank.version)
+                for _, document in documents:
+                    self._add_document(document)
+        return documents
+
+    # --- Пересчёт ---
+
+    def rebuild(self):
+        """Пересчитывает IDF изменившихся терминов и векторы вопросов"""
+        with self._rebuild_lock:
+            bank = self.bank_provider() if self.bank_provider else None
+            documents = self._observe_bank(bank) if bank is not None else []
+            with self._lock:
+                changed, self._changed = self._changed, set()
+                offsets = {term: 1 - math.log(1 + self._df[term]) for term in changed}
+                documents_total = self._documents
+                centroids = {qid: tf.most_common(RELEVANCE_CENTROID_TERMS * 4)
+                             for qid, tf in self._answer_tf.items()}
+                self._dirty = False
+            # Копия, а не обновление на месте: прежний снимок продолжает ею пользоваться
+            self._offsets = dict(self._offsets)
+            self._offsets.update(offsets)
+            model = RelevanceModel(self.rebuilds + 1, math.log(1 + documents_total), {}, self._offsets)
+
+            vectors = model.vectors
+            for question_id, document in documents:
+                vector = _normalized(model.weights(Counter(document)))
+                centroid = centroids.get(question_id)
+                if centroid and self.feedback:
+                    weights = model.weights(dict(centroid))
+                    top = heapq.nlargest(RELEVANCE_CENTROID_TERMS, weights.items(), key=lambda item: item[1])
+                    for term, weight in _normalized(dict(top)).items():
+                        vector[term] = vector.get(term, 0.0) + self.feedback * weight
+                    vector = _normalized(vector)
+                vectors[question_id] = vector
+            self._model = model
+            self.rebuilds += 1
+
+    def _bank_changed(self) -> bool:
+        return self.bank_provider is not None and self.bank_provider().version not in self._bank_versions
+
+    # --- Оценка ---
+
+    def model(self) -> RelevanceModel:
+        """Текущий снимок модели; синхронно строится только самый первый"""
+        model = self._model
+        if model is None:
+            self.rebuild()
+            model = self._model
+        return model
+
+    @property
+    def version(self) -> int:
+        """Версия опубликованной модели (входит в ключи мемо оценок; первая строится синхронно)"""
+        return self.model().version
+
+    def score(self, question_id: str, text: str) -> Optional[float]:
+        """Косинус между ответом и вектором вопроса (0..1) или None, если вопрос неизвестен"""
+        if not isinstance(text, str):
+            return None
+        return self.score_terms(question_id, Counter(terms(text)))
+
+    def score_terms(self, question_id: str, counts: Dict[str, int]) -> Optional[float]:
+        """То же, что score, по уже посчитанным частотам терминов ответа"""
+        model = self.model()
+        vector = model.vectors.get(question_id)
+        return None if vector is None else self._cosine(model, vector, counts)
+
+    @staticmethod
+    def _cosine(model: RelevanceModel, vector: Dict[str, float], counts: Dict[str, int]) -> float:
+        weights = model.weights(counts)
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if not norm:
+            return 0.0
+        return sum(weight * vector.get(term, 0.0) for term, weight in weights.items()) / norm
+
+    # --- Фоновый поток ---
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.rebuild()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="aeon-relevance", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._dirty or self._bank_changed():
+                self.rebuild()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+relevance = RelevanceScorer(question_banks.current)
@@ -0,0 +1,220 @@
+"""Оценка качества ответов и её вынос из цикла событий.
+
+Глиф и сводка оценивают каждый ответ сессии: проход по тексту (регистр,
+слова, предложения, ключевые слова) и TF-IDF близость к вопросу. На
+длинных ответах это десятки миллисекунд, и в async-обработчике они
+останавливают все корутины воркера, включая ожидание LLM.
+
+ScoringExecutor выбирает, где считать, по суммарной длине ответов:
+- меньше SCORING_INLINE_CHARS — прямо в цикле (передача в пул дороже);
+- меньше SCORING_PROCESS_CHARS или без процессов — в пуле потоков: цикл
+  получает GIL хотя бы раз в sys.getswitchinterval();
+- больше — проход по тексту (text_features) в пуле процессов, без GIL.
+  В процесс уходят только тексты и ключевые слова, обратно — признаки и
+  частоты терминов; косинус с вектором вопроса досчитывается здесь,
+  потому что модель релевантности живёт в памяти основного процесса.
+
+Счётчики (задачи, в работе, глубина очереди, время) — в /admin/scoring.
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.relevance import relevance, terms
+
+SCORING_INLINE_CHARS = int(os.getenv("AEON_SCORING_INLINE_CHARS", "4000"))
+SCORING_PROCESS_CHARS = int(os.getenv("AEON_SCORING_PROCESS_CHARS", "200000"))
+SCORING_THREADS = int(os.getenv("AEON_SCORING_THREADS", "2"))
+# По умолчанию процессов на один меньше, чем ядер: одно ядро остаётся циклу
+SCORING_PROCESSES = int(os.getenv("AEON_SCORING_PROCESSES", str(max(0, (os.cpu_count() or 1) - 1))))
+
+EXAMPLE_WORDS = ("например", "пример", "случай", "ситуация")
+SPECIFIC_WORDS = ("конкретно", "именно", "определенно")
+EMPTY_QUALITY = {"score": 0, "details": "Пустой ответ"}
+
+# (question_id, ответ, ключевые слова вопроса)
+ScoringItem = Tuple[str, Any, List[str]]
+
+
+def text_features(answer: str, keywords: List[str]) -> Dict[str, Any]:
+    """Признаки ответа, зависящие только от текста (без модели релевантности)"""
+    answer_lower = answer.lower()
+    keyword_matches = sum(1 for keyword in keywords if keyword.lower() in answer_lower)
+    return {
+        "word_count": len(answer.split()),
+        "sentence_count": len([s for s in answer.split('.') if s.strip()]),
+        "keyword_matches": keyword_matches,
+        "keyword_ratio": keyword_matches / len(keywords) if keywords else 0,
+        "has_examples": any(word in answer_lower for word in EXAMPLE_WORDS),
+        "has_specifics": any(word in answer_lower for word in SPECIFIC_WORDS),
+        "terms": Counter(terms(answer)),
+    }
+
+
+def quality_from_features(features: Dict[str, Any], similarity: Optional[float]) -> Dict[str, Any]:
+    """Оценка качества (0-100) по признакам текста и TF-IDF близости к вопросу"""
+    word_count = features["word_count"]
+    sentence_count = features["sentence_count"]
+    relevance_ratio = max(features["keyword_ratio"], similarity or 0)
+    score = 0
+
+    # Базовая оценка по длине
+    if word_count >= 50:
+        score += 30
+    elif word_count >= 20:
+        score += 20
+    elif word_count >= 10:
+        score += 10
+
+    # Бонус за релевантность
+    score += min(30, relevance_ratio * 100)
+
+    # Бонус за примеры и конкретику
+    if features["has_examples"]:
+        score += 15
+    if features["has_specifics"]:
+        score += 10
+
+    # Бонус за структурированность
+    if sentence_count >= 3:
+        score += 10
+    elif sentence_count >= 2:
+        score += 5
+
+    # Штраф за слишком краткие ответы
+    if word_count < 5:
+        score = min(score, 10)
+
+    return {
+        "score": min(100, max(0, score)),
+        "word_count": word_count,
+        "sentence_count": sentence_count,
+        "keyword_matches": features["keyword_matches"],
+        "keyword_ratio": features["keyword_ratio"],
+        "relevance": relevance_ratio,
+        "has_examples": features["has_examples"],
+        "has_specifics": features["has_specifics"]
+    }
+
+
+def _finish(question_id: Optional[str], features: Dict[str, Any]) -> Dict[str, Any]:
+    counts = features.pop("terms")
+    similarity = relevance.score_terms(question_id, counts) if question_id else None
+    return quality_from_features(features, similarity)
+
+
+def answer_quality(answer: Any, keywords: List[str], question_id: Optional[str] = None) -> Dict[str, Any]:
+    if not answer or not isinstance(answer, str):
+        return dict(EMPTY_QUALITY)
+    return _finish(question_id, text_features(answer, keywords))
+
+
+def score_batch(items: Sequence[ScoringItem]) -> List[Dict[str, Any]]:
+    return [answer_quality(answer, keywords, question_id) for question_id, answer, keywords in items]
+
+
+def features_batch(items: Sequence[Tuple[str, List[str]]]) -> List[Dict[str, Any]]:
+    """Выполняется в процессе пула: только тексты, без состояния основного процесса"""
+    return [text_features(answer, keywords) for answer, keywords in items]
+
+
+class ScoringExecutor:
+    """Пулы потоков и процессов для оценки ответов с метриками очереди"""
+
+    def __init__(self, threads: int = SCORING_THREADS, processes: int = SCORING_PROCESSES,
+                 inline_chars: int = SCORING_INLINE_CHARS, process_chars: int = SCORING_PROCESS_CHARS):
+        self.workers = {"thread": max(1, threads), "process": processes}
+        self.inline_chars = inline_chars
+        self.process_chars = process_chars
+        self._pools: Dict[str, Executor] = {}
+        self.inline = 0
+        self.stats = {kind: {"tasks": 0, "inflight": 0, "max_queued": 0, "seconds": 0.0}
+                      for kind in self.workers}
+
+    def _pool(self, kind: str) -> Executor:
+        pool = self._pools.get(kind)
+        if pool is None:
+            if kind == "thread":
+                pool = ThreadPoolExecutor(self.workers[kind], thread_name_prefix="aeon-scoring")
+            else:
+                # spawn, а не fork: в воркере уже работают потоки журнала и релевантности
+                pool = ProcessPoolExecutor(self.workers[kind], mp_context=multiprocessing.get_context("spawn"))
+            self._pools[kind] = pool
+        return pool
+
+    def mode(self, chars: int) -> str:
+        if chars < self.inline_chars:
+            return "inline"
+        if chars >= self.process_chars and self.workers["process"] > 0:
+            return "process"
+        return "thread"
+
+    async def _submit(self, kind: str, func, *args):
+        stats = self.stats[kind]
+        stats["tasks"] += 1
+        stats["inflight"] += 1
+        stats["max_queued"] = max(stats["max_queued"], stats["inflight"] - self.workers[kind])
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            if kind == "thread":
+                # Контекст (текущая трасса) переходит в поток, как в asyncio.to_thread
+                return await loop.run_in_executor(self._pool(kind), contextvars.copy_context().run, func, *args)
+            return await loop.run_in_executor(self._pool(kind), func, *args)
+        finally:
+            stats["inflight"] -= 1
+            stats["seconds"] += time.perf_counter() - started
+
+    async def score(self, items: Sequence[ScoringItem]) -> List[Dict[str, Any]]:
+        """Оценки качества ответов в порядке items"""
+        chars = sum(len(answer) for _, answer, _ in items if isinstance(answer, str))
+        mode = self.mode(chars)
+        if mode == "inline":
+            self.inline += 1
+            return score_batch(items)
+        if mode == "thread":
+            return await self._submit("thread", score_batch, items)
+        texts = [(index, answer, keywords) for index, (_, answer, keywords) in enumerate(items)
+                 if answer and isinstance(answer, str)]
+        # Тексты делятся между процессами примерно поровну по длине
+        chunks: List[List[Tuple[int, str, List[str]]]] = [[] for _ in range(min(len(texts), self.workers["process"]))]
+        sizes = [0] * len(chunks)
+        for text in sorted(texts, key=lambda item: -len(item[1])):
+            smallest = sizes.index(min(sizes))
+            chunks[smallest].append(text)
+            sizes[smallest] += len(text[1])
+        parts = await asyncio.gather(*(
+            self._submit("process", features_batch, [(answer, keywords) for _, answer, keywords in chunk])
+            for chunk in chunks))
+        results: List[Dict[str, Any]] = [dict(EMPTY_QUALITY) for _ in items]
+        for chunk, features in zip(chunks, parts):
+            for (index, _, _), item_features in zip(chunk, features):
+                results[index] = _finish(items[index][0], item_features)
+        return results
+
+    def snapshot(self) -> Dict[str, Any]:
+        pools = {}
+        for kind, stats in self.stats.items():
+            pools[kind] = {
+                "workers": self.workers[kind],
+                "tasks": stats["tasks"],
+                "inflight": stats["inflight"],
+                "queued": max(0, stats["inflight"] - self.workers[kind]),
+                "max_queued": stats["max_queued"],
+                "avg_ms": round(stats["seconds"] / stats["tasks"] * 1000, 2) if stats["tasks"] else 0.0,
+            }
+        return {"inline_chars": self.inline_chars, "process_chars": self.process_chars,
+                "inline": self.inline, "pools": pools}
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        self._pools.clear()
+
+
+scoring = ScoringExecutor()
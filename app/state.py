@@ -0,0 +1,408 @@
+"""Компактное представление состояния сессии.
+
+При ~100k живых сессий обычный dataclass с двумя datetime, множеством строк
+и дублированием текстов ответов занимает сотни мегабайт. Здесь состояние
+хранится в __slots__, время — как epoch float, идентификаторы вопросов
+интернируются в небольшие целые, а заданные вопросы — битовая маска.
+
+Таблица интернирования своя у каждой версии банка вопросов: индексы не
+превышают размер банка, поэтому маска сессии не растёт от перезагрузок
+банков с новыми id. Сессия держит ссылку на таблицу своей версии; таблица
+версии, на которую не ссылается ни одна сессия, освобождается.
+
+Ответы, заданные вопросы и отметки меняются под общей блокировкой
+state_lock; под ней же to_record() снимает запись для снапшота журнала,
+поэтому снапшот не видит сессию посреди изменения.
+"""
+import threading
+import time
+import weakref
+from array import array
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.blobs import answer_store
+
+
+class QuestionIds:
+    """Интернирование id вопросов одной версии банка: строка <-> небольшое целое"""
+    __slots__ = ("ids", "index", "__weakref__")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def intern(self, question_id: str) -> int:
+        """Возвращает индекс вопроса, регистрируя его при необходимости"""
+        idx = self.index.get(question_id)
+        if idx is None:
+            with _tables_lock:
+                idx = self.index.get(question_id)
+                if idx is None:
+                    idx = len(self.ids)
+                    self.ids.append(question_id)
+                    self.index[question_id] = idx
+        return idx
+
+    def lookup(self, question_id: Any) -> Optional[int]:
+        """Индекс уже известного вопроса или None (без регистрации)"""
+        if not isinstance(question_id, str):
+            return None
+        return self.index.get(question_id)
+
+
+_tables_lock = threading.Lock()
+# Изменения ответов и заданных вопросов всех сессий и их сериализация для снапшота
+state_lock = threading.Lock()
+# Версия банка -> таблица; живёт, пока на неё ссылается хотя бы одна сессия
+_tables: "weakref.WeakValueDictionary[Optional[str], QuestionIds]" = weakref.WeakValueDictionary()
+
+
+def question_ids(bank_version: Optional[str]) -> QuestionIds:
+    """Таблица интернирования для версии банка (общая для её сессий)"""
+    table = _tables.get(bank_version)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(bank_version)
+            if table is None:
+                table = _tables[bank_version] = QuestionIds()
+    return table
+
+
+def _to_timestamp(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+# Позиция зафиксированного итога в записи SessionState.to_record()
+RECORD_RESULT = 9
+
+
+@dataclass(frozen=True, slots=True)
+class SessionResult:
+    """Итог сессии, зафиксированный один раз при завершении"""
+    session_id: str
+    total_time: int
+    questions_answered: int
+    completion_rate: float
+    average_time_per_question: int
+    performance_score: int
+    created_at: str
+    completed_at: str
+    glyph: str
+    profile: str
+    summary: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def to_record(self) -> list:
+        # Поля — только строки и числа, глубокое копирование astuple не нужно
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_record(cls, record: list) -> "SessionResult":
+        return cls(*record)
+
+    @classmethod
+    def from_session_record(cls, record: list) -> Optional["SessionResult"]:
+        """Итог из записи SessionState.to_record() (None — сессия не завершена)"""
+        result = record[RECORD_RESULT] if len(record) > RECORD_RESULT else None
+        return cls.from_record(result) if result else None
+
+
+class SessionState:
+    """Состояние одной интервью-сессии"""
+
+    __slots__ = (
+        "created_ts",
+        "last_activity_ts",
+        "completed",
+        "current_question_index",
+        "bank_version",
+        "track",
+        "revision",
+        "result",
+        "question_ts",
+        "asked_mask",
+        "order",
+        "answer_count",
+        "_ids",
+        "_texts",
+        "_extra",
+        "_duplicates",
+        "_analytics",
+        "_memo",
+    )
+
+    def __init__(self, created_ts: Optional[float] = None, bank_version: Optional[str] = None,
+                 track: Optional[tuple] = None):
+        now = time.time() if created_ts is None else created_ts
+        self.created_ts = now
+        self.last_activity_ts = now
+        self.completed = False
+        self.current_question_index = 0  # Курсор в последовательности вопросов банка
+        self.bank_version = bank_version  # Версия банка вопросов, с которой начата сессия
+        self.track = track  # Фильтр вопросов (роль, язык)
+        self.revision = 0  # Увеличивается при каждом изменении содержимого сессии
+        self.result: Optional[SessionResult] = None  # Заполняется при завершении
+        self.question_ts = 0.0  # Когда выдан последний вопрос
+        self.asked_mask = 0
+        self.order = array("I")  # Порядок заданных вопросов (индексы)
+        self.answer_count = 0  # Сколько раз присылались ответы
+        self._ids = question_ids(bank_version)  # Таблица интернирования версии банка
+        self._texts: Optional[Dict[int, int]] = None  # Индекс вопроса -> ссылка на ответ
+        self._extra: Optional[List[int]] = None  # Ссылки на ответы без question_id
+        self._duplicates: Optional[Dict[int, Tuple[str, float]]] = None  # Индекс вопроса -> (токен, сходство)
+        self._analytics: Optional[Dict[int, Tuple[float, int]]] = None  # Индекс вопроса -> учтённые (качество, слова)
+        self._memo: Optional[Dict[str, Tuple[Any, Any]]] = None  # Вид -> (ключ, отрендеренный результат)
+
+    # --- Время ---
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts, timezone.utc)
+
+    @created_at.setter
+    def created_at(self, value):
+        self.created_ts = _to_timestamp(value)
+
+    @property
+    def last_activity(self) -> datetime:
+        return datetime.fromtimestamp(self.last_activity_ts, timezone.utc)
+
+    @last_activity.setter
+    def last_activity(self, value):
+        self.last_activity_ts = _to_timestamp(value)
+
+    def touch(self):
+        """Обновление времени последней активности"""
+        self.last_activity_ts = time.time()
+
+    def complete(self):
+        if not self.completed:
+            self.completed = True
+            self.revision += 1
+
+    # --- Мемоизация отрендеренных ответов ---
+
+    def has_memo(self, kind: str, key: Any) -> bool:
+        cached = self._memo.get(kind) if self._memo else None
+        return cached is not None and cached[0] == key
+
+    def memo(self, kind: str, key: Any, render):
+        """Результат render() для данного ключа (обычно включает revision)"""
+        cached = self._memo.get(kind) if self._memo else None
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = render()
+        if self._memo is None:
+            self._memo = {}
+        self._memo[kind] = (key, value)
+        return value
+
+    def memo_items(self) -> Tuple[Any, ...]:
+        """Закэшированные представления сессии (для отчёта о памяти)"""
+        memo = self._memo
+        return tuple(memo.values()) if memo else ()
+
+    # --- Заданные вопросы ---
+
+    def mark_asked(self, question_id: str) -> int:
+        idx = self._ids.intern(question_id)
+        bit = 1 << idx
+        with state_lock:
+            if not self.asked_mask & bit:
+                self.asked_mask |= bit
+                self.order.append(idx)
+                self.revision += 1
+        return idx
+
+    def was_asked(self, question_id: Any) -> bool:
+        idx = self._ids.lookup(question_id)
+        return idx is not None and bool(self.asked_mask >> idx & 1)
+
+    @property
+    def asked_count(self) -> int:
+        return self.asked_mask.bit_count()
+
+    @property
+    def asked_questions(self) -> set:
+        ids = self._ids.ids
+        return {ids[idx] for idx in self.order}
+
+    @property
+    def question_order(self) -> List[str]:
+        ids = self._ids.ids
+        return [ids[idx] for idx in self.order]
+
+    @property
+    def last_question_id(self) -> Optional[str]:
+        return self._ids.ids[self.order[-1]] if self.order else None
+
+    # --- Ответы ---
+
+    def set_answer(self, question_id: str, text: Any) -> int:
+        """Сохраняет ответ на заданный вопрос и возвращает ссылку на него"""
+        ref = answer_store.put(text)
+        idx = self._ids.intern(question_id)
+        with state_lock:
+            if self._texts is None:
+                self._texts = {}
+            old = self._texts.get(idx)
+            self._texts[idx] = ref
+            if old is not None:
+                answer_store.release(old)  # Прежний ответ больше ни на что не ссылается
+            self.answer_count += 1
+            self.revision += 1
+        return ref
+
+    def add_raw_answer(self, payload: Dict) -> int:
+        """Сохраняет ответ без привязки к AEON-вопросу"""
+        ref = answer_store.put(payload)
+        with state_lock:
+            if self._extra is None:
+                self._extra = []
+            self._extra.append(ref)
+            self.answer_count += 1
+            self.revision += 1
+        return ref
+
+    def iter_answers(self) -> Iterator[Tuple[str, Any]]:
+        """Пары (id вопроса, текст ответа) в порядке первого ответа"""
+        with state_lock:
+            items = list(self._texts.items()) if self._texts else ()
+        ids = self._ids.ids
+        for idx, ref in items:
+            yield ids[idx], answer_store.get(ref, "")
+
+    def answer_text(self, question_id: str, default: Any = None) -> Any:
+        """Текущий ответ на вопрос или default"""
+        idx = self._ids.lookup(question_id)
+        if idx is None or not self._texts or idx not in self._texts:
+            return default
+        return answer_store.get(self._texts[idx], default)
+
+    def has_answer(self, question_id: str) -> bool:
+        idx = self._ids.lookup(question_id)
+        return idx is not None and bool(self._texts) and idx in self._texts
+
+    def recorded_analytics(self, question_id: str) -> Optional[Tuple[float, int]]:
+        """(качество, слова), с которыми ответ учтён в аналитике, или None"""
+        idx = self._ids.lookup(question_id)
+        return self._analytics.get(idx) if idx is not None and self._analytics else None
+
+    def record_analytics(self, question_id: str, quality: float, words: int):
+        """Запоминает вклад ответа в аналитику, чтобы при замене вычесть ровно его"""
+        idx = self._ids.intern(question_id)
+        with state_lock:
+            if self._analytics is None:
+                self._analytics = {}
+            self._analytics[idx] = (quality, words)
+
+    def flag_duplicate(self, question_id: str, match: Optional[Tuple[str, float]]):
+        """Отмечает ответ как почти копию ответа другой сессии (None — снять отметку)"""
+        idx = self._ids.intern(question_id)
+        with state_lock:
+            if match is not None:
+                if self._duplicates is None:
+                    self._duplicates = {}
+                self._duplicates[idx] = match
+            elif not self._duplicates or self._duplicates.pop(idx, None) is None:
+                return
+            self.revision += 1
+
+    @property
+    def duplicates(self) -> List[Dict[str, Any]]:
+        """Отметки о почти одинаковых ответах для админки и сводки"""
+        ids = self._ids.ids
+        return [{"question_id": ids[idx], "similar_to": token, "similarity": round(score, 2)}
+                for idx, (token, score) in sorted((self._duplicates or {}).items())]
+
+    def release_answers(self):
+        """Освобождает тексты ответов в хранилище (при удалении сессии)"""
+        with state_lock:
+            for ref in (self._texts or {}).values():
+                answer_store.release(ref)
+            for ref in self._extra or ():
+                answer_store.release(ref)
+            self._texts = None
+            self._extra = None
+            self._analytics = None
+            self._memo = None
+            self.revision += 1
+
+    def restore_answer(self, question_id: str, ref: int, text: Any):
+        """Восстанавливает ответ под прежней ссылкой (повторное применение безопасно)"""
+        idx = self._ids.intern(question_id)
+        with state_lock:
+            if self._texts is None:
+                self._texts = {}
+            old = self._texts.get(idx)
+            if old == ref:
+                return
+            answer_store.restore(ref, text)
+            self._texts[idx] = ref
+            if old is not None:
+                answer_store.release(old)
+            self.answer_count += 1
+            self.revision += 1
+
+    def restore_raw_answer(self, ref: int, payload: Dict):
+        with state_lock:
+            if self._extra is None:
+                self._extra = []
+            if ref in self._extra:
+                return
+            answer_store.restore(ref, payload)
+            self._extra.append(ref)
+            self.answer_count += 1
+            self.revision += 1
+
+    @property
+    def answered_count(self) -> int:
+        return len(self._texts) if self._texts else 0
+
+    @property
+    def aeon_answers(self) -> Dict[str, Any]:
+        return dict(self.iter_answers())
+
+    @property
+    def answers(self) -> List[Dict]:
+        """Представление всех ответов в виде словарей (для админки и экспорта)"""
+        result = [{"question_id": qid, "answer": text} for qid, text in self.iter_answers()]
+        with state_lock:
+            extra = list(self._extra or ())
+        result.extend(answer_store.get(ref, {}) for ref in extra)
+        return result
+
+    # --- Сериализация (снапшоты журнала) ---
+
+    def to_record(self) -> list:
+        """Запись для снапшота и архива; снимается целиком под state_lock"""
+        ids = self._ids.ids
+        with state_lock:
+            texts = [[ids[idx], ref, answer_store.get(ref, "")] for idx, ref in (self._texts or {}).items()]
+            extra = [[ref, answer_store.get(ref, {})] for ref in self._extra or ()]
+            return [self.created_ts, self.last_activity_ts, self.completed, self.answer_count,
+                    [ids[idx] for idx in self.order], texts, extra, self.bank_version, self.track,
+                    self.result.to_record() if self.result else None]
+
+    @classmethod
+    def from_record(cls, record: list) -> "SessionState":
+        created_ts, last_activity_ts, completed, answer_count, order, texts, extra = record[:7]
+        bank_version, track = (record[7], record[8]) if len(record) > 8 else (None, None)
+        state = cls(created_ts, bank_version, tuple(track) if track else None)
+        state.last_activity_ts = last_activity_ts
+        state.completed = completed
+        for question_id in order:
+            state.mark_asked(question_id)
+        for question_id, ref, text in texts:
+            state.restore_answer(question_id, ref, text)
+        for ref, payload in extra:
+            state.restore_raw_answer(ref, payload)
+        state.answer_count = answer_count
+        state.result = SessionResult.from_session_record(record)
+        return state
@@ -0,0 +1,133 @@
+"""Подписанные токены сессий без обращения к хранилищу.
+
+Токен несёт номер шарда, время создания, фильтр вопросов (роль, язык) и
+версию банка вопросов на момент выдачи и подписан HMAC-SHA256:
+
+    SSCCCCCCCCNNNNNNNNNNNNNNNN[.CLAIMS].SIGNATURE
+
+SS — шард в hex (фронтовой роутер направляет запрос по первым двум
+символам), CCCCCCCC — время создания (epoch секунды, hex), N… — 64 бита
+случайности, CLAIMS — base64url JSON [role, lang] или [role, lang,
+bank_version], SIGNATURE — первые 128 бит HMAC в base64url. Версия банка
+в токене нужна потому, что состояние создаётся позже выдачи: сессия
+начинается на том банке, который был текущим при POST /session, даже если
+его успели перезагрузить. Поддельный токен и токен с истёкшим сроком
+отклоняются по одной подписи, без поиска в словаре сессий; поэтому
+состояние сессии создаётся только при первой записи.
+
+Ключ подписи — AEON_TOKEN_SECRET. Без неё ключ хранится в token.key в
+каталоге журнала (создаётся при первом запуске), а без журнала —
+случайный на процесс: после рестарта прежние токены станут недействительны.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from app.journal import JOURNAL_DIR
+
+# Номер этого воркера для фронтового роутера (0..255)
+SHARD_ID = int(os.getenv("AEON_SHARD_ID", "0"))
+
+HEAD_CHARS = 2 + 8 + 16
+SIGNATURE_BYTES = 16
+SIGNATURE_CHARS = 22  # base64url от 16 байт без '='
+
+
+class TokenClaims(NamedTuple):
+    created_ts: float
+    shard: int
+    track: Optional[tuple]
+    bank_version: Optional[str] = None  # Версия банка вопросов при выдаче токена
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def load_secret(directory: Optional[str] = JOURNAL_DIR) -> bytes:
+    secret = os.getenv("AEON_TOKEN_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    if not directory:
+        return secrets.token_bytes(32)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "token.key")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as fh:
+            return fh.read()
+    key = secrets.token_bytes(32)
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(key)
+        fh.flush()
+        os.fsync(fh.fileno())
+    return key
+
+
+def token_shard(token: str) -> Optional[int]:
+    """Шард из токена для маршрутизации (подпись не проверяется)"""
+    try:
+        return int(token[:2], 16) if len(token) > HEAD_CHARS else None
+    except ValueError:
+        return None
+
+
+class SessionTokens:
+    """Выпуск и проверка подписанных токенов сессий"""
+
+    def __init__(self, secret: Optional[bytes] = None, shard: int = SHARD_ID):
+        if not 0 <= shard <= 0xFF:
+            raise ValueError("AEON_SHARD_ID должен быть в диапазоне 0..255")
+        self.shard = shard
+        # Состояние HMAC после ключа считается один раз, дальше только copy()
+        self._mac = hmac.new(secret if secret is not None else load_secret(), digestmod=hashlib.sha256)
+        self.rejected = 0
+
+    def _sign(self, body: str) -> str:
+        mac = self._mac.copy()
+        mac.update(body.encode("ascii"))
+        return _b64(mac.digest()[:SIGNATURE_BYTES])
+
+    def issue(self, track: Optional[Tuple[Optional[str], Optional[str]]] = None,
+              created_ts: Optional[float] = None, bank_version: Optional[str] = None) -> str:
+        created = int(time.time() if created_ts is None else created_ts)
+        body = f"{self.shard:02x}{created:08x}{secrets.randbits(64):016x}"
+        claims = list(track or (None, None))
+        if bank_version is not None:
+            claims.append(bank_version)
+        if any(value is not None for value in claims):
+            body += "." + _b64(json.dumps(claims, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        return f"{body}.{self._sign(body)}"
+
+    def verify(self, token: str) -> Optional[TokenClaims]:
+        """Данные токена или None, если формат или подпись не сходятся"""
+        body, _, signature = token.rpartition(".") if isinstance(token, str) else ("", "", "")
+        if len(signature) != SIGNATURE_CHARS or len(body) < HEAD_CHARS or not body.isascii():
+            self.rejected += 1
+            return None
+        if not hmac.compare_digest(signature, self._sign(body)):
+            self.rejected += 1
+            return None
+        head, _, extra = body.partition(".")
+        try:
+            claims = json.loads(_unb64(extra)) if extra else [None, None]
+            track = tuple(claims[:2])
+            return TokenClaims(float(int(head[2:10], 16)), int(head[:2], 16),
+                               track if any(value is not None for value in track) else None,
+                               claims[2] if len(claims) > 2 else None)
+        except (ValueError, TypeError):
+            self.rejected += 1
+            return None
+
+
+session_tokens = SessionTokens()
@@ -0,0 +1,296 @@
+"""Лёгкая трассировка запросов: спаны в контексте и экспорт в OTLP/JSON.
+
+Корневой спан открывает TracingMiddleware; решение о записи принимается
+один раз на запрос — по заголовку traceparent (W3C) или с вероятностью
+AEON_TRACE_SAMPLE_RATE. Вложенные span() берут родителя из contextvars,
+поэтому работают и в async-обработчиках, и в пуле потоков. Если запрос
+не попал в выборку (или трассировка выключена), span() возвращает общий
+пустой объект: стоимость — одно чтение ContextVar.
+
+Законченная трасса уходит в очередь, а фоновый поток сериализует её в
+строку OTLP/JSON (ExportTraceServiceRequest, как у file exporter
+OpenTelemetry Collector) и дописывает в AEON_TRACE_FILE с ротацией по
+AEON_TRACE_MAX_BYTES. При переполнении очереди трассы отбрасываются.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+TRACE_SAMPLE_RATE = float(os.getenv("AEON_TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.getenv("AEON_TRACE_FILE", "traces.otlp.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("AEON_TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("AEON_TRACE_BACKUPS", "5"))
+TRACE_QUEUE_SIZE = 10_000
+SERVICE_NAME = os.getenv("AEON_SERVICE_NAME", "aeon")
+
+# Виды спанов OTLP
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_current: ContextVar[Optional["Span"]] = ContextVar("aeon_span", default=None)
+
+
+class Trace:
+    """Спаны одного запроса; экспортируется целиком по завершении корня"""
+
+    __slots__ = ("trace_id", "spans", "root")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "status", "_tracer", "_token")
+
+    def __init__(self, tracer: "Tracer", trace: Trace, name: str, parent_id: Optional[str],
+                 kind: int = INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self._tracer = tracer
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.status = STATUS_OK
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.status = STATUS_ERROR
+            self.attributes["exception.type"] = exc_type.__name__
+        self.trace.spans.append(self)
+        if self.trace.root is self:
+            self._tracer.export(self.trace)
+        return False
+
+
+class _NoopSpan:
+    """Спан вне выборки: ничего не записывает"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, kind: int = INTERNAL, **attributes: Any):
+    """Дочерний спан текущей трассы или пустой объект вне трассы"""
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent._tracer, parent.trace, name, parent.span_id, kind, attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    parent = _current.get()
+    return parent.trace.trace_id if parent is not None else None
+
+
+def parse_traceparent(header: str) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) из заголовка W3C traceparent"""
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def otlp_json(trace: Trace) -> Dict[str, Any]:
+    """Трасса в формате OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for item in trace.spans:
+        encoded = {
+            "traceId": trace.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": item.kind,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns),
+            "attributes": [_attribute(key, value) for key, value in item.attributes.items()],
+            "status": {"code": item.status},
+        }
+        if item.parent_id:
+            encoded["parentSpanId"] = item.parent_id
+        spans.append(encoded)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+    }]}
+
+
+class RotatingWriter:
+    """Дописывает строки в файл, ротируя его по размеру (path.1 … path.N)"""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._size = 0
+
+    def write(self, line: bytes):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab")
+            self._size = self._file.tell()
+        if self._size and self._size + len(line) > self.max_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._size += len(line)
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+        self._size = 0
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Tracer:
+    """Выборка трасс и фоновая запись в файл"""
+
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, path: str = TRACE_FILE,
+                 max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+        self.sample_rate = sample_rate
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(TRACE_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    @property
+    def pending(self) -> int:
+        """Трассы в очереди на экспорт"""
+        return self._queue.qsize()
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None,
+                    attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+        """Корневой спан запроса или None, если запрос не попал в выборку"""
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            if not parent[2]:
+                return None
+            trace_id, parent_id = parent[0], parent[1]
+        elif random.random() < self.sample_rate:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        else:
+            return None
+        trace = Trace(trace_id)
+        trace.root = Span(self, trace, name, parent_id, SERVER, attributes)
+        return trace.root
+
+    def export(self, trace: Trace):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="aeon-tracing", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        writer = RotatingWriter(self.path, self.max_bytes, self.backups)
+        try:
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    self._queue.task_done()
+                    return
+                writer.write(json.dumps(otlp_json(trace), separators=(",", ":")).encode("utf-8") + b"\n")
+                self.exported += 1
+                if self._queue.empty():
+                    writer.flush()
+                self._queue.task_done()
+        finally:
+            writer.close()
+
+    def flush(self):
+        """Ждёт, пока все поставленные трассы будут записаны"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+tracer = Tracer()
@@ -0,0 +1,11 @@
+"""Бенчмарки приложения; запуск: python -m benchmarks.<имя> [параметры].
+
+Бенчмарки меряют само приложение, а не контроль допуска: поток запросов
+из одного процесса быстро исчерпал бы корзины по токену и по маршруту.
+Поэтому контроль допуска выключается здесь — пакет импортируется раньше
+любого модуля бенчмарка и раньше app; запущенные бенчмарком процессы
+получают настройку через окружение.
+"""
+import os
+
+os.environ.setdefault("ADMISSION_CONTROL", "0")
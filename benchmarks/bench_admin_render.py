@@ -0,0 +1,81 @@
+"""Бенчмарк: рендер страниц админки из кэша фрагментов.
+
+1. GET /admin и /admin/log на N сессиях: первый запрос рендерит все
+   строки (как раньше на каждом запросе), повторные склеивают готовые
+   фрагменты; после ответа в одной сессии перерисовывается одна строка.
+2. Загрузка шаблонов в новом окружении Jinja (как в свежем воркере) с
+   компиляцией и из дискового кэша байткода.
+
+Запуск: python -m benchmarks.bench_admin_render [сессий]
+"""
+import sys
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+from app.api import TEMPLATES_DIR, allocate_session, apply_answer, issue_next_question, log_rows
+from app.main import create_app
+from app.tokens import session_tokens
+
+TEMPLATES = ("admin_sessions.html", "admin_session_row.html", "admin_log.html", "admin_log_row.html",
+             "admin_session_detail.html", "admin_session_body.html", "admin_stats.html", "admin_analytics.html")
+
+
+def populate(count: int) -> list:
+    tokens = []
+    for i in range(count):
+        token = session_tokens.issue()
+        state = allocate_session(token, session_tokens.verify(token))
+        question = issue_next_question(token, state)
+        apply_answer(token, state, {"question_id": question["question_id"], "answer": f"Мой опыт номер {i}"})
+        tokens.append(token)
+    return tokens
+
+
+def timed(client: TestClient, path: str, repeat: int = 1) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        client.get(path)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def page_cost(count: int):
+    with TestClient(create_app()) as client:
+        tokens = populate(count)
+        for path in ("/admin", "/admin/log"):
+            cold = timed(client, path)
+            warm = timed(client, path, repeat=20)
+            print(f"{path:>12}: первый рендер {cold:7.1f} мс, из фрагментов {warm:7.1f} мс")
+        token = tokens[0]
+        question = issue_next_question(token, allocate_session(token, session_tokens.verify(token)))
+        client.post(f"/session/{token}/answer", json={"question_id": question["question_id"], "answer": "ещё"})
+        print(f"{'/admin':>12}: после изменения одной сессии {timed(client, '/admin'):7.1f} мс")
+        print(f"строк лога в кэше: {len(log_rows)}, размер /admin: {len(client.get('/admin').content)} байт")
+
+
+def load_templates(cache_dir):
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True,
+                      bytecode_cache=FileSystemBytecodeCache(cache_dir) if cache_dir else None)
+    started = time.perf_counter()
+    for name in TEMPLATES:
+        env.get_template(name)
+    return (time.perf_counter() - started) * 1000
+
+
+def compile_cost():
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'компиляция':>12}: {load_templates(None):7.1f} мс на {len(TEMPLATES)} шаблонов")
+        load_templates(directory)  # Заполняет кэш
+        print(f"{'из байткода':>12}: {load_templates(directory):7.1f} мс")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    page_cost(count)
+    compile_cost()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Бенчмарк агрегатных запросов по колоночному архиву.
+
+Заполняет архив N завершёнными сессиями (по умолчанию 2 000 000, по
+10 ответов на сессию, токены — подписанные, как выдаёт POST /session, в
+JSON сессии — текст итога на SUMMARY_BYTES байт), затем измеряет холодный
+полный скан отчёта, повторный отчёт без новых строк, досчёт после
+добавления пакета, поиск итога по токену, проход экспорта CSV и список
+токенов для восстановления после рестарта, и сравнивает со сканом тех же
+агрегатов по объектам SessionState в памяти.
+
+Запуск: python -m benchmarks.bench_archive_scan [число_сессий]
+"""
+import random
+import sys
+import tempfile
+import time
+
+from app.archive import ColumnarArchive
+from app.state import SessionResult, SessionState
+from app.tokens import SessionTokens
+
+QUESTIONS = [f"q_{i}" for i in range(1, 11)]
+BATCH = 50_000
+DAY = 86400
+# Размер текста итога в JSON сессии (примерно как ответы кандидата)
+SUMMARY_BYTES = 1000
+SIGNER = SessionTokens(b"bench" * 8)
+
+
+def make_state(rng: random.Random, created: float) -> SessionState:
+    state = SessionState(created)
+    state.completed = True
+    score = rng.randint(0, 100)
+    state.result = SessionResult("s", 900, 10, 100.0, 90, score, "c",
+                                 time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(created + 900)),
+                                 "g", "p", "и" * (SUMMARY_BYTES // 2))
+    return state
+
+
+def generate(archive: ColumnarArchive, count: int, rng: random.Random, start: float):
+    for offset in range(0, count, BATCH):
+        items = []
+        for row in range(offset, min(count, offset + BATCH)):
+            created = start + row * (90 * DAY / count)
+            metrics = [(qid, rng.randint(1, 300), rng.randint(0, 100)) for qid in QUESTIONS]
+            items.append((SIGNER.issue(("developer", "ru"), created), make_state(rng, created), metrics))
+        archive.append(items)
+        tokens = [items[0][0], items[-1][0]]
+    return tokens
+
+
+def timed(label: str, func):
+    started = time.perf_counter()
+    value = func()
+    print(f"{label}: {(time.perf_counter() - started) * 1000:.1f} мс")
+    return value
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        archive = ColumnarArchive(directory)
+        started = time.perf_counter()
+        tokens = generate(archive, count, rng, time.time() - 90 * DAY)
+        print(f"Запись {count} сессий ({archive.answers} ответов): {time.perf_counter() - started:.1f} с")
+
+        # Свежий экземпляр — как после рестарта, агрегатов ещё нет
+        archive = ColumnarArchive(directory)
+        report = timed("Полный скан (баллы по дням, длины ответов, вопросы)", archive.report)
+        timed("Повторный отчёт без новых строк", archive.report)
+        generate(archive, 1000, rng, time.time())
+        timed("Отчёт после добавления 1000 сессий", archive.report)
+        timed("Поиск итога по токену", lambda: archive.load(tokens[0]))
+        exported = timed("Проход экспорта CSV (iter_sessions)",
+                         lambda: sum(len(batch) for batch in archive.iter_sessions()))
+        recent = timed("Токены для восстановления (tokens_created_after)",
+                       lambda: len(archive.tokens_created_after(0)))
+        assert exported == recent == archive.sessions
+        print(f"Дней: {len(report['scores_by_day'])}, средний балл: {report['avg_score']:.2f}")
+
+        # Те же агрегаты по объектам в памяти (горячий словарь без архива)
+        sample = min(count, 50_000)
+        states = []
+        for _ in range(sample):
+            state = make_state(rng, time.time())
+            for qid in QUESTIONS:
+                state.mark_asked(qid)
+                state.set_answer(qid, "слово " * rng.randint(1, 300))
+            states.append(state)
+
+        def scan_objects():
+            days, words = {}, {}
+            for state in states:
+                day = int(state.created_ts // DAY)
+                entry = days.setdefault(day, [0, 0])
+                entry[0] += 1
+                entry[1] += state.result.performance_score
+                for qid, text in state.iter_answers():
+                    words[qid] = words.get(qid, 0) + len(text.split())
+            return days, words
+
+        started = time.perf_counter()
+        scan_objects()
+        per_row = (time.perf_counter() - started) / sample
+        print(f"Скан объектов SessionState: {per_row * count * 1000:.1f} мс "
+              f"(экстраполяция с {sample} на {count})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Бенчмарк: сжатие ответов — байты «на проводе» и цена в процессоре.
+
+Для сводки, страниц админки, CSV-выгрузок и теста /test/1 сравниваются
+ответы без сжатия и с каждой доступной кодировкой: сколько байт уходит
+клиенту и сколько процессорного времени занимает запрос целиком.
+Отдельно — чистая цена compress() на теле маршрута.
+
+Запуск: python -m benchmarks.bench_compression [сессий]
+"""
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from app.compression import ENCODINGS, compress
+from app.main import create_app
+
+ANSWER = "Например, в моем опыте работы я решал сложные задачи в команде. Конкретно, я анализировал проблему."
+REPEAT = 20
+
+
+def interview(client: TestClient) -> str:
+    token = client.post("/session").json()["token"]
+    while True:
+        response = client.post(f"/aeon/question/{token}", json={})
+        if response.status_code != 200:
+            return token
+        client.post(f"/session/{token}/answer", json={"question_id": response.json()["question_id"], "answer": ANSWER})
+
+
+def measure(client: TestClient, method: str, path: str, encoding: str):
+    """(байт на проводе, мс процессора на запрос)"""
+    headers = {"Accept-Encoding": encoding}
+    wire = 0
+    started = time.process_time()
+    for _ in range(REPEAT):
+        response = client.request(method, path, headers=headers)
+        wire = response.num_bytes_downloaded
+    return wire, (time.process_time() - started) / REPEAT * 1000
+
+
+def compress_cost(body: bytes, encoding: str) -> float:
+    started = time.process_time()
+    for _ in range(REPEAT):
+        compress(body, encoding)
+    return (time.process_time() - started) / REPEAT * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with TestClient(create_app()) as client:
+        tokens = [interview(client) for _ in range(count)]
+        routes = [("POST", f"/aeon/summary/{tokens[0]}"), ("GET", "/admin"), ("GET", "/admin/log"),
+                  ("GET", "/admin/export/sessions"), ("GET", "/admin/export/log"), ("GET", "/test/1")]
+        print(f"сессий: {count}, кодировки: {', '.join(ENCODINGS)}")
+        for method, path in routes:
+            name = path if not path.startswith("/aeon/summary/") else "/aeon/summary/{token}"
+            plain, plain_ms = measure(client, method, path, "identity")
+            body = client.request(method, path, headers={"Accept-Encoding": "identity"}).content
+            print(f"{name:>24}: identity {plain:9d} байт, {plain_ms:6.2f} мс")
+            for encoding in ENCODINGS:
+                wire, ms = measure(client, method, path, encoding)
+                print(f"{'':>24}  {encoding:<8} {wire:9d} байт (x{plain / max(wire, 1):4.1f}), {ms:6.2f} мс, "
+                      f"compress() {compress_cost(body, encoding):6.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Бенчмарк: повторы мобильных клиентов с Idempotency-Key и без него.
+
+Каждый клиент создаёт сессию и отправляет ответ, повторяя каждый запрос
+RETRIES раз (как при таймауте). Печатает, сколько токенов, записей ответов
+и записей лога осталось на сервере, и среднее время запроса.
+
+Запуск: python -m benchmarks.bench_idempotency [клиентов]
+"""
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from app.api import log, sessions
+from app.idempotency import idempotency
+from app.main import create_app
+
+RETRIES = 2
+
+
+def run(label: str, client: TestClient, count: int, with_key: bool):
+    log_before = len(log)
+    tokens = set()
+    answers = 0
+    requests = 0
+    started = time.perf_counter()
+    for i in range(count):
+        headers = {"Idempotency-Key": f"{i}-s"} if with_key else {}
+        for _ in range(1 + RETRIES):
+            token = client.post("/session", headers=headers).json()["token"]
+            tokens.add(token)
+            requests += 1
+        question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+        answer = {"question_id": question_id, "answer": f"Например, мой опыт номер {i}"}
+        headers = {"Idempotency-Key": f"{i}-a"} if with_key else {}
+        for _ in range(1 + RETRIES):
+            client.post(f"/session/{token}/answer", json=answer, headers=headers)
+            requests += 1
+        answers += sessions[token].answer_count
+    elapsed = time.perf_counter() - started
+    print(f"{label:>12}: токенов {len(tokens):6d}, записей ответов {answers:6d}, "
+          f"записей лога {len(log) - log_before:6d}, {elapsed / requests * 1e6:5.0f} мкс на запрос")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with TestClient(create_app()) as client:
+        run("без ключа", client, count, with_key=False)
+        run("с ключом", client, count, with_key=True)
+    print(f"кэш ключей: {idempotency.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
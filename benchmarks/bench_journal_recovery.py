@@ -0,0 +1,72 @@
+"""Бенчмарк времени восстановления: снапшот + хвост журнала.
+
+Генерирует журнал из N событий (по умолчанию 1 000 000) в стиле реального
+интервью, затем измеряет время recover() без снапшота и со снапшотом.
+
+Запуск: python -m benchmarks.bench_journal_recovery [число_событий]
+"""
+import sys
+import tempfile
+import time
+import uuid
+
+from app.journal import Journal
+
+QUESTIONS = [f"q_{i}" for i in range(1, 11)]
+
+
+def generate(journal: Journal, events: int):
+    written = 0
+    ref = 0
+    now = time.time()
+    while written < events:
+        token = str(uuid.uuid4())
+        journal.append("c", now, token)
+        written += 1
+        for qid in QUESTIONS:
+            if written >= events:
+                break
+            ref += 1
+            journal.append("q", now, token, qid)
+            journal.append("a", now, token, qid, ref, f"Ответ кандидата на вопрос {qid}, с примерами и деталями.")
+            written += 2
+        journal.append("x", token)
+        written += 1
+
+
+def timed_recover(directory: str):
+    sessions, log = {}, []
+    started = time.perf_counter()
+    replayed = Journal(directory).recover(sessions, log)
+    return time.perf_counter() - started, replayed, len(sessions)
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        journal = Journal(directory, snapshot_every=10**12)
+        sessions, log = {}, []
+        journal.recover(sessions, log)
+        journal.start()
+        started = time.perf_counter()
+        generate(journal, events)
+        journal.close(snapshot=False)
+        print(f"Запись {events} событий: {time.perf_counter() - started:.2f} с")
+
+        elapsed, replayed, count = timed_recover(directory)
+        print(f"Восстановление из журнала: {elapsed:.2f} с ({replayed} записей, {count} сессий)")
+
+        # Снапшот поверх восстановленного состояния
+        journal = Journal(directory, snapshot_every=10**12)
+        journal.recover(sessions, log)
+        journal.start()
+        started = time.perf_counter()
+        journal.close(snapshot=True)
+        print(f"Запись снапшота: {time.perf_counter() - started:.2f} с")
+
+        elapsed, replayed, count = timed_recover(directory)
+        print(f"Восстановление из снапшота: {elapsed:.2f} с ({replayed} записей хвоста, {count} сессий)")
+
+
+if __name__ == "__main__":
+    main()
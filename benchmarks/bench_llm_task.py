@@ -0,0 +1,108 @@
+"""Бенчмарк: пропускная способность и хвостовые задержки /aeon/task/{token}.
+
+Приложение (uvicorn app.main:app) и заглушка модели (python -m
+app.fake_llm) запускаются отдельными процессами на свободных портах —
+в одном процессе три цикла событий делили бы GIL и мерили бы его, а не
+приложение. OPENAI_BASE_URL приложения указывает на заглушку. Для
+каждого профиля задержки/ошибок модели отправляется заданное число
+запросов с ограниченной конкурентностью; печатаются запросы в секунду,
+p50/p95/p99 и доля запасных заданий (ошибки модели).
+
+Запуск: python -m benchmarks.bench_llm_task [запросов] [конкурентность]
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+PROFILES = [
+    ("fixed 50 мс", ["--latency", "fixed:50"]),
+    ("lognormal 50 мс, σ=0.8", ["--latency", "lognormal:50,0.8"]),
+    ("lognormal + 5% ошибок", ["--latency", "lognormal:50,0.8", "--error-rate", "0.05"]),
+]
+POSITION = "Бенчмарк-инженер"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn(args, port: int, env=None) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-m", *args], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"Процесс {args} не открыл порт {port}")
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    process.wait(timeout=10)
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def load(base: str, total: int, concurrency: int):
+    latencies = []
+    fallbacks = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        tokens = [(await client.post("/session")).json()["token"] for _ in range(concurrency)]
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(i)
+
+        async def worker(token: str):
+            nonlocal fallbacks
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.post(f"/aeon/task/{token}", json={"position": POSITION})
+                latencies.append(time.perf_counter() - started)
+                if POSITION in response.json()["task"]:
+                    fallbacks += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(token) for token in tokens))
+        elapsed = time.perf_counter() - started
+    return latencies, fallbacks, elapsed
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    for name, fake_args in PROFILES:
+        fake_port, app_port = free_port(), free_port()
+        # ADMISSION_CONTROL=0 из benchmarks/__init__.py наследуется приложением через окружение
+        env = dict(os.environ, OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1")
+        fake = spawn(["app.fake_llm", "--port", str(fake_port), "--seed", "1", *fake_args], fake_port)
+        application = spawn(["uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+                            app_port, env)
+        try:
+            latencies, fallbacks, elapsed = asyncio.run(load(f"http://127.0.0.1:{app_port}", total, concurrency))
+        finally:
+            stop(application)
+            stop(fake)
+        print(f"{name:>24}: {total / elapsed:7.0f} запр/с, "
+              f"p50 {percentile(latencies, 0.5) * 1000:6.1f} мс, "
+              f"p95 {percentile(latencies, 0.95) * 1000:6.1f} мс, "
+              f"p99 {percentile(latencies, 0.99) * 1000:6.1f} мс, "
+              f"запасных заданий {fallbacks / total:.1%}")
+
+
+if __name__ == "__main__":
+    main()
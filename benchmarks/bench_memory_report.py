@@ -0,0 +1,57 @@
+"""Бенчмарк: точность и стоимость отчёта /admin/memory.
+
+Наполняет воркер N сессиями с ответами (через те же функции, что и
+обработчики), замеряет прирост памяти tracemalloc и сравнивает его с
+суммой оценок по подсистемам; печатает время построения отчёта.
+
+Запуск: python -m benchmarks.bench_memory_report [число_сессий]
+"""
+import sys
+import time
+import tracemalloc
+
+from app.api import allocate_session, apply_answer, issue_next_question, log, sessions
+from app.memory import subsystem_report
+from app.tokens import session_tokens
+
+WORDS = ("опыт", "команда", "задача", "проект", "сервис", "клиент", "релиз", "метрика", "ошибка", "база",
+         "очередь", "кэш", "тест", "ревью", "план", "срок", "бюджет", "риск", "отчёт", "данные")
+
+
+def answer_text(seed: int) -> str:
+    """Разные ответы, чтобы не собирать всех в одну корзину индекса дубликатов"""
+    return "Например, " + " ".join(WORDS[(seed * 7 + k * k * 13) % len(WORDS)] + str(seed % 97 + k)
+                                    for k in range(12))
+
+
+def populate(count: int):
+    for i in range(count):
+        token = session_tokens.issue()
+        state = allocate_session(token, session_tokens.verify(token))
+        for step in range(3):
+            question = issue_next_question(token, state)
+            apply_answer(token, state, {"question_id": question["question_id"], "answer": answer_text(i * 3 + step)})
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    populate(100)  # Прогрев: банки, индексы, интернирование вопросов
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    populate(count)
+    grown = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    report = subsystem_report(sessions, log)
+    elapsed = time.perf_counter() - started
+    subsystems = report["subsystems"]
+    for name in ("sessions", "log", "answer_texts", "near_duplicates", "relevance"):
+        print(f"{name:>16}: {subsystems[name]['bytes'] / 2**20:8.1f} МиБ")
+    print(f"{'учтено':>16}: {report['accounted_heap_bytes'] / 2**20:8.1f} МиБ")
+    print(f"{'tracemalloc':>16}: {grown / 2**20:8.1f} МиБ прироста за {count} сессий")
+    print(f"{'отчёт':>16}: {elapsed * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
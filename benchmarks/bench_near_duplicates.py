@@ -0,0 +1,90 @@
+"""Бенчмарк поиска почти одинаковых ответов на 10^6 проиндексированных ответах.
+
+Индекс заполняется N ответами на 10 вопросов (по умолчанию 1 000 000):
+уникальные ответы — случайными сигнатурами (их шинглы не пересекаются),
+а доля TEMPLATE_SHARE — настоящими текстами из 100 шаблонов с правками,
+как при копировании заготовок. Затем измеряется задержка проверки нового
+ответа через LSH (уникального и скопированного) и для сравнения — полный
+перебор сигнатур того же вопроса.
+
+Запуск: python -m benchmarks.bench_near_duplicates [число_ответов]
+"""
+import random
+import resource
+import statistics
+import sys
+import time
+from array import array
+
+from app.dedup import NUM_PERM, NearDuplicateIndex, minhash, shingle_hashes, similarity
+
+QUESTIONS = [f"q_{i}" for i in range(1, 11)]
+TEMPLATE_SHARE = 0.05
+WORDS = ("проект команда задача срок клиент сервис данные ошибка релиз тест архитектура процесс "
+         "решение опыт результат метрика пользователь требование риск план").split()
+
+
+def random_text(rng: random.Random, length: int = 40) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def edited(rng: random.Random, text: str) -> str:
+    words = text.split()
+    words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def random_signature(rng: random.Random) -> array:
+    return array("I", [rng.getrandbits(32) for _ in range(NUM_PERM)])
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99) - 1] * 1e6)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(7)
+    templates = [random_text(rng) for _ in range(100)]
+    index = NearDuplicateIndex()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    for n in range(count):
+        question = QUESTIONS[n % len(QUESTIONS)]
+        if rng.random() < TEMPLATE_SHARE:
+            index.add(f"s{n}", question, edited(rng, rng.choice(templates)))
+        else:
+            index.add_signature(f"s{n}", question, random_signature(rng))
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"Индексация {count} ответов: {elapsed:.1f} с, помечено копий: {index.flagged}, "
+          f"прирост RSS ~{(rss_after - rss_before) / 1024:.0f} МБ")
+
+    # Проверка нового ответа: полный путь add() с шинглами и MinHash
+    novel, copies = [], []
+    for n in range(1000):
+        text = random_text(rng)
+        t0 = time.perf_counter()
+        index.add(f"new{n}", QUESTIONS[0], text)
+        novel.append(time.perf_counter() - t0)
+        text = edited(rng, rng.choice(templates))
+        t0 = time.perf_counter()
+        index.add(f"copy{n}", QUESTIONS[0], text)
+        copies.append(time.perf_counter() - t0)
+    print("LSH, уникальный ответ: p50 %.0f мкс, p99 %.0f мкс" % percentiles(novel))
+    print("LSH, копия шаблона:   p50 %.0f мкс, p99 %.0f мкс" % percentiles(copies))
+
+    # Полный перебор сигнатур того же вопроса (то, что заменяет индекс)
+    signature = minhash(shingle_hashes(random_text(rng)))
+    signatures, questions = index._signatures, index._questions
+    t0 = time.perf_counter()
+    for entry in range(0, len(index), len(QUESTIONS)):
+        if questions[entry] == questions[0]:
+            similarity(signature, signatures[entry * NUM_PERM:(entry + 1) * NUM_PERM])
+    print(f"Полный перебор по вопросу: {(time.perf_counter() - t0) * 1000:.0f} мс на ответ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Бенчмарк TF-IDF оценки релевантности.
+
+Накапливает N ответов (по умолчанию 100 000) на вопросы банка из
+data/questions.json, измеряет полный и инкрементальный пересчёт модели
+и задержку оценки одного ответа разной длины.
+
+Запуск: python -m benchmarks.bench_relevance [число_ответов]
+"""
+import random
+import statistics
+import sys
+import time
+
+from app.questions import question_banks
+from app.relevance import RelevanceScorer
+
+VOCABULARY = ("опыт проект команда задача срок клиент сервис данные ошибка релиз тест архитектура "
+              "процесс решение результат метрика пользователь требование риск план стресс давление "
+              "мотивация навыки достижения конфликт компромисс обучение развитие цель").split()
+
+
+def answer(rng: random.Random, words: int) -> str:
+    # Уникальные слова расширяют словарь, как опечатки и имена собственные
+    return " ".join(rng.choice(VOCABULARY) if rng.random() < 0.8 else f"z{rng.randrange(10000)}"
+                    for _ in range(words))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(1)
+    bank = question_banks.current()
+    question_ids = [question["id"] for question in bank.questions]
+    scorer = RelevanceScorer(lambda: bank)
+
+    texts = [answer(rng, rng.randint(20, 120)) for _ in range(count)]
+    started = time.perf_counter()
+    for n, text in enumerate(texts):
+        scorer.observe(question_ids[n % len(question_ids)], text)
+    print(f"Накопление {count} ответов: {(time.perf_counter() - started) / count * 1e6:.1f} мкс на ответ")
+
+    started = time.perf_counter()
+    scorer.rebuild()
+    print(f"Полный пересчёт модели: {(time.perf_counter() - started) * 1000:.1f} мс")
+    for n in range(1000):
+        scorer.observe(question_ids[n % len(question_ids)], answer(rng, 60))
+    started = time.perf_counter()
+    scorer.rebuild()
+    print(f"Пересчёт после 1000 новых ответов: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    for words in (20, 60, 300):
+        texts = [answer(rng, words) for _ in range(2000)]
+        samples = []
+        for text in texts:
+            t0 = time.perf_counter()
+            scorer.score(question_ids[0], text)
+            samples.append(time.perf_counter() - t0)
+        samples.sort()
+        print(f"Оценка ответа из {words} слов: p50 {statistics.median(samples) * 1e6:.0f} мкс, "
+              f"p99 {samples[int(len(samples) * 0.99)] * 1e6:.0f} мкс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Бенчмарк: задержка цикла событий при сводках по длинным ответам.
+
+В одном цикле идут смешанные запросы через ASGI-транспорт httpx:
+сводки и глифы по сессиям с длинными ответами (каждая сессия — один раз,
+чтобы не попадать в мемо) и поток дешёвых GET /session/{token}. Отдельная
+корутина меряет отставание цикла: насколько позже заказанного просыпается
+asyncio.sleep(0.001). Режимы: оценка прямо в цикле (как раньше), в пуле
+потоков и в пуле процессов.
+
+Запуск: python -m benchmarks.bench_scoring_offload [сессий] [символов_в_ответе]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from app.api import allocate_session, apply_answer, issue_next_question
+from app.main import create_app
+from app.scoring import scoring
+from app.tokens import session_tokens
+
+WORDS = ("опыт", "команда", "задача", "проект", "сервис", "клиент", "релиз", "метрика", "ошибка", "база",
+         "очередь", "кэш", "тест", "ревью", "план", "например", "именно", "python", "данные", "риск")
+
+
+def long_answer(seed: int, chars: int) -> str:
+    words = []
+    length = 0
+    i = seed
+    while length < chars:
+        word = WORDS[(i * 7 + i // 3) % len(WORDS)] + ("." if i % 11 == 0 else "")
+        words.append(word)
+        length += len(word) + 1
+        i += 1
+    return " ".join(words)
+
+
+def populate(count: int, chars: int) -> list:
+    tokens = []
+    for i in range(count):
+        token = session_tokens.issue()
+        state = allocate_session(token, session_tokens.verify(token))
+        while (question := issue_next_question(token, state)) is not None:
+            apply_answer(token, state, {"question_id": question["question_id"], "answer": long_answer(i, chars)})
+        tokens.append(token)
+    return tokens
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def mixed_traffic(app, tokens: list, heavy_workers: int = 4):
+    lags, cheap = [], []
+    done = asyncio.Event()
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            started = loop.time()
+            await asyncio.sleep(0.001)
+            lags.append(loop.time() - started - 0.001)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def cheap_traffic():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get(f"/session/{tokens[0]}")
+                cheap.append(time.perf_counter() - started)
+                await asyncio.sleep(0.002)
+
+        queue = list(tokens)
+
+        async def heavy():
+            while queue:
+                token = queue.pop()
+                await client.post(f"/aeon/summary/{token}")
+                await client.post(f"/aeon/glyph/{token}", json={})
+
+        background = [asyncio.create_task(probe()), asyncio.create_task(cheap_traffic())]
+        started = time.perf_counter()
+        await asyncio.gather(*(heavy() for _ in range(heavy_workers)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*background)
+    return elapsed, lags, cheap
+
+
+def run(label: str, app, tokens: list):
+    elapsed, lags, cheap = asyncio.run(mixed_traffic(app, tokens))
+    print(f"{label:>10}: {elapsed:6.2f} с на {2 * len(tokens)} сводок/глифов; отставание цикла "
+          f"p50 {percentile(lags, 0.5) * 1000:6.1f} мс, p99 {percentile(lags, 0.99) * 1000:6.1f} мс, "
+          f"макс {max(lags) * 1000:6.1f} мс; GET /session p99 {percentile(cheap, 0.99) * 1000:6.1f} мс")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    chars = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    app = create_app()
+    print(f"{count} сессий, ответы по {chars} символов")
+
+    scoring.inline_chars = sys.maxsize
+    run("в цикле", app, populate(count, chars))
+
+    scoring.inline_chars = 4000
+    scoring.workers["process"] = 0
+    run("потоки", app, populate(count, chars))
+
+    scoring.workers["process"] = max(1, (os.cpu_count() or 1) - 1)
+    scoring.process_chars = 0
+    asyncio.run(scoring.score([("q_1", "прогрев пула процессов " * 200, [])]))
+    run("процессы", app, populate(count, chars))
+    print(scoring.snapshot()["pools"])
+    scoring.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Бенчмарк памяти: байт на сессию до и после компактного SessionState.
+
+Запуск: python -m benchmarks.bench_session_memory [число_сессий]
+"""
+import sys
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from app.questions import question_banks
+from app.state import SessionState
+
+AEON_QUESTIONS = question_banks.current().questions
+
+
+@dataclass
+class LegacySessionState:
+    """Прежнее представление (dataclass), сохранено для сравнения"""
+    answers: List[Dict] = field(default_factory=list)
+    aeon_answers: Dict[str, str] = field(default_factory=dict)
+    asked_questions: set = field(default_factory=set)
+    current_question_index: int = 0
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    completed: bool = False
+    question_order: List[str] = field(default_factory=list)
+    last_activity: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+def fill_legacy(state: LegacySessionState, answered: int):
+    for q in AEON_QUESTIONS[:answered]:
+        qid = q["id"]
+        state.asked_questions.add(qid)
+        state.question_order.append(qid)
+        payload = {"question_id": qid, "answer": f"Ответ {uuid.uuid4().hex}"}
+        state.answers.append(payload)
+        state.aeon_answers[qid] = payload["answer"]
+        state.last_activity = datetime.now(timezone.utc)
+
+
+def fill_compact(state: SessionState, answered: int):
+    for q in AEON_QUESTIONS[:answered]:
+        qid = q["id"]
+        state.mark_asked(qid)
+        state.set_answer(qid, f"Ответ {uuid.uuid4().hex}")
+        state.touch()
+
+
+def measure(factory, fill, count: int, answered: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = {}
+    for _ in range(count):
+        state = factory()
+        fill(state, answered)
+        store[str(uuid.uuid4())] = state
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"Сессий: {count}")
+    print(f"{'ответов':>8} {'до, Б':>10} {'после, Б':>10} {'экономия':>9}")
+    for answered in (0, 3, len(AEON_QUESTIONS)):
+        legacy = measure(LegacySessionState, fill_legacy, count, answered)
+        compact = measure(SessionState, fill_compact, count, answered)
+        print(f"{answered:>8} {legacy:>10.0f} {compact:>10.0f} {1 - compact / legacy:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
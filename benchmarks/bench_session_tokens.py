@@ -0,0 +1,73 @@
+"""Бенчмарк: брошенные сессии и проверка токенов.
+
+1. Память на N вызовов POST /session, после которых клиент не пишет
+   ничего (боты): прежняя схема создавала SessionState и запись журнала
+   на каждый вызов, теперь выдаётся только подписанный токен.
+2. Стоимость отклонения поддельного и истёкшего токена (только HMAC)
+   против поиска в словаре на N живых сессий.
+
+Запуск: python -m benchmarks.bench_session_tokens [число_сессий]
+"""
+import sys
+import time
+import timeit
+import tracemalloc
+import uuid
+
+import app.api as api
+from app.api import open_session, resolve_session, sessions
+from app.questions import question_banks
+from app.state import SessionState
+from app.tokens import session_tokens
+from fastapi import HTTPException
+
+
+def measure_memory(label: str, create, count: int):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(count):
+        create()  # Токен уходит клиенту, сервер ничего из ответа не хранит
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    print(f"{label:>28}: {allocated / count:7.0f} байт на брошенную сессию")
+
+
+def eager_session() -> str:
+    """Прежний POST /session: uuid и SessionState в словаре сразу"""
+    bank = question_banks.current()
+    token = str(uuid.uuid4())
+    sessions[token] = SessionState(bank_version=bank.version)
+    return token
+
+
+def rejection_cost(label: str, token: str, number: int = 200_000):
+    def call():
+        try:
+            resolve_session(token)
+        except HTTPException:
+            pass
+    seconds = timeit.timeit(call, number=number) / number
+    print(f"{label:>28}: {seconds * 1e6:6.2f} мкс")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    # Лог действий общий для обеих схем — на время замера не копим его
+    api.log_event = lambda action, details=None: None
+
+    measure_memory("uuid + SessionState", eager_session, count)
+    eager = dict(sessions)
+    sessions.clear()
+    measure_memory("подписанный токен", lambda: open_session()["token"], count)
+
+    sessions.update(eager)
+    print(f"живых сессий в словаре: {len(sessions)}")
+    rejection_cost("неизвестный uuid (словарь)", str(uuid.uuid4()))
+    rejection_cost("поддельная подпись", session_tokens.issue()[:-2] + "xx")
+    rejection_cost("истёкший токен", session_tokens.issue(created_ts=time.time() - 7200))
+    rejection_cost("действующий, без состояния", session_tokens.issue(), number=50_000)
+
+
+if __name__ == "__main__":
+    main()
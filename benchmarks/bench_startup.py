@@ -0,0 +1,92 @@
+"""Бенчмарк холодного старта.
+
+1. Время импорта по модулям (python -X importtime) для фабрики приложения:
+   собственные модули app.* и тяжёлые зависимости, которые должны грузиться
+   лениво (httpx, jinja2, csv).
+2. Время до первого ответа: запуск gunicorn-воркера (или uvicorn, если
+   gunicorn не установлен) и опрос /test/1 до первого 200.
+
+Запуск: python -m benchmarks.bench_startup [число_запусков]
+"""
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WATCHED = re.compile(r"^(app(\..+)?|fastapi|pydantic|starlette|httpx|jinja2|fastapi\.templating|csv)$")
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+# Холодный старт меряется с контролем допуска, как в продакшене (пакет benchmarks его выключает)
+SERVER_ENV = dict(os.environ, ADMISSION_CONTROL="1")
+
+
+def import_times():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main; app.main.create_app()"],
+        cwd=ROOT, env=SERVER_ENV, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match and WATCHED.match(match.group(4)):
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(port: int):
+    if shutil.which("gunicorn"):
+        return ["gunicorn", "app.main:create_app()", "--bind", f"127.0.0.1:{port}",
+                "--worker-class", "uvicorn.workers.UvicornWorker", "--workers", "1"], "gunicorn"
+    return [sys.executable, "-m", "uvicorn", "app.main:create_app", "--factory", "--port", str(port)], "uvicorn"
+
+
+def time_to_first_response(timeout: float = 30.0):
+    port = free_port()
+    command, name = server_command(port)
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=SERVER_ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/test/1", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started, name
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("Сервер не ответил за отведённое время")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    rows = import_times()
+    print("Время импорта (мс): собственное / накопленное")
+    for module, self_us, cumulative_us in rows:
+        print(f"  {module:<28} {self_us / 1000:>7.1f} {cumulative_us / 1000:>9.1f}")
+    lazy = {"httpx", "jinja2", "fastapi.templating"}
+    loaded = lazy & {module for module, _, _ in rows}
+    print(f"Лениво загружаемые модули при старте: {', '.join(sorted(loaded)) or 'не загружены'}")
+
+    samples = []
+    for _ in range(runs):
+        elapsed, name = time_to_first_response()
+        samples.append(elapsed)
+    print(f"Время до первого ответа ({name}, {runs} запусков): "
+          f"медиана {statistics.median(samples) * 1000:.0f} мс, min {min(samples) * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
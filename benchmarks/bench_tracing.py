@@ -0,0 +1,74 @@
+"""Бенчмарк: накладные расходы трассировки.
+
+1. span() вне трассы (выключено / запрос не в выборке) и внутри трассы.
+2. Запросы GET /session/{token} и POST ответа через приложение без
+   трассировки, с выборкой 1% и 100% (спаны пишутся во временный файл).
+
+Запуск: python -m benchmarks.bench_tracing [запросов]
+"""
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.main import create_app
+from app.tracing import NOOP_SPAN, Tracer, span
+
+
+def span_cost():
+    number = 1_000_000
+
+    def baseline():
+        with NOOP_SPAN:
+            pass
+
+    def bare():
+        with span("bench"):
+            pass
+    seconds = timeit.timeit(baseline, number=number) / number
+    print(f"{'with без span() (база)':>28}: {seconds * 1e9:7.0f} нс")
+    seconds = timeit.timeit(bare, number=number) / number
+    print(f"{'span() вне трассы':>28}: {seconds * 1e9:7.0f} нс")
+
+    root = Tracer(sample_rate=1.0, path=os.devnull).start_trace("bench")
+    with root:
+        number = 200_000
+        seconds = timeit.timeit(bare, number=number) / number
+        root.trace.spans.clear()
+    print(f"{'span() в трассе':>28}: {seconds * 1e9:7.0f} нс")
+
+
+def request_cost(label: str, sample_rate: float, count: int, directory: str):
+    tracing.tracer.sample_rate = sample_rate
+    tracing.tracer.path = os.path.join(directory, f"traces-{sample_rate}.jsonl")
+    # lifespan запускает фоновый пересчёт релевантности, как в работе
+    with TestClient(create_app()) as client:
+        token = client.post("/session").json()["token"]
+        question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+        answer = {"question_id": question_id, "answer": "Например, я работал с Python и FastAPI в команде"}
+        started = time.perf_counter()
+        for _ in range(count):
+            client.get(f"/session/{token}")
+            client.post(f"/session/{token}/answer", json=answer)
+        elapsed = time.perf_counter() - started
+        tracing.tracer.flush()
+    print(f"{label:>28}: {elapsed / (2 * count) * 1e6:7.0f} мкс на запрос, экспортировано трасс: "
+          f"{tracing.tracer.exported}")
+    tracing.tracer.exported = 0
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    span_cost()
+    with tempfile.TemporaryDirectory() as directory:
+        request_cost("без трассировки", 0, count, directory)
+        request_cost("выборка 1%", 0.01, count, directory)
+        request_cost("выборка 100%", 1.0, count, directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Бенчмарк: полное интервью через REST и через WebSocket-канал.
+
+REST-поток на каждый вопрос делает запрос вопроса, ответа и состояния,
+в конце — глиф и сводку. WebSocket-поток выполняет те же шаги сообщениями
+в одном соединении. Измеряется в процессе (TestClient), поэтому показывает
+накладные расходы приложения на шаг, без сети.
+
+Запуск: python -m benchmarks.bench_ws_vs_rest [число_интервью]
+"""
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+ANSWER = "Например, в моем опыте работы я решал сложные задачи в команде. Конкретно, я анализировал проблему."
+
+
+def rest_interview(client: TestClient) -> int:
+    token = client.post("/session").json()["token"]
+    steps = 1
+    while True:
+        response = client.post(f"/aeon/question/{token}", json={})
+        steps += 1
+        if response.status_code != 200:
+            break
+        question_id = response.json()["question_id"]
+        client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": ANSWER})
+        client.get(f"/session/{token}")
+        steps += 2
+    client.post(f"/aeon/glyph/{token}", json={})
+    client.post(f"/aeon/summary/{token}")
+    return steps + 2
+
+
+def ws_interview(client: TestClient) -> int:
+    token = client.post("/session").json()["token"]
+    steps = 1
+    with client.websocket_connect(f"/ws/session/{token}") as ws:
+        while True:
+            ws.send_json({"type": "next"})
+            message = ws.receive_json()
+            steps += 1
+            if message["type"] != "question":
+                break
+            ws.send_json({"type": "answer", "question_id": message["data"]["question_id"], "answer": ANSWER})
+            ws.receive_json()  # saved
+            ws.receive_json()  # score — заменяет отдельный запрос состояния
+            steps += 2
+        ws.send_json({"type": "glyph"})
+        ws.receive_json()
+        ws.send_json({"type": "summary"})
+        ws.receive_json()
+    return steps + 2
+
+
+def run(name: str, interview, client: TestClient, count: int):
+    started = time.perf_counter()
+    steps = sum(interview(client) for _ in range(count))
+    elapsed = time.perf_counter() - started
+    print(f"{name:>10}: {count} интервью, {steps} шагов за {elapsed:.2f} с — {steps / elapsed:.0f} шагов/с")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    client = TestClient(app)
+    run("REST", rest_interview, client, count)
+    run("WebSocket", ws_interview, client, count)
+
+
+if __name__ == "__main__":
+    main()
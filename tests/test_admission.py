@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, Budget, TokenBucket, session_token
+from app.middleware import AdmissionControlMiddleware
+
+
+def _app(controller):
+    app = FastAPI()
+
+    @app.post("/session")
+    def create():
+        return {"token": "..."}
+
+    @app.get("/session/{token}")
+    def status(token: str):
+        return {"token": token}
+
+    @app.post("/aeon/task/{token}")
+    async def task(token: str):
+        await asyncio.sleep(0.2)
+        return {"task": "..."}
+
+    app.add_middleware(AdmissionControlMiddleware, controller=controller)
+    return app
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate=2, capacity=2, now=0.0)
+    assert bucket.take(0.0) == 0 and bucket.take(0.0) == 0
+    assert bucket.take(0.0) == 0.5
+    assert bucket.take(0.5) == 0
+
+
+def test_session_token_extraction():
+    assert session_token("/session/0b5c8e0e-aaaa/answer") == "0b5c8e0e-aaaa"
+    assert session_token("/aeon/summary/0b5c8e0e-aaaa") == "0b5c8e0e-aaaa"
+    assert session_token("/sessions/status") is None
+
+
+def test_rate_limit_per_token_and_ip():
+    controller = AdmissionController({
+        "cheap": Budget(ip_rate=0.01, ip_burst=4, token_rate=0.01, token_burst=2, max_inflight=10, max_queue_delay=1),
+        "expensive": Budget(ip_rate=1, ip_burst=1, token_rate=1, token_burst=1, max_inflight=1, max_queue_delay=0),
+    }, per_ip=True)
+    client = TestClient(_app(controller))
+    assert client.get("/session/token-aaaa").status_code == 200
+    assert client.get("/session/token-aaaa").status_code == 200
+    response = client.get("/session/token-aaaa")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/session/token-bbbb").status_code == 200
+    assert client.get("/session/token-cccc").status_code == 429
+    counters = controller.snapshot()["counters"]["cheap"]
+    assert counters["shed_token"] == 1 and counters["shed_ip"] == 1
+
+
+def test_ip_buckets_off_without_trusted_proxy():
+    """Без доверенного прокси все клиенты за балансировщиком — один адрес; лимит по IP не применяется"""
+    controller = AdmissionController({
+        "cheap": Budget(ip_rate=0.01, ip_burst=1, token_rate=100, token_burst=100, max_inflight=10, max_queue_delay=1),
+        "expensive": Budget(ip_rate=1, ip_burst=1, token_rate=1, token_burst=1, max_inflight=1, max_queue_delay=0),
+    }, trust_forwarded=False, per_ip=False)
+    client = TestClient(_app(controller))
+    assert all(client.get(f"/session/token-{i:04d}").status_code == 200 for i in range(5))
+    assert controller.snapshot()["per_ip"] is False
+
+
+def test_tokenless_route_limited_without_ip_buckets():
+    """POST /session без токена и без корзин по IP упирается в корзину маршрута"""
+    controller = AdmissionController({
+        "cheap": Budget(ip_rate=100, ip_burst=100, token_rate=100, token_burst=100, max_inflight=10,
+                        max_queue_delay=1, route_rate=0.01, route_burst=3),
+        "expensive": Budget(ip_rate=1, ip_burst=1, token_rate=1, token_burst=1, max_inflight=1, max_queue_delay=0),
+    }, per_ip=False)
+    client = TestClient(_app(controller))
+    codes = [client.post("/session").status_code for _ in range(5)]
+    assert codes == [200, 200, 200, 429, 429]
+    # Запросы с токеном корзину маршрута не расходуют
+    assert client.get("/session/token-aaaa").status_code == 200
+    assert controller.snapshot()["counters"]["cheap"]["shed_route"] == 2
+
+
+def test_forwarded_address_taken_from_proxy_hop():
+    controller = AdmissionController(trust_forwarded=True, per_ip=True)
+    scope = {"client": ("10.0.0.1", 1234), "headers": [(b"x-forwarded-for", b"6.6.6.6, 203.0.113.7")]}
+    assert controller.client_ip(scope) == "203.0.113.7"
+    assert AdmissionController(trust_forwarded=False).client_ip(scope) == "10.0.0.1"
+
+
+def test_overload_is_shed_with_503():
+    controller = AdmissionController({
+        "cheap": Budget(ip_rate=100, ip_burst=100, token_rate=100, token_burst=100, max_inflight=10, max_queue_delay=1),
+        "expensive": Budget(ip_rate=100, ip_burst=100, token_rate=100, token_burst=100, max_inflight=1, max_queue_delay=0.05),
+    })
+    app = _app(controller)
+
+    async def scenario():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post(f"/aeon/task/token-{i:04d}") for i in range(3)))
+
+    codes = sorted(r.status_code for r in asyncio.run(scenario()))
+    assert codes == [200, 503, 503]
+    assert controller.counters["expensive"]["shed_overload"] == 2
+    assert controller.inflight["expensive"] == 0
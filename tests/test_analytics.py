@@ -0,0 +1,72 @@
+from fastapi.testclient import TestClient
+
+from app.analytics import CohortAnalytics, score_bucket
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_score_bucket_bounds():
+    assert score_bucket(0) == 0
+    assert score_bucket(19) == 1
+    assert score_bucket(100) == 9
+    assert score_bucket(-5) == 0
+
+
+def test_answers_replacement_and_funnel():
+    cohort = CohortAnalytics()
+    # Две сессии получили первый вопрос, одна — второй
+    cohort.record_question(1)
+    cohort.record_question(1)
+    cohort.record_question(2)
+    cohort.record_answer("q_1", 40, 10, 1, seconds=30)
+    cohort.record_answer("q_1", 80, 30, 1, seconds=10)
+    # Повторный ответ заменяет прежний, а не добавляет новый
+    cohort.record_answer("q_1", 60, 20, 1, previous=(40, 10))
+    cohort.record_completion(70)
+
+    report = cohort.report()
+    question = report["questions"][0]
+    assert question["answers"] == 2
+    assert question["avg_quality"] == 70
+    assert question["avg_words"] == 25
+    assert question["avg_seconds"] == 20
+    assert sum(count for _, count in report["answer_histogram"]) == 2
+    assert report["completed"] == 1 and report["avg_score"] == 70
+    assert report["score_histogram"][7] == ("70–79", 1)
+    assert report["funnel"] == [
+        {"question": 1, "asked": 2, "answered": 2, "stopped": 1},
+        {"question": 2, "asked": 1, "answered": 0, "stopped": 1},
+    ]
+
+
+def test_admin_analytics_pages():
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Ответ для аналитики"})
+
+    data = client.get("/admin/analytics.json").json()
+    assert any(q["question_id"] == question_id for q in data["questions"])
+    assert data["funnel"][0]["asked"] >= 1
+
+    response = client.get("/admin/analytics")
+    assert response.status_code == 200
+    assert "Воронка прохождения" in response.text
+
+
+def test_edit_subtracts_recorded_quality(monkeypatch):
+    """При замене ответа вычитается учтённое качество, а не пересчитанное заново"""
+    import app.api as api
+    scores = iter([40.0, 90.0, 70.0])
+    monkeypatch.setattr(api, "answer_quality", lambda *args: {"score": next(scores), "word_count": 3})
+    monkeypatch.setattr(api, "analytics", CohortAnalytics())
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Первый ответ"})
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Второй ответ"})
+    stats = api.analytics.questions[question_id]
+    # Прежний текст не пересчитывался (иначе был бы израсходован балл 90)
+    assert stats.answers == 1
+    assert stats.quality_sum == 90.0
+    assert stats.words_sum == 3
+    assert sum(api.analytics.answer_histogram) == 1
@@ -289,7 +289,8 @@ def test_token_expiry_and_reuse():
     response = client.post("/session")
     token = response.json()["token"]
 
-    # Принудительно истекает срок действия
+    # Состояние создаётся первой записью; затем принудительно истекает срок действия
+    client.post(f"/aeon/question/{token}", json={})
     from app.api import sessions
     sessions[token].created_at -= timedelta(hours=2)
 
@@ -357,4 +358,168 @@ def test_multiple_sessions_isolation():
     assert response1.json()["questions_answered"] == 1
     assert response2.json()["questions_answered"] == 0
     assert response1.json()["asked_questions"] == 1
-    assert response2.json()["asked_questions"] == 1  # Вопрос был задан, но не отвечен
\ No newline at end of file
+    assert response2.json()["asked_questions"] == 1  # Вопрос был задан, но не отвечен
+
+
+def test_etag_and_not_modified():
+    """ETag по ревизии сессии и 304 при повторном опросе"""
+    token = client.post("/session").json()["token"]
+
+    for method, url in (("get", f"/session/{token}"), ("post", f"/aeon/glyph/{token}"), ("post", f"/aeon/summary/{token}")):
+        kwargs = {"json": {}} if url.startswith("/aeon/glyph") else {}
+        first = getattr(client, method)(url, **kwargs)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        repeat = getattr(client, method)(url, headers={"If-None-Match": etag}, **kwargs)
+        assert repeat.status_code == 304
+        assert repeat.headers["ETag"] == etag
+
+    etag = client.get(f"/session/{token}").headers["ETag"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Новый ответ"})
+    response = client.get(f"/session/{token}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["questions_answered"] == 1
+
+
+def test_etag_does_not_survive_restart(monkeypatch):
+    """Ревизия после рестарта начинается заново — старый ETag не должен дать 304"""
+    token = client.post("/session").json()["token"]
+    etag = client.get(f"/session/{token}").headers["ETag"]
+    monkeypatch.setattr("app.api.ETAG_EPOCH", "restarted")
+    response = client.get(f"/session/{token}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_batch_answers_atomic():
+    """Пакетные ответы применяются атомарно, ошибки — по элементам"""
+    token = client.post("/session").json()["token"]
+    q1 = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    q2 = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+
+    response = client.post(f"/session/{token}/answers", json={"answers": [
+        {"question_id": q1, "answer": "Первый"},
+        {"question_id": "q_999", "answer": "Незаданный"},
+    ]})
+    assert response.status_code == 400
+    assert response.json()["errors"] == [{"index": 1, "status": 400, "detail": "Вопрос не был задан"}]
+    assert client.get(f"/session/{token}").json()["questions_answered"] == 0
+
+    response = client.post(f"/session/{token}/answers", json={"answers": [
+        {"question_id": q1, "answer": "Первый"},
+        {"question_id": q2, "answer": "Второй"},
+    ]})
+    assert response.status_code == 200
+    assert response.json()["saved"] == 2
+    assert client.get(f"/session/{token}").json()["questions_answered"] == 2
+
+
+def test_batch_status():
+    """Состояние нескольких сессий за один запрос"""
+    token = client.post("/session").json()["token"]
+    response = client.post("/sessions/status", json={"tokens": [token, "нет-такого"]})
+    assert response.status_code == 200
+    items = response.json()["sessions"]
+    assert items[0]["status"] == 200
+    assert items[0]["session"] == client.get(f"/session/{token}").json()
+    assert items[1] == {"token": "нет-такого", "status": 404, "detail": "Сессия не найдена"}
+
+
+def test_websocket_interview():
+    """Интервью через WebSocket: вопрос, ответ, обновление балла"""
+    token = client.post("/session").json()["token"]
+    with client.websocket_connect(f"/ws/session/{token}") as ws:
+        ws.send_json({"type": "next"})
+        message = ws.receive_json()
+        assert message["type"] == "question"
+        question = message["data"]
+        assert question["question_number"] == 1
+
+        ws.send_json({"type": "answer", "question_id": "q_999", "answer": "Незаданный"})
+        assert ws.receive_json()["status"] == 400
+
+        ws.send_json({"type": "answer", "question_id": question["question_id"], "answer": "Например, я работал в команде над проектом."})
+        assert ws.receive_json() == {"type": "saved", "question_id": question["question_id"]}
+        score = ws.receive_json()
+        assert score["type"] == "score"
+        assert score["questions_answered"] == 1
+        assert score["current_performance"] > 0
+
+        ws.send_json({"type": "glyph"})
+        assert "profile" in ws.receive_json()["data"]
+
+    assert client.get(f"/session/{token}").json()["questions_answered"] == 1
+
+
+def test_websocket_answer_scored_off_event_loop(monkeypatch):
+    """Сохранение и оценка ответа из WebSocket выполняются не в цикле событий"""
+    import asyncio
+    import app.api as api
+    on_loop = []
+    original = api.session_status_data
+
+    def status_data(token, session_state):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return original(token, session_state)
+
+    monkeypatch.setattr(api, "session_status_data", status_data)
+    token = client.post("/session").json()["token"]
+    with client.websocket_connect(f"/ws/session/{token}") as ws:
+        ws.send_json({"type": "next"})
+        question_id = ws.receive_json()["data"]["question_id"]
+        ws.send_json({"type": "answer", "question_id": question_id, "answer": "Например, я работал в команде."})
+        ws.receive_json()
+        assert ws.receive_json()["questions_answered"] == 1
+        ws.send_json({"type": "status"})
+        assert ws.receive_json()["type"] == "status"
+    assert on_loop == [False, False]
+
+
+def test_websocket_reads_session_allocated_over_http():
+    """Статус по WebSocket видит сессию, созданную HTTP-запросом после подключения"""
+    token = client.post("/session").json()["token"]
+    with client.websocket_connect(f"/ws/session/{token}") as ws:
+        question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+        client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Ответ по HTTP"})
+        ws.send_json({"type": "status"})
+        assert ws.receive_json()["data"]["questions_answered"] == 1
+
+
+def test_websocket_unknown_session():
+    with client.websocket_connect("/ws/session/нет-такого") as ws:
+        assert ws.receive_json()["status"] == 404
+
+
+def test_result_frozen_at_completion():
+    """Итог фиксируется при завершении и не меняется между запросами"""
+    from app.api import sessions, calculate_performance_score
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Например, я работал в команде над сложным проектом."})
+
+    live = client.get(f"/result/{token}").json()
+    assert live["completed_at"] is None
+
+    client.post(f"/session/{token}/complete")
+    first = client.get(f"/result/{token}").json()
+    second = client.get(f"/result/{token}").json()
+    assert first == second
+    assert first["completed_at"]
+    assert first["performance_score"] == calculate_performance_score(sessions[token])
+    assert "Итоговый балл:" in first["summary"]
+    assert first["glyph"]
+
+    # Повторное завершение не пересчитывает итог
+    client.post(f"/session/{token}/complete")
+    assert client.get(f"/result/{token}").json() == first
+
+    # Завершение не пишет в лог запросы глифа и сводки, которых клиент не делал
+    from app.api import log
+    assert not [entry for entry in log if entry["action"] in ("generate_glyph", "aeon_summary")
+                and entry["details"].get("token") == token]
@@ -0,0 +1,170 @@
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.api as api
+from app.archive import ColumnarArchive
+from app.main import app
+from app.state import SessionResult, SessionState
+
+client = TestClient(app)
+
+
+def _completed_state(score: int, ended: str) -> SessionState:
+    state = SessionState(1000.0)
+    state.mark_asked("q_1")
+    state.set_answer("q_1", "Ответ для архива")
+    state.complete()
+    state.result = SessionResult("s", 60, 1, 10.0, 60, score, "c", ended, "g", "p", "summary")
+    return state
+
+
+def test_append_scan_and_lookup(tmp_path):
+    archive = ColumnarArchive(str(tmp_path))
+    first, second = str(uuid.uuid4()), "не-uuid-токен"
+    expired = SessionState(1000.0)
+    archive.append([
+        (first, _completed_state(80, "2026-01-01T10:00:00+00:00"), [("q_1", 3, 40)]),
+        (second, _completed_state(60, "2026-01-02T10:00:00+00:00"), [("q_1", 30, 80), ("q_2", 5, 0)]),
+        (str(uuid.uuid4()), expired, []),
+    ])
+    assert archive.sessions == 3 and archive.answers == 3
+
+    report = archive.report()
+    assert (report["completed"], report["expired"]) == (2, 1)
+    assert report["avg_score"] == 70
+    assert [day["day"] for day in report["scores_by_day"]] == ["2026-01-01", "2026-01-02"]
+    assert report["questions"][0] == {"question_id": "q_1", "answers": 2, "avg_words": 16.5, "avg_quality": 60}
+    assert report["length_histogram"][0] == ("0–9", 2)
+
+    assert SessionResult.from_session_record(archive.load(first)).performance_score == 80
+    assert archive.load(second)[0] == 1000.0
+    assert archive.load(str(uuid.uuid4())) is None
+    rows = [row for batch in archive.iter_sessions() for row in batch]
+    assert [row[0] for row in rows[:2]] == [first, second]
+
+    # Повторный отчёт досчитывает только новые строки
+    archive.append([(str(uuid.uuid4()), _completed_state(100, "2026-01-02T11:00:00+00:00"), [])])
+    assert archive.report()["scores_by_day"][1] == {"day": "2026-01-02", "completed": 2, "avg_score": 80}
+
+
+def test_signed_tokens_read_without_session_json(tmp_path, monkeypatch):
+    from app.tokens import SessionTokens
+    signer = SessionTokens(b"k" * 32)
+    tokens = [signer.issue(("dev", "ru"), created_ts=1000 + i) for i in range(3)]
+    archive = ColumnarArchive(str(tmp_path))
+    archive.append([(token, _completed_state(50, "2026-01-01T10:00:00+00:00"), []) for token in tokens])
+
+    reopened = ColumnarArchive(str(tmp_path))
+    # Экспорт и восстановление берут токен из своего сегмента, а не из JSON сессии
+    monkeypatch.setattr(reopened, "_text", lambda *args: pytest.fail("JSON сессии не должен разбираться"))
+    assert [row[0] for batch in reopened.iter_sessions(chunk=2) for row in batch] == tokens
+    assert [token for token, _ in reopened.tokens_created_after(0)] == tokens
+    assert reopened.find(tokens[1]) == 1
+
+
+def test_uncommitted_tail_is_truncated(tmp_path):
+    archive = ColumnarArchive(str(tmp_path))
+    archive.append([(str(uuid.uuid4()), SessionState(1000.0), [])])
+    with open(tmp_path / "sessions.score", "ab") as fh:
+        fh.write(b"\x01\x02\x03")  # Сбой после записи колонки, до archive.json
+
+    reopened = ColumnarArchive(str(tmp_path))
+    reopened.open()
+    assert (tmp_path / "sessions.score").stat().st_size == 2
+    assert reopened.report()["sessions"] == 1
+
+
+def test_sweep_moves_completed_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "archive", ColumnarArchive(str(tmp_path)))
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Ответ перед архивом"})
+    client.post(f"/session/{token}/complete")
+    score = client.get(f"/result/{token}").json()["performance_score"]
+
+    monkeypatch.setattr(api, "ARCHIVE_AFTER_SECONDS", -1)
+    assert client.post("/admin/archive/sweep").json()["archived"] >= 1
+    assert token not in api.sessions
+
+    result = client.get(f"/result/{token}")
+    assert result.status_code == 200 and result.json()["performance_score"] == score
+    assert token in client.get("/admin/export/sessions").text
+    assert client.get("/admin/analytics.json").json()["archive"]["completed"] >= 1
+    assert "Архив" in client.get("/admin/analytics").text
+
+
+def test_lookups_cached_until_next_batch(tmp_path, monkeypatch):
+    archive = ColumnarArchive(str(tmp_path))
+    token = str(uuid.uuid4())
+    archive.append([(str(uuid.uuid4()), SessionState(1000.0), [])])
+    scans = []
+    original = archive._scan
+    monkeypatch.setattr(archive, "_scan", lambda *args: scans.append(args) or original(*args))
+    assert archive.find(token) is None
+    assert archive.find(token) is None
+    assert len(scans) == 1
+    # Новый пакет сбрасывает кэш: промах больше не верен
+    archive.append([(token, SessionState(1000.0), [])])
+    assert archive.find(token) == 1
+    assert len(scans) == 2
+
+
+def test_concurrent_sweeps_archive_once(tmp_path, monkeypatch):
+    import threading
+    monkeypatch.setattr(api, "archive", ColumnarArchive(str(tmp_path)))
+    monkeypatch.setattr(api, "ARCHIVE_AFTER_SECONDS", -1)
+    tokens = []
+    for _ in range(20):
+        token = client.post("/session").json()["token"]
+        client.post(f"/aeon/question/{token}", json={})
+        client.post(f"/session/{token}/complete")
+        tokens.append(token)
+    threads = [threading.Thread(target=api.archive_idle_sessions) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    archived = [row[0] for batch in api.archive.iter_sessions() for row in batch]
+    assert sorted(set(tokens) & set(archived)) == sorted(tokens)
+    assert len(archived) == len(set(archived))
+
+
+def test_archived_tokens_retired_after_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "archive", ColumnarArchive(str(tmp_path)))
+    monkeypatch.setattr(api, "retired_tokens", {})
+    token = client.post("/session").json()["token"]
+    client.post(f"/aeon/question/{token}", json={})
+    client.post(f"/session/{token}/complete")
+    monkeypatch.setattr(api, "ARCHIVE_AFTER_SECONDS", -1)
+    api.archive_idle_sessions()
+    stale = str(uuid.uuid4())
+    api.archive.append([(stale, SessionState(1000.0), [])])
+
+    # Рестарт без журнала: множество пусто, архив на месте
+    api.retired_tokens.clear()
+    monkeypatch.setattr(api, "archive", ColumnarArchive(str(tmp_path)))
+    assert api.retire_archived_tokens() == 1
+    assert token in api.retired_tokens and stale not in api.retired_tokens
+    response = client.post(f"/aeon/question/{token}", json={})
+    assert response.status_code == 404
+    assert token not in api.sessions
+
+
+def test_archived_token_not_reallocated_without_retired_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "archive", ColumnarArchive(str(tmp_path)))
+    monkeypatch.setattr(api, "retired_tokens", {})
+    token = client.post("/session").json()["token"]
+    client.post(f"/aeon/question/{token}", json={})
+    client.post(f"/session/{token}/complete")
+    monkeypatch.setattr(api, "ARCHIVE_AFTER_SECONDS", -1)
+    api.archive_idle_sessions()
+
+    # Рестарт, на котором запись «d» потерялась: токен выдан до старта процесса
+    api.retired_tokens.clear()
+    monkeypatch.setattr(api, "archive", ColumnarArchive(str(tmp_path)))
+    monkeypatch.setattr(api, "PROCESS_STARTED_TS", time.time() + 1)
+    assert client.post(f"/session/{token}/answer", json={"answer": "снова"}).status_code == 404
+    assert token not in api.sessions and token in api.retired_tokens
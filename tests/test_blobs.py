@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+from app.api import log
+from app.blobs import AnswerBlobStore, MAX_ANSWER_CHARS, MAX_REQUEST_BODY_BYTES
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_blob_store_compresses_long_texts():
+    store = AnswerBlobStore(compress_threshold=64)
+    long_text = "Длинный повторяющийся ответ. " * 200
+    short_ref = store.put("коротко")
+    long_ref = store.put(long_text)
+    assert store.compressed_count == 1
+    assert store.get(short_ref) == "коротко"
+    assert store.get(long_ref) == long_text
+    store.release(long_ref)
+    assert store.compressed_count == 0
+    assert store.get(long_ref) is None
+
+
+def _session_with_question():
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    return token, question_id
+
+
+def test_log_keeps_reference_instead_of_text():
+    token, question_id = _session_with_question()
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Ответ по ссылке"})
+    entry = next(e for e in reversed(log) if e["action"] == "save_answer")
+    assert "answer" not in entry["details"]
+    assert entry["details"]["question_id"] == question_id
+    assert "answer_ref" in entry["details"]
+
+
+def test_oversized_body_rejected_before_parsing():
+    token, question_id = _session_with_question()
+    body = b'{"answer": "' + b"x" * (MAX_REQUEST_BODY_BYTES + 1) + b'"}'
+    response = client.post(f"/session/{token}/answer", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+
+
+def test_answer_text_limit():
+    token, question_id = _session_with_question()
+    response = client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "я" * (MAX_ANSWER_CHARS + 1)})
+    assert response.status_code == 413
+    assert client.get(f"/session/{token}").json()["questions_answered"] == 0
@@ -0,0 +1,89 @@
+import gzip
+import hashlib
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.api import log_event, mock_test_payload
+from app.compression import CompressionMiddleware, negotiate, pick_variant, precompress
+from app.main import app
+
+client = TestClient(app)
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def test_negotiate():
+    assert negotiate("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert negotiate("gzip;q=0.5, br", ("br", "gzip")) == "br"
+    assert negotiate("br;q=0, gzip;q=0.1", ("br", "gzip")) == "gzip"
+    assert negotiate("*", ("br", "gzip")) == "br"
+    assert negotiate("identity", ("gzip",)) is None
+    assert negotiate("", ("gzip",)) is None
+    assert negotiate("gzip;q=0", ("gzip",)) is None
+
+
+def test_threshold_and_streaming():
+    small = FastAPI()
+
+    @small.get("/small")
+    def tiny():
+        return PlainTextResponse("мало")
+
+    @small.get("/big")
+    def big():
+        return PlainTextResponse("много текста " * 500)
+
+    @small.get("/stream")
+    def stream():
+        return StreamingResponse((f"строка {i}\n" for i in range(2000)), media_type="text/csv")
+
+    @small.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: 1\n\n"] * 100), media_type="text/event-stream")
+
+    small.add_middleware(CompressionMiddleware, minimum_size=100)
+    test = TestClient(small)
+    response = test.get("/small", headers=GZIP)
+    assert "content-encoding" not in response.headers and response.headers["vary"] == "Accept-Encoding"
+    response = test.get("/big", headers=GZIP)
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < 200
+    assert response.text == "много текста " * 500
+    response = test.get("/stream", headers=GZIP)
+    assert response.headers["content-encoding"] == "gzip" and "content-length" not in response.headers
+    assert response.text.splitlines()[-1] == "строка 1999"
+    assert "content-encoding" not in test.get("/events", headers=GZIP).headers
+    assert "content-encoding" not in test.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_app_compresses_log_and_export():
+    for i in range(50):
+        log_event("compression_check", {"n": i, "note": "проверка сжатия"})
+    page = client.get("/admin/log", headers=GZIP)
+    assert page.headers["content-encoding"] == "gzip"
+    assert "compression_check" in page.text
+    export = client.get("/admin/export/log", headers=GZIP)
+    assert export.headers["content-encoding"] == "gzip"
+    assert "compression_check" in export.text
+
+
+def test_precompressed_test_payload():
+    plain = client.get("/test/1", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    compressed = client.get("/test/1", headers=GZIP)
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.json() == plain.json()
+    assert compressed.headers["etag"] != plain.headers["etag"]
+    again = client.get("/test/1", headers=dict(GZIP, **{"If-None-Match": compressed.headers["etag"]}))
+    assert again.status_code == 304
+    # ETag — хеш содержимого: у разных языков разный, после смены JSON теста меняется
+    identity = mock_test_payload("ru")["identity"]
+    assert plain.headers["etag"] == f'"{hashlib.sha256(identity).hexdigest()[:12]}"'
+    assert client.get("/test/1?lang=en").headers["etag"] != client.get("/test/1?lang=ru").headers["etag"]
+    assert client.get("/test/2").status_code == 404
+
+    variants = precompress("тест ".encode("utf-8") * 1000)
+    assert gzip.decompress(variants["gzip"]) == variants["identity"]
+    assert pick_variant("gzip", variants)[0] == "gzip"
+    assert pick_variant(None, variants)[0] == "identity"
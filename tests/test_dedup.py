@@ -0,0 +1,95 @@
+from fastapi.testclient import TestClient
+
+from app.dedup import NearDuplicateIndex, minhash, shingle_hashes, similarity
+from app.main import app
+
+client = TestClient(app)
+
+TEMPLATE = ("В прошлом проекте я отвечал за миграцию сервиса на новую архитектуру, "
+            "договорился с командой о сроках, разбил работу на этапы и каждую неделю "
+            "показывал заказчику результат, поэтому мы уложились в срок и бюджет")
+
+
+def test_signature_estimates_jaccard():
+    same = minhash(shingle_hashes(TEMPLATE))
+    assert similarity(same, minhash(shingle_hashes(TEMPLATE.upper() + "!"))) == 1.0
+    other = minhash(shingle_hashes("Совсем другой ответ про тестирование и качество кода в команде"))
+    assert similarity(same, other) < 0.3
+
+
+def test_index_flags_copies_of_other_sessions_only():
+    index = NearDuplicateIndex(threshold=0.7)
+    assert index.add("a", "q_1", TEMPLATE) is None
+    # Повторный ответ той же сессии — не копия
+    assert index.add("a", "q_1", TEMPLATE) is None
+    # Тот же текст на другой вопрос не сравнивается
+    assert index.add("b", "q_2", TEMPLATE) is None
+    match = index.add("c", "q_1", TEMPLATE + " и без переработок")
+    assert match is not None and match[0] == "a" and match[1] >= 0.7
+    assert index.add("d", "q_1", "Короткий самостоятельный ответ") is None
+    assert index.add("e", "q_1", "") is None
+    # Повторный ответ «a» заменил прежний — живых записей четыре
+    assert (len(index), index.flagged) == (4, 1)
+
+
+def test_removed_answers_stop_matching_and_flags_are_rematched():
+    index = NearDuplicateIndex(threshold=0.7)
+    index.add("a", "q_1", TEMPLATE)
+    assert index.add("b", "q_1", TEMPLATE)[0] == "a"
+    assert index.remove("a", "q_1") == [("b", "q_1")]
+    assert index.rematch("b", "q_1") is None
+    assert index.add("c", "q_1", TEMPLATE)[0] == "b"
+    # Отредактированный ответ «b» больше не образец для копий
+    index.add("b", "q_1", "Совсем другой ответ про тестирование и качество кода в команде")
+    assert index.add("d", "q_1", TEMPLATE)[0] == "c"
+    assert index.remove("c") == [("d", "q_1")]
+    assert len(index) == 2
+
+
+def test_compaction_keeps_live_entries(monkeypatch):
+    monkeypatch.setattr("app.dedup.COMPACT_MIN_DEAD", 4)
+    index = NearDuplicateIndex(threshold=0.7)
+    for n in range(10):
+        index.add(f"t{n}", "q_1", f"Уникальный ответ номер {n} без совпадений с другими {n * 7}")
+        index.remove(f"t{n}")
+    index.add("a", "q_1", TEMPLATE)
+    assert len(index._owners) < 10
+    assert index.add("b", "q_1", TEMPLATE)[0] == "a"
+
+
+def test_flag_surfaces_in_summary():
+    tokens = []
+    for _ in range(2):
+        token = client.post("/session").json()["token"]
+        question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+        client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": TEMPLATE})
+        tokens.append(token)
+
+    data = client.post(f"/aeon/summary/{tokens[1]}").json()
+    assert data["near_duplicates"][0]["similar_to"] == tokens[0]
+    assert "Проверка самостоятельности" in data["summary"]
+    assert client.post(f"/aeon/summary/{tokens[0]}").json()["near_duplicates"] == []
+
+    # Образец удалён — отметка копии снимается
+    client.post(f"/admin/session/{tokens[0]}/delete")
+    assert client.post(f"/aeon/summary/{tokens[1]}").json()["near_duplicates"] == []
+
+
+def test_restored_answers_reindexed(monkeypatch):
+    import app.api as api
+    from app.state import SessionState
+    tokens = []
+    for _ in range(2):
+        token = client.post("/session").json()["token"]
+        question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+        client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": TEMPLATE})
+        tokens.append(token)
+
+    # Рестарт: сессии из снапшота без отметок, индекс пуст
+    restored = {token: SessionState.from_record(api.sessions[token].to_record()) for token in tokens}
+    monkeypatch.setattr(api, "sessions", restored)
+    monkeypatch.setattr(api, "near_duplicates", NearDuplicateIndex())
+    assert restored[tokens[1]].duplicates == []
+    assert api.reindex_restored_answers() == 2
+    assert restored[tokens[1]].duplicates[0]["similar_to"] == tokens[0]
+    assert restored[tokens[0]].duplicates == []
@@ -0,0 +1,48 @@
+import asyncio
+import json
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.events import AdminEventBus, format_sse
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_format_sse():
+    message = format_sse(7, "completed", {"token": "т"})
+    assert message == 'id: 7\nevent: completed\ndata: {"token":"т"}\n\n'
+
+
+def test_publish_from_thread_and_drop_oldest():
+    bus = AdminEventBus(queue_size=2)
+    assert not bus.active
+    bus.publish("ignored", {})  # без подписчиков — пустая операция
+
+    async def scenario():
+        queue = bus.subscribe()
+        thread = threading.Thread(target=lambda: [bus.publish("answered", {"n": n}, {"total_aeon_answers": 1}) for n in range(3)])
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)
+        received = [await queue.get() for _ in range(2)]
+        bus.unsubscribe(queue)
+        return received
+
+    received = asyncio.run(scenario())
+    payloads = [json.loads(m.split("data: ")[1]) for m in received]
+    assert [p["n"] for p in payloads] == [1, 2]
+    assert payloads[0]["stats"] == {"total_aeon_answers": 1}
+    assert bus.dropped == 1
+    assert not bus.active
+
+
+def test_admin_pages_have_live_hooks():
+    token = client.post("/session").json()["token"]
+    # Сессия попадает в список после первой записи
+    client.post(f"/aeon/question/{token}", json={})
+    page = client.get("/admin").text
+    assert f'id="row-{token}"' in page
+    assert 'EventSource("/admin/events")' in page
+    assert 'data-stat="total"' in client.get("/admin/stats").text
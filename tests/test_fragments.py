@@ -0,0 +1,142 @@
+from fastapi.testclient import TestClient
+
+from app.api import sessions
+from app.fragments import AppendOnlyFragments, RenderedPages, static_asset
+from app.main import app
+
+client = TestClient(app)
+
+
+def start_session():
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    return token, question_id
+
+
+def test_shared_css_is_immutable_asset():
+    page = client.get("/admin/stats").text
+    asset = static_asset("admin.css")
+    assert f'href="/static/admin.css?v={asset.version}"' in page
+    assert "<style>" not in page
+    response = client.get(f"/static/admin.css?v={asset.version}")
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert response.headers["content-type"].startswith("text/css")
+    assert client.get("/static/admin.css").headers["Cache-Control"] == "no-cache"
+    assert client.get("/static/admin.css", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert client.get("/static/..%2Fapp%2Fapi.py").status_code == 404
+    assert client.get("/static/missing.css").status_code == 404
+
+
+def test_session_rows_rerendered_by_revision():
+    token, question_id = start_session()
+    assert f'<td data-field="answers">0</td>' in client.get("/admin").text.split(f'id="row-{token}"')[1][:400]
+    cached = sessions[token]._memo["admin_row"]
+    client.get("/admin")
+    assert sessions[token]._memo["admin_row"] is cached
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Мой <b>опыт</b>"})
+    row = client.get("/admin").text.split(f'id="row-{token}"')[1][:400]
+    assert '<td data-field="answers">1</td>' in row
+
+
+def test_session_detail_lists_answers():
+    token, question_id = start_session()
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Мой <b>опыт</b>"})
+    page = client.get(f"/admin/session/{token}")
+    assert page.status_code == 200
+    assert f"<td>1</td>\n            <td>{question_id}</td>" in page.text
+    assert "Мой &lt;b&gt;опыт&lt;/b&gt;" in page.text
+    assert client.get("/admin/session/unknown").status_code == 404
+    # Страница с текстами ответов не оседает в мемо сессии
+    assert "admin_detail" not in (sessions[token]._memo or {})
+
+
+def test_rendered_pages_bounded_lru():
+    pages = RenderedPages(2)
+    renders = []
+
+    def render(name):
+        renders.append(name)
+        return f"<{name}>"
+    assert pages.get("a", 1, lambda: render("a1")) == "<a1>"
+    assert pages.get("a", 1, lambda: render("a1")) == "<a1>" and renders == ["a1"]
+    assert pages.get("a", 2, lambda: render("a2")) == "<a2>"
+    pages.get("b", 1, lambda: render("b1"))
+    pages.get("c", 1, lambda: render("c1"))
+    assert len(pages) == 2
+    pages.get("a", 2, lambda: render("a2"))
+    assert renders == ["a1", "a2", "b1", "c1", "a2"]
+    pages.discard("a")
+    assert len(pages) == 1
+
+
+def test_deleted_session_page_dropped():
+    from app.api import session_pages
+    token, question_id = start_session()
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Удаляемый ответ"})
+    client.get(f"/admin/session/{token}")
+    assert token in session_pages._pages
+    client.post(f"/admin/session/{token}/delete")
+    assert token not in session_pages._pages
+
+
+def test_append_only_fragments():
+    rendered = []
+    cache = AppendOnlyFragments()
+
+    def render(item):
+        rendered.append(item)
+        return f"<{item['n']}>"
+    items = [{"n": 1}, {"n": 2}]
+    assert cache.rows(items, render) == ["<1>", "<2>"]
+    items.append({"n": 3})
+    assert cache.rows(items, render) == ["<1>", "<2>", "<3>"]
+    assert len(rendered) == 3
+    # Список подменили (восстановление из журнала) — кэш начинается заново
+    items[:] = [{"n": 7}]
+    assert cache.rows(items, render) == ["<7>"]
+
+
+def test_log_page_newest_first():
+    from app.api import log_event
+    client.get("/admin/log")
+    log_event("fragment_first")
+    log_event("fragment_second")
+    page = client.get("/admin/log").text
+    assert page.index("fragment_second") < page.index("fragment_first")
+
+
+def test_fragment_cache_keeps_only_window():
+    rendered = []
+    cache = AppendOnlyFragments(window=3)
+
+    def render(item):
+        rendered.append(item)
+        return f"<{item}>"
+    items = list(range(10))
+    assert cache.rows(items, render, 7, 10) == ["<7>", "<8>", "<9>"]
+    assert len(cache) == 3 and rendered == [7, 8, 9]
+    items += [10, 11]
+    assert cache.rows(items, render, 9, 12) == ["<9>", "<10>", "<11>"]
+    assert len(cache) == 3 and rendered == [7, 8, 9, 10, 11]
+    # Старая страница рендерится по запросу и в кэш не попадает
+    assert cache.rows(items, render, 0, 3) == ["<0>", "<1>", "<2>"]
+    assert cache.rows(items, render, 7, 10) == ["<7>", "<8>", "<9>"]
+    assert len(cache) == 3
+
+
+def test_log_pages(monkeypatch):
+    from app import api
+    monkeypatch.setattr(api, "ADMIN_LOG_PAGE", 2)
+    monkeypatch.setattr(api, "log_rows", AppendOnlyFragments(window=2))
+    for n in range(5):
+        api.log_event(f"paged_{n}")
+    count = len(api.log)
+    first = client.get("/admin/log").text
+    assert "paged_4" in first and "paged_3" in first and "paged_2" not in first
+    assert '?page=2">Старее' in first and "Новее" not in first
+    second = client.get("/admin/log?page=2").text
+    assert "paged_2" in second and "paged_1" in second and "paged_4" not in second
+    assert '?page=1">Новее' in second
+    assert len(api.log_rows) == 2
+    last = client.get(f"/admin/log?page={count}").text
+    assert f"Страница {-(-count // 2)} из {-(-count // 2)}" in last
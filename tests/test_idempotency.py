@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import log, sessions
+from app.idempotency import IdempotencyCache, IdempotencyConflict, idempotency
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_session_and_answer_replayed():
+    headers = {"Idempotency-Key": "create-1"}
+    first = client.post("/session", headers=headers)
+    again = client.post("/session", headers=headers)
+    assert again.json() == first.json()
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+    token = first.json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    answer = {"question_id": question_id, "answer": "Мой опыт с Python"}
+    for _ in range(3):
+        response = client.post(f"/session/{token}/answer", json=answer, headers={"Idempotency-Key": "a-1"})
+        assert response.json() == {"status": "saved"}
+    saved = [entry for entry in log if entry["action"] == "save_answer" and entry["details"]["token"] == token]
+    assert len(saved) == 1
+    assert sessions[token].answer_count == 1
+
+    # Тот же ключ с другим ответом — ошибка клиента, ключ другой сессии — независим
+    other = dict(answer, answer="Другой ответ")
+    assert client.post(f"/session/{token}/answer", json=other, headers={"Idempotency-Key": "a-1"}).status_code == 422
+    assert client.post("/session", headers={"Idempotency-Key": "x" * 300}).status_code == 400
+    stats = client.get("/admin/idempotency").json()
+    assert stats["counters"]["hits"] >= 3 and stats["counters"]["conflicts"] >= 1
+
+
+def test_session_key_is_scoped_to_caller():
+    """Тот же Idempotency-Key от другого клиента не возвращает чужой токен"""
+    headers = {"Idempotency-Key": "create-shared"}
+    mine = client.post("/session", headers=dict(headers, **{"X-Forwarded-For": "198.51.100.1"}))
+    theirs = client.post("/session", headers=dict(headers, **{"X-Forwarded-For": "198.51.100.2"}))
+    assert theirs.json()["token"] != mine.json()["token"]
+    assert "Idempotent-Replayed" not in theirs.headers
+    again = client.post("/session", headers=dict(headers, **{"X-Forwarded-For": "198.51.100.1"}))
+    assert again.json() == mine.json()
+
+
+def test_concurrent_duplicates_run_once():
+    cache = IdempotencyCache()
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(1)
+        return {"n": len(calls)}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.run("k", {"a": 1}, compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False] + [True] * 7
+    assert all(result == {"n": 1} for result, _ in results)
+    assert cache.snapshot()["hit_rate"] == 0.875
+
+
+def test_failure_releases_key_and_bounds(monkeypatch):
+    cache = IdempotencyCache(ttl=60, max_keys=2)
+
+    def fail():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        cache.run("k", 1, fail)
+    assert cache.run("k", 1, lambda: "ok") == ("ok", False)
+    with pytest.raises(IdempotencyConflict):
+        cache.run("k", 2, lambda: "other")
+    cache.run("k2", 1, lambda: 2)
+    cache.run("k3", 1, lambda: 3)
+    assert len(cache) == 2 and cache.counters["evicted"] == 1
+    later = time.monotonic() + 61
+    monkeypatch.setattr("app.idempotency.time.monotonic", lambda: later)
+    cache.run("k4", 1, lambda: 4)
+    assert len(cache) == 1 and cache.counters["expired"] == 2
+
+
+def test_requests_without_key_unaffected():
+    before = len(idempotency)
+    assert client.post("/session").json()["token"] != client.post("/session").json()["token"]
+    assert len(idempotency) == before
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+
+from app.journal import Journal
+from app.state import SessionState
+
+
+def _populate(journal, sessions, log):
+    state = sessions["t1"] = SessionState(1000.0)
+    journal.append("c", state.created_ts, "t1")
+    state.mark_asked("q_1")
+    journal.append("q", 1001.0, "t1", "q_1")
+    ref = state.set_answer("q_1", "Ответ из журнала")
+    journal.append("a", 1002.0, "t1", "q_1", ref, "Ответ из журнала")
+    journal.append("l", "2026-01-01 00:00:00", "save_answer", {"token": "t1", "answer_ref": ref})
+    sessions["t2"] = SessionState(1000.0)
+    journal.append("c", 1000.0, "t2")
+    journal.append("x", "t2")
+    journal.append("d", "t2")
+
+
+def test_recover_from_journal_tail(tmp_path):
+    sessions, log = {}, []
+    journal = Journal(str(tmp_path), snapshot_every=10**9)
+    journal.recover(sessions, log)
+    journal.start()
+    _populate(journal, sessions, log)
+    journal.close(snapshot=False)
+
+    restored, restored_log = {}, []
+    replayed = Journal(str(tmp_path)).recover(restored, restored_log)
+    assert replayed == 7
+    assert list(restored) == ["t1"]
+    state = restored["t1"]
+    assert state.created_ts == 1000.0
+    assert state.last_activity_ts == 1002.0
+    assert state.aeon_answers == {"q_1": "Ответ из журнала"}
+    assert restored_log[0]["action"] == "save_answer"
+
+
+def test_snapshot_then_tail(tmp_path):
+    sessions, log = {}, []
+    journal = Journal(str(tmp_path), snapshot_every=10**9)
+    journal.recover(sessions, log)
+    journal.start()
+    _populate(journal, sessions, log)
+    journal.snapshot()
+    sessions["t1"].completed = True
+    journal.append("x", "t1")
+    journal.close(snapshot=False)
+
+    # Старые сегменты удалены, хвост — одна запись
+    assert len(list(tmp_path.glob("snapshot-*.json"))) == 1
+    restored, restored_log = {}, []
+    assert Journal(str(tmp_path)).recover(restored, restored_log) == 1
+    assert restored["t1"].completed
+    assert restored["t1"].asked_count == 1
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    (tmp_path / "journal-00000001.log").write_text('["c",1.0,"t1"]\n["q",2.0,"t1","q_', encoding="utf-8")
+    restored = {}
+    assert Journal(str(tmp_path)).recover(restored, []) == 1
+    assert restored["t1"].asked_count == 0
+
+
+def test_result_survives_snapshot(tmp_path):
+    from app.state import SessionResult
+    result = SessionResult("t1", 60, 1, 10.0, 60, 42, "2026-01-01T00:00:00+00:00",
+                           "2026-01-01T00:01:00+00:00", "🌟", "профиль", "сводка")
+    sessions, log = {}, []
+    journal = Journal(str(tmp_path), snapshot_every=10**9)
+    journal.recover(sessions, log)
+    journal.start()
+    state = sessions["t1"] = SessionState(1000.0)
+    journal.append("c", 1000.0, "t1")
+    state.result = result
+    state.complete()
+    journal.append("x", "t1", result.to_record())
+    journal.close(snapshot=False)
+
+    from_tail = {}
+    Journal(str(tmp_path)).recover(from_tail, [])
+    assert from_tail["t1"].result == result
+
+    journal = Journal(str(tmp_path), snapshot_every=10**9)
+    journal.recover(sessions, log)
+    journal.start()
+    journal.close(snapshot=True)
+    from_snapshot = {}
+    assert Journal(str(tmp_path)).recover(from_snapshot, []) == 0
+    assert from_snapshot["t1"].result == result
+
+
+def test_write_errors_are_counted_and_requeued(tmp_path, monkeypatch):
+    sessions, log = {}, []
+    journal = Journal(str(tmp_path), fsync_interval=0.01, snapshot_every=10**9)
+    journal.recover(sessions, log)
+    journal.start()
+    journal.append("c", 1000.0, "t1")
+    failing = [True]
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        if failing[0]:
+            raise OSError("disk full")
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    deadline = time.time() + 5
+    while journal.errors == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert journal.status()["errors"] >= 1
+    assert "disk full" in journal.status()["last_error"]
+    assert journal._thread.is_alive()
+    failing[0] = False
+    journal.append("q", 1001.0, "t1", "q_1")
+    journal.close(snapshot=False)
+
+    restored = {}
+    Journal(str(tmp_path)).recover(restored, [])
+    assert restored["t1"].asked_count == 1
+
+
+def test_log_entry_lands_in_snapshot_or_tail_once(tmp_path):
+    sessions, log = {}, []
+    journal = Journal(str(tmp_path), snapshot_every=10**9)
+    journal.recover(sessions, log)
+    journal.start()
+    journal.append_log(log, {"time": "t0", "action": "before", "details": {}})
+    journal.snapshot()
+    journal.append_log(log, {"time": "t1", "action": "after", "details": {}})
+    journal.close(snapshot=False)
+
+    restored_log = []
+    Journal(str(tmp_path)).recover({}, restored_log)
+    assert [e["action"] for e in restored_log] == ["before", "after"]
+
+
+def test_snapshot_sees_consistent_sessions_under_concurrent_answers(tmp_path):
+    sessions, log = {}, []
+    journal = Journal(str(tmp_path), snapshot_every=10**9)
+    journal.recover(sessions, log)
+    journal.start()
+    state = sessions["t1"] = SessionState(1000.0)
+    stop = threading.Event()
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            state.mark_asked(f"q_{n % 50}")
+            state.set_answer(f"q_{n % 50}", f"ответ {n}")
+            n += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(20):
+            journal.snapshot()
+    finally:
+        stop.set()
+        thread.join()
+        journal.close(snapshot=False)
+
+
+def test_retired_tokens_survive_restart(tmp_path):
+    sessions, log, retired = {}, [], {}
+    journal = Journal(str(tmp_path), snapshot_every=10**9)
+    journal.recover(sessions, log, retired)
+    journal.start()
+    future = time.time() + 3600
+    retired["t1"] = future
+    journal.append("d", "t1", future)
+    journal.snapshot()
+    journal.append("d", "t2", future)
+    journal.append("d", "t3", time.time() - 1)  # Токен уже истёк
+    journal.append("d", "t4", None)
+    journal.close(snapshot=False)
+
+    restored = {}
+    Journal(str(tmp_path)).recover({}, [], restored)
+    assert restored == {"t1": future, "t2": future}
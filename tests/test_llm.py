@@ -0,0 +1,77 @@
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import app.llm as llm
+from app.fake_llm import FakeLLMConfig, create_fake_llm_app, fixture_key, parse_latency
+from app.main import app
+
+client = TestClient(app)
+
+MESSAGES = [{"role": "user", "content": "Сгенерируй задание"}]
+
+
+def test_placeholder_key_only_with_custom_base_url():
+    assert not llm.llm_configured(None)
+    assert not llm.llm_configured("sk-proj-X1abc", llm.DEFAULT_BASE_URL)
+    assert llm.llm_configured("sk-proj-X1abc", "http://127.0.0.1:8001/v1")
+    assert llm.llm_configured("sk-real", llm.DEFAULT_BASE_URL)
+
+
+def test_latency_distributions():
+    import random
+    rng = random.Random(1)
+    assert parse_latency("fixed:250")(rng) == 0.25
+    assert all(0.01 <= parse_latency("uniform:10,20")(rng) <= 0.02 for _ in range(100))
+    assert parse_latency("lognormal:100,0.5")(rng) > 0
+    assert parse_latency("exponential:5")(rng) >= 0
+
+
+def test_fake_completion_and_stream():
+    fake = TestClient(create_fake_llm_app(FakeLLMConfig(content='{"task": "t", "example": "e"}', chunk_chars=4)))
+    response = fake.post("/v1/chat/completions", json={"model": "m", "messages": MESSAGES})
+    assert response.status_code == 200
+    assert json.loads(response.json()["choices"][0]["message"]["content"]) == {"task": "t", "example": "e"}
+
+    response = fake.post("/v1/chat/completions", json={"model": "m", "messages": MESSAGES, "stream": True})
+    events = [line[6:] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks) == '{"task": "t", "example": "e"}'
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+    assert fake.get("/stats").json()["streamed"] == 1
+
+
+def test_fake_error_rate_and_replay(tmp_path):
+    fake = TestClient(create_fake_llm_app(FakeLLMConfig(error_rate=1.0, error_statuses=(503,))))
+    response = fake.post("/v1/chat/completions", json={"model": "m", "messages": MESSAGES})
+    assert response.status_code == 503
+    assert fake.get("/stats").json()["errors"] == 1
+
+    payload = {"model": "m", "messages": MESSAGES}
+    fixtures = tmp_path / "fixtures.jsonl"
+    fixtures.write_text(json.dumps({"key": fixture_key(payload), "content": "записанный ответ"}) + "\n",
+                        encoding="utf-8")
+    fake = TestClient(create_fake_llm_app(FakeLLMConfig(replay_path=str(fixtures))))
+    response = fake.post("/v1/chat/completions", json=dict(payload, temperature=0.1))
+    assert response.json()["choices"][0]["message"]["content"] == "записанный ответ"
+    assert fake.get("/stats").json()["replayed"] == 1
+
+
+def test_task_endpoint_uses_configured_base_url(monkeypatch):
+    content = {"task": "Задание от модели", "example": "Пример от модели"}
+    fake_app = create_fake_llm_app(FakeLLMConfig(content=json.dumps(content, ensure_ascii=False)))
+    monkeypatch.setattr(llm, "OPENAI_BASE_URL", "http://fake-llm/v1")
+    monkeypatch.setattr(llm, "transport", httpx.ASGITransport(app=fake_app))
+    token = client.post("/session").json()["token"]
+    response = client.post(f"/aeon/task/{token}", json={"position": "Тимлид"})
+    assert response.status_code == 200
+    assert response.json() == content
+    assert fake_app.state.stats.requests == 1
+
+    # Ошибка модели — запасное задание
+    monkeypatch.setattr(llm, "transport", httpx.ASGITransport(
+        app=create_fake_llm_app(FakeLLMConfig(error_rate=1.0))))
+    response = client.post(f"/aeon/task/{token}", json={"position": "Тимлид"})
+    assert "Тимлид" in response.json()["task"]
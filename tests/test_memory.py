@@ -0,0 +1,94 @@
+import sys
+import tracemalloc
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.memory import deep_size, estimate
+from app.state import SessionState
+
+client = TestClient(app)
+
+
+def test_deep_size_counts_reachable_objects_once():
+    text = "x" * 1000
+    assert deep_size([text, text]) == sys.getsizeof([text, text]) + sys.getsizeof(text)
+    state = SessionState(1000.0)
+    state.memo("status", (1,), lambda: {"payload": "y" * 500})
+    assert deep_size(state) > sys.getsizeof(state) + 500
+
+
+def test_estimate_scales_sample():
+    values = {i: "".join(["z"] * 100) for i in range(10_000)}
+    report = estimate(values, values.values(), limit=50)
+    assert report["count"] == 10_000
+    assert report["per_item_bytes"] == sys.getsizeof("z" * 100)
+    assert report["bytes"] >= 10_000 * report["per_item_bytes"]
+
+
+def test_report_tolerates_concurrent_mutation():
+    """Отчёт снимает копии коллекций и не падает, пока другой поток их меняет"""
+    import threading
+    from app.memory import subsystem_report
+    sessions, log = {}, []
+    stop = threading.Event()
+
+    def mutate():
+        n = 0
+        while not stop.is_set():
+            sessions[f"t{n}"] = SessionState(1000.0)
+            log.append({"n": n})
+            if n % 2:
+                sessions.pop(f"t{n - 1}", None)
+            n += 1
+
+    thread = threading.Thread(target=mutate)
+    thread.start()
+    try:
+        for _ in range(50):
+            subsystem_report(sessions, log)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_memory_report_by_subsystem():
+    token = client.post("/session").json()["token"]
+    client.post(f"/aeon/question/{token}", json={})
+    report = client.get("/admin/memory").json()
+    subsystems = report["subsystems"]
+    for name in ("sessions", "log", "answer_texts", "near_duplicates", "relevance", "admission_buckets"):
+        assert name in subsystems
+    assert subsystems["sessions"]["count"] >= 1
+    assert subsystems["sessions"]["per_item_bytes"] > 0
+    assert report["accounted_heap_bytes"] > 0
+    # Подсистемы учитываются через публичные __len__ и memory_items()
+    for name in ("answer_texts", "near_duplicates", "relevance", "question_banks", "idempotency_keys"):
+        assert set(subsystems[name]) >= {"count", "bytes"}
+    assert subsystems["question_banks"]["count"] >= 1 and subsystems["question_banks"]["bytes"] > 0
+
+
+def test_usage_of_subsystem():
+    from app.fragments import AppendOnlyFragments
+    from app.memory import usage
+    rows = AppendOnlyFragments()
+    rows.rows([{"n": n} for n in range(100)], lambda item: f"<tr>{item['n']:0200d}</tr>")
+    report = usage(rows)
+    assert report["count"] == 100
+    assert report["bytes"] >= 100 * sys.getsizeof("x" * 200)
+
+
+def test_tracemalloc_snapshot_diff():
+    assert client.get("/admin/memory/diff").status_code == 404
+    first = client.post("/admin/memory/snapshot").json()
+    assert first["tracing"] is True
+    leak = [bytearray(1024) for _ in range(200)]
+    second = client.post("/admin/memory/snapshot").json()
+    diff = client.get(f"/admin/memory/diff?since={first['id']}&until={second['id']}").json()
+    assert diff["size_diff"] >= 200 * 1024
+    assert "test_memory.py" in diff["top"][0]["where"][0]
+    assert client.get("/admin/memory/diff?group_by=bogus").status_code == 422
+    client.delete("/admin/memory/snapshots")
+    assert not tracemalloc.is_tracing()
+    assert client.get("/admin/memory/diff").status_code == 404
+    del leak
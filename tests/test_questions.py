@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.questions import QuestionBankError, QuestionBankRegistry, load_question_bank
+
+client = TestClient(app)
+
+BANK = {
+    "version": "v1",
+    "questions": [
+        {"id": "b_1", "text": "Общий вопрос", "type": "soft", "lang": "ru"},
+        {"id": "b_2", "text": "Backend question", "type": "technical", "lang": "en", "roles": ["backend"]},
+        {"id": "b_3", "text": "Вопрос для backend", "type": "technical", "lang": "ru", "roles": ["backend"]},
+        {"id": "b_4", "text": "Вопрос для дизайнера", "type": "soft", "lang": "ru", "roles": ["design"]},
+    ],
+}
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def test_tag_index_and_sequences(tmp_path):
+    path = tmp_path / "bank.json"
+    _write(path, BANK)
+    bank = load_question_bank(str(path))
+    assert bank.version == "v1"
+    assert [q["id"] for q in bank.tagged("type", "technical")] == ["b_2", "b_3"]
+    assert [q["id"] for q in bank.sequence(("backend", "ru"))] == ["b_1", "b_3"]
+    assert [q["id"] for q in bank.sequence((None, "en"))] == ["b_2"]
+    assert bank.sequence(("backend", "ru")) is bank.sequence(("backend", "ru"))
+
+
+def test_yaml_bank(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "bank.yaml"
+    path.write_text("questions:\n  - id: y_1\n    text: Вопрос\n    type: soft\n", encoding="utf-8")
+    assert load_question_bank(str(path)).by_id["y_1"]["text"] == "Вопрос"
+
+
+def test_duplicate_ids_rejected(tmp_path):
+    path = tmp_path / "bank.json"
+    _write(path, [{"id": "d", "text": "1"}, {"id": "d", "text": "2"}])
+    with pytest.raises(QuestionBankError):
+        load_question_bank(str(path))
+
+
+def test_reload_keeps_old_versions(tmp_path):
+    path = tmp_path / "bank.json"
+    _write(path, BANK)
+    registry = QuestionBankRegistry(str(path), check_seconds=0)
+    old = registry.current()
+    _write(path, dict(BANK, version="v2", questions=BANK["questions"][:1]))
+    registry.reload()
+    assert registry.current().version == "v2"
+    assert registry.get("v1") is old
+    assert len(registry.get("v1")) == 4
+
+
+def test_session_filter_without_questions():
+    response = client.post("/session?lang=xx")
+    assert response.status_code == 400
+
+
+def test_reload_endpoint():
+    response = client.post("/admin/questions/reload")
+    assert response.status_code == 200
+    assert response.json()["questions"] == 10
+
+
+def test_versions_of_live_sessions_are_not_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.questions.QUESTION_BANK_KEEP_VERSIONS", 2)
+    path = tmp_path / "bank.json"
+    live = {"v0"}
+    registry = QuestionBankRegistry(str(path), check_seconds=0, in_use=lambda: live)
+    for n in range(5):
+        _write(path, dict(BANK, version=f"v{n}", questions=BANK["questions"][:n + 1]))
+        registry.reload()
+    assert len(registry.get("v0")) == 1
+    assert registry.get("v0").version == "v0"
+    assert registry.get("v1").version == "v4"  # Вытеснена: ни одна сессия на неё не ссылается
+
+
+def test_version_reuse_with_other_content_rejected(tmp_path):
+    path = tmp_path / "bank.json"
+    _write(path, BANK)
+    registry = QuestionBankRegistry(str(path), check_seconds=0)
+    first = registry.reload()
+    path.write_text(json.dumps(BANK, indent=2, ensure_ascii=False), encoding="utf-8")
+    assert registry.reload() is first  # Тот же банк в другом форматировании
+    _write(path, dict(BANK, questions=BANK["questions"][:2]))
+    with pytest.raises(QuestionBankError):
+        registry.reload()
+    assert registry.current() is first
+
+
+def test_session_starts_on_bank_of_its_token(tmp_path, monkeypatch):
+    from app import api
+    from app.tokens import session_tokens
+    path = tmp_path / "bank.json"
+    _write(path, BANK)
+    registry = QuestionBankRegistry(str(path), check_seconds=0)
+    monkeypatch.setattr(api, "question_banks", registry)
+    token = client.post("/session?lang=ru").json()["token"]
+    assert session_tokens.verify(token).bank_version == "v1"
+    # Банк перезагрузили между выдачей токена и первой записью
+    _write(path, dict(BANK, version="v2", questions=[{"id": "n_1", "text": "Новый вопрос", "lang": "ru"}]))
+    registry.reload()
+    assert client.post(f"/aeon/question/{token}", json={}).json()["question_id"] == "b_1"
+    assert api.sessions[token].bank_version == "v1"
+    # Версия токена уже вытеснена из реестра — сессия начинается на текущем банке
+    stale = session_tokens.verify(session_tokens.issue(bank_version="v0"))
+    assert api.pending_session(stale).bank_version == "v2"
@@ -0,0 +1,91 @@
+import time
+from collections import Counter
+
+from app.questions import QuestionBank
+from app.relevance import RelevanceScorer, terms
+
+BANK = QuestionBank([
+    {"id": "q_1", "text": "Расскажите о своем профессиональном опыте", "keywords": ["навыки", "опыт"]},
+    {"id": "q_2", "text": "Как вы справляетесь со стрессом на работе?", "keywords": ["стресс", "давление"]},
+], "v1")
+
+
+def test_terms_merge_word_forms():
+    assert terms("Навыки и навыков") == ["навык", "навык"]
+
+
+def test_cosine_prefers_the_right_question():
+    scorer = RelevanceScorer(lambda: BANK)
+    answer = "Мой опыт — пять лет, главные навыки: Python и проектирование"
+    assert scorer.score("q_1", answer) > scorer.score("q_2", answer)
+    assert 0 < scorer.score("q_1", answer) <= 1
+    assert scorer.score("q_1", "") == 0.0
+    assert scorer.score("q_404", answer) is None
+
+
+def test_answers_feed_question_vector_and_idf_incrementally():
+    scorer = RelevanceScorer(lambda: BANK)
+    paraphrase = "Помогают медитация и спорт, дедлайны переношу спокойно"
+    assert scorer.score("q_2", paraphrase) == 0.0
+    for _ in range(5):
+        scorer.observe("q_2", "Медитация и спорт помогают переживать дедлайны")
+    scorer.observe("q_1", "Работал тимлидом, медитация не при чём")
+    rebuilds, version = scorer.rebuilds, scorer.version
+    # На пути запроса модель не пересчитывается: оценка идёт по опубликованному снимку
+    assert scorer.score("q_2", paraphrase) == 0.0
+    assert (scorer.rebuilds, scorer.version) == (rebuilds, version)
+    scorer.rebuild()
+    assert scorer.version == version + 1
+    assert scorer.score("q_2", paraphrase) > 0.1
+
+
+def test_snapshot_is_not_mutated_by_rebuild():
+    scorer = RelevanceScorer(lambda: BANK)
+    answer = "Медитация и спорт помогают переживать дедлайны"
+    model = scorer.model()
+    before = scorer.score("q_2", answer)
+    for _ in range(5):
+        scorer.observe("q_2", answer)
+    scorer.rebuild()
+    assert scorer.model() is not model
+    # Прежний снимок даёт ту же оценку: его offsets не обновлялись на месте
+    assert RelevanceScorer._cosine(model, model.vectors["q_2"], Counter(terms(answer))) == before
+
+
+def test_background_rebuild():
+    scorer = RelevanceScorer(lambda: BANK, interval=0.01)
+    scorer.start()
+    try:
+        scorer.observe("q_2", "Медитация и спорт")
+        for _ in range(200):
+            if not scorer._dirty:
+                break
+            time.sleep(0.01)
+        assert scorer.score("q_2", "медитация") > 0
+    finally:
+        scorer.close()
+
+
+def test_quality_counts_tfidf_relevance():
+    from app.api import analyze_answer_quality
+    answer = "Мой профессиональный опыт: пять лет разработки, руководил командой"
+    keyword_only = analyze_answer_quality(answer, ["технологии", "разработчик"])
+    with_tfidf = analyze_answer_quality(answer, ["технологии", "разработчик"], "q_1")
+    assert with_tfidf["relevance"] > keyword_only["relevance"]
+    assert with_tfidf["score"] >= keyword_only["score"]
+
+
+def test_model_rebuild_changes_scored_etag():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.relevance import relevance
+    client = TestClient(app)
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Медитация и спорт"})
+    etag = client.post(f"/aeon/glyph/{token}", json={}).headers["ETag"]
+    assert client.post(f"/aeon/glyph/{token}", json={}, headers={"If-None-Match": etag}).status_code == 304
+    relevance.rebuild()
+    # Оценки зависят от модели: после перестройки глиф пересчитывается
+    response = client.post(f"/aeon/glyph/{token}", json={}, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
@@ -0,0 +1,52 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.scoring import ScoringExecutor, score_batch, scoring
+
+client = TestClient(app)
+
+LONG_ANSWER = "Например, в проекте я отвечал за Python сервис и команду. " * 200
+ITEMS = [("q_1", LONG_ANSWER, ["python", "команда"]), ("q_2", "", ["опыт"]),
+         ("q_3", "Коротко. Именно так.", ["опыт"]), ("q_4", LONG_ANSWER[:5000], [])]
+
+
+def test_mode_by_work_size():
+    executor = ScoringExecutor(threads=1, processes=0, inline_chars=100, process_chars=1000)
+    assert executor.mode(10) == "inline"
+    assert executor.mode(500) == "thread"
+    assert executor.mode(5000) == "thread"  # Без процессов крупная работа остаётся в потоках
+    executor.workers["process"] = 1
+    assert executor.mode(5000) == "process"
+
+
+def test_pools_match_inline_scores():
+    expected = score_batch(ITEMS)
+    executor = ScoringExecutor(threads=1, processes=1, inline_chars=100, process_chars=10_000)
+    try:
+        assert asyncio.run(executor.score(ITEMS[2:3])) == expected[2:3]
+        assert asyncio.run(executor.score(ITEMS[3:])) == expected[3:]
+        assert asyncio.run(executor.score(ITEMS)) == expected
+        snapshot = executor.snapshot()
+        assert snapshot["inline"] == 1
+        assert snapshot["pools"]["thread"]["tasks"] == 1
+        assert snapshot["pools"]["process"]["tasks"] == 1
+        assert snapshot["pools"]["process"]["inflight"] == 0
+    finally:
+        executor.close()
+
+
+def test_summary_scored_off_loop():
+    token = client.post("/session").json()["token"]
+    question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+    client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": LONG_ANSWER})
+    before = scoring.snapshot()["pools"]["thread"]["tasks"]
+    summary = client.post(f"/aeon/summary/{token}")
+    glyph = client.post(f"/aeon/glyph/{token}", json={})
+    assert summary.status_code == glyph.status_code == 200
+    assert "Средний балл качества" in summary.json()["summary"]
+    assert client.get("/admin/scoring").json()["pools"]["thread"]["tasks"] == before + 2
+    # Закэшированная сводка повторно не оценивается
+    client.post(f"/aeon/summary/{token}")
+    assert scoring.snapshot()["pools"]["thread"]["tasks"] == before + 2
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+
+
+def test_factory_defers_llm_and_admin_imports():
+    code = (
+        "import sys, app.main; app.main.create_app(); "
+        "print(sorted(m for m in ('httpx', 'jinja2', 'fastapi.templating') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_module_level_app_is_built_on_first_access():
+    import app.main
+    assert app.main.app is app.main.app
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from app.blobs import answer_store
+from app.state import SessionState, question_ids
+
+
+def test_asked_questions_bitmask():
+    state = SessionState()
+    state.mark_asked("q_1")
+    state.mark_asked("q_3")
+    state.mark_asked("q_1")
+    assert state.asked_count == 2
+    assert state.was_asked("q_3")
+    assert not state.was_asked("q_2")
+    assert not state.was_asked(["не строка"])
+    assert state.question_order == ["q_1", "q_3"]
+
+
+def test_single_copy_answers():
+    state = SessionState()
+    state.mark_asked("q_1")
+    state.set_answer("q_1", "первый")
+    state.set_answer("q_1", "исправленный")
+    state.add_raw_answer({"answer_id": 2})
+    assert state.answered_count == 1
+    assert state.answer_count == 3
+    assert state.aeon_answers == {"q_1": "исправленный"}
+    assert {"answer_id": 2} in state.answers
+
+
+def test_datetime_views_over_epoch():
+    state = SessionState()
+    created = state.created_at
+    state.created_at -= timedelta(hours=2)
+    assert abs(state.created_ts - (created.timestamp() - 7200)) < 1e-3
+    assert not hasattr(state, "__dict__")
+
+
+def test_question_index_per_bank_version():
+    old = SessionState(bank_version="state-v1")
+    for i in range(70000):
+        old.mark_asked(f"old_{i}")
+    assert old.asked_count == 70000 and old.last_question_id == "old_69999"
+    # Вопросы другой версии банка нумеруются заново — маска сессии остаётся маленькой
+    new = SessionState(bank_version="state-v2")
+    new.mark_asked("q_1")
+    assert new.asked_mask == 1
+    assert not new.was_asked("old_5")
+    assert question_ids("state-v1") is old._ids
+
+
+def test_edited_answers_release_old_blobs():
+    before = len(answer_store)
+    state = SessionState()
+    state.mark_asked("q_1")
+    for i in range(5):
+        state.set_answer("q_1", f"правка {i}")
+    assert len(answer_store) == before + 1
+    # Повтор из журнала с новыми ссылками тоже не оставляет прежние тексты
+    restored = SessionState()
+    for ref in (10**9, 10**9 + 1, 10**9 + 2):
+        restored.restore_answer("q_1", ref, f"ответ {ref}")
+    assert len(answer_store) == before + 2
+    state.release_answers()
+    restored.release_answers()
+    assert len(answer_store) == before
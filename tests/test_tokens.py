@@ -0,0 +1,66 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.api import sessions
+from app.main import app
+from app.tokens import SessionTokens, session_tokens, token_shard
+
+client = TestClient(app)
+
+
+def test_issue_and_verify():
+    tokens = SessionTokens(b"secret", shard=7)
+    token = tokens.issue(("developer", "ru"), created_ts=1_700_000_000)
+    claims = tokens.verify(token)
+    assert claims.created_ts == 1_700_000_000
+    assert claims.shard == 7 == token_shard(token)
+    assert claims.track == ("developer", "ru")
+    assert tokens.verify(tokens.issue()).track is None
+    claims = tokens.verify(tokens.issue(bank_version="2026-01"))
+    assert (claims.track, claims.bank_version) == (None, "2026-01")
+    assert tokens.verify(tokens.issue(("developer", None), bank_version="v1")).track == ("developer", None)
+
+
+def test_forged_tokens_rejected():
+    tokens = SessionTokens(b"secret")
+    token = tokens.issue()
+    forged = token[:-1] + ("A" if token[-1] != "A" else "B")
+    assert tokens.verify(forged) is None
+    assert SessionTokens(b"other").verify(token) is None
+    # Подмена времени создания ломает подпись
+    assert tokens.verify(token[:2] + "ffffffff" + token[10:]) is None
+    assert tokens.verify("not-a-token") is None
+    assert tokens.verify(None) is None
+    assert tokens.rejected == 4
+
+
+def test_session_allocated_on_first_write():
+    token = client.post("/session").json()["token"]
+    assert token not in sessions
+    status = client.get(f"/session/{token}")
+    assert status.status_code == 200
+    assert status.json()["questions_answered"] == 0
+    assert token not in sessions
+    client.post(f"/aeon/question/{token}", json={})
+    assert sessions[token].asked_count == 1
+
+
+def test_invalid_tokens_rejected_without_store():
+    expired = session_tokens.issue(created_ts=time.time() - 7200)
+    response = client.post(f"/session/{expired}/answer", json={"answer": "test"})
+    assert response.status_code == 403
+    assert expired not in sessions
+    forged = session_tokens.issue()[:-2] + "xx"
+    assert client.get(f"/session/{forged}").status_code == 404
+    statuses = client.post("/sessions/status", json={"tokens": [expired, forged]}).json()["sessions"]
+    assert [item["status"] for item in statuses] == [403, 404]
+
+
+def test_deleted_session_not_recreated():
+    token = client.post("/session").json()["token"]
+    client.post(f"/aeon/question/{token}", json={})
+    client.post(f"/admin/session/{token}/delete")
+    response = client.post(f"/session/{token}/answer", json={"answer": "test"})
+    assert response.status_code == 404
+    assert token not in sessions
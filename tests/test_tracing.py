@@ -0,0 +1,79 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.api import log
+from app.tracing import NOOP_SPAN, RotatingWriter, Tracer, parse_traceparent, span
+
+
+def read_spans(path):
+    spans = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return spans
+
+
+def test_disabled_path_is_noop():
+    assert span("anything") is NOOP_SPAN
+    assert tracing.current_trace_id() is None
+    assert Tracer(sample_rate=0).start_trace("GET") is None
+
+
+def test_traceparent():
+    header = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    assert parse_traceparent(header) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+    assert parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00")[2] is False
+    assert parse_traceparent("garbage") is None
+    # Решение вышестоящего сервиса важнее своей выборки
+    assert Tracer(sample_rate=1.0).start_trace("GET", header[:-1] + "0") is None
+    assert Tracer(sample_rate=0).start_trace("GET", header).trace.trace_id == header[3:35]
+
+
+def test_request_spans_exported(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing.tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracing.tracer, "path", str(path))
+    from app.main import create_app
+    client = TestClient(create_app())
+    try:
+        token = client.post("/session").json()["token"]
+        question_id = client.post(f"/aeon/question/{token}", json={}).json()["question_id"]
+        client.post(f"/session/{token}/answer", json={"question_id": question_id, "answer": "Мой опыт"})
+        client.get("/admin/log")
+        tracing.tracer.flush()
+    finally:
+        tracing.tracer.close()
+
+    spans = read_spans(path)
+    roots = {item["spanId"]: item for item in spans if "parentSpanId" not in item}
+    assert {item["name"] for item in roots.values()} >= {
+        "POST /session", "POST /session/{token}/answer", "GET /admin/log"}
+    by_name = {}
+    for item in spans:
+        by_name.setdefault(item["name"], []).append(item)
+    span_ids = {item["spanId"] for item in spans}
+    trace_ids = {item["traceId"] for item in roots.values()}
+    for name in ("session.resolve", "quality.analyze", "template.render"):
+        child = by_name[name][0]
+        assert child["parentSpanId"] in span_ids
+        assert child["traceId"] in trace_ids
+    answer_root = by_name["POST /session/{token}/answer"][0]
+    attributes = {attr["key"]: attr["value"] for attr in answer_root["attributes"]}
+    assert attributes["http.status_code"] == {"intValue": "200"}
+    # Записи лога помечены трассой своего запроса
+    saved = [entry for entry in log if entry["action"] == "save_answer" and entry["details"]["token"] == token]
+    assert saved[0]["trace_id"] == answer_root["traceId"]
+
+
+def test_rotating_writer(tmp_path):
+    path = tmp_path / "t.jsonl"
+    writer = RotatingWriter(str(path), max_bytes=100, backups=2)
+    for _ in range(10):
+        writer.write(b"x" * 40 + b"\n")
+    writer.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["t.jsonl", "t.jsonl.1", "t.jsonl.2"]
+    assert all(p.stat().st_size <= 100 for p in tmp_path.iterdir())